@@ -1,16 +1,26 @@
 import json
 import os
+import re
 import sqlite3
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from contextlib import contextmanager
 from collections.abc import Iterator
 
 DEFAULT_DB_PATH = "data/app.db"
 
+# repo methods that only write, and can therefore be queued and batched
+WRITE_OPS = ("create_session", "add_message", "add_event", "add_events")
+
+MAX_SEARCH_LIMIT = 100
+SNIPPET_TOKENS = 16
+
+_query_part = re.compile(r'"([^"]*)"|(\S+)')
+_query_word = re.compile(r"\w+")
+
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
@@ -21,47 +31,140 @@ class ChatMessageRow:
     content: str
     created_at: str
 
+@dataclass(frozen=True)
+class ChatEventRow:
+    session_id: str
+    event_type: str
+    payload: Dict[str, Any]
+    created_at: str
+
+@dataclass(frozen=True)
+class ClientMessageRow:
+    client_message_id: str
+    reply: Optional[str]      # None while the message hasn't been answered
+    created_at: str
+
+@dataclass(frozen=True)
+class MessageSearchHit:
+    message_id: str
+    session_id: str
+    role: str
+    snippet: str
+    created_at: str
+    score: float              # bm25, lower is a better match
+
+@dataclass(frozen=True)
+class MessageSearchPage:
+    hits: List[MessageSearchHit]
+    next_offset: Optional[int]    # None on the last page
+
+# agent search text -> FTS5 query. "quoted phrases" stay phrases, every other word has to appear (word*
+# matches a prefix); FTS5 operators and punctuation are taken literally, so no input is a syntax error
+def fts_query(text: str) -> str:
+    parts = []
+    for phrase, word in _query_part.findall(text):
+        if phrase:
+            tokens = _query_word.findall(phrase)
+            if tokens:
+                parts.append('"' + " ".join(tokens) + '"')
+            continue
+        tokens = _query_word.findall(word)
+        for i, token in enumerate(tokens):
+            last = i == len(tokens) - 1
+            parts.append(f'"{token}"' + ("*" if last and word.endswith("*") else ""))
+    return " ".join(parts)
+
 class SqliteChatRepo:
     def __init__(self, db_path: Optional[str] = None):
         self.db_path = db_path or os.getenv("DB_PATH", DEFAULT_DB_PATH)
 
     @contextmanager
     def _conn(self) -> Iterator[sqlite3.Connection]:
-        conn = sqlite3.connect(self.db_path)
+        # wait on other workers' write locks instead of failing straight away
+        conn = sqlite3.connect(self.db_path, timeout=10)
         conn.row_factory = sqlite3.Row
         try:
             yield conn
         finally:
             conn.close()
 
+    # startup check that the file opens and has the schema -- also pulls its first pages into the OS cache
+    def ping(self) -> None:
+        with self._conn() as conn:
+            conn.execute("SELECT 1 FROM chat_sessions LIMIT 1").fetchall()
+
     def create_session(self, session_id: str, created_at: Optional[str] = None) -> None:
-        created_at = created_at or now_iso()
         with self._conn() as conn:
-            conn.execute(
-                "INSERT OR IGNORE INTO chat_sessions (id, created_at) VALUES (?, ?)",
-                (session_id, created_at),
-            )
+            self._create_session(conn, session_id, created_at)
             conn.commit()
 
-    def add_message(self, session_id: str, role: str, content: str, created_at: Optional[str] = None) -> None:
-        created_at = created_at or now_iso()
-        msg_id = str(uuid.uuid4())
+    # client_message_id records the id a client sent a user message with; reply_to marks those ids as
+    # answered by this assistant message -- same transaction as the message row either way
+    def add_message(self, session_id: str, role: str, content: str, created_at: Optional[str] = None,
+                    client_message_id: Optional[str] = None, reply_to: Optional[List[str]] = None) -> None:
         with self._conn() as conn:
-            conn.execute(
-                "INSERT INTO chat_messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
-                (msg_id, session_id, role, content, created_at),
-            )
+            self._add_message(conn, session_id, role, content, created_at, client_message_id, reply_to)
             conn.commit()
 
     def add_event(self, session_id: str, event_type: str, payload: Dict[str, Any], created_at: Optional[str] = None) -> None:
-        created_at = created_at or now_iso()
-        event_id = str(uuid.uuid4())
         with self._conn() as conn:
+            self._add_event(conn, session_id, event_type, payload, created_at)
+            conn.commit()
+
+    # one transaction for several events, e.g. the per-span timings of a turn
+    def add_events(self, session_id: str, events: List[Tuple[str, Dict[str, Any]]], created_at: Optional[str] = None) -> None:
+        if not events:
+            return
+        with self._conn() as conn:
+            self._add_events(conn, session_id, events, created_at)
+            conn.commit()
+
+    # several queued writes in one connection and one transaction -- used by db.writer.ChatWriter
+    # ops are (method name, args), e.g. ("add_message", ("s1", "user", "hi"))
+    def write_batch(self, ops: List[Tuple[str, tuple]]) -> None:
+        with self._conn() as conn:
+            for name, args in ops:
+                if name not in WRITE_OPS:
+                    raise ValueError(f"Not a write operation: {name}")
+                getattr(self, f"_{name}")(conn, *args)
+            conn.commit()
+
+    def _create_session(self, conn: sqlite3.Connection, session_id: str, created_at: Optional[str] = None) -> None:
+        conn.execute(
+            "INSERT OR IGNORE INTO chat_sessions (id, created_at) VALUES (?, ?)",
+            (session_id, created_at or now_iso()),
+        )
+
+    def _add_message(self, conn: sqlite3.Connection, session_id: str, role: str, content: str, created_at: Optional[str] = None,
+                     client_message_id: Optional[str] = None, reply_to: Optional[List[str]] = None) -> None:
+        created_at = created_at or now_iso()
+        conn.execute(
+            "INSERT INTO chat_messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), session_id, role, content, created_at),
+        )
+        if client_message_id:
             conn.execute(
-                "INSERT INTO chat_events (id, session_id, event_type, payload_json, created_at) VALUES (?, ?, ?, ?, ?)",
-                (event_id, session_id, event_type, json.dumps(payload), created_at),
+                "INSERT OR IGNORE INTO chat_client_messages (session_id, client_message_id, created_at) VALUES (?, ?, ?)",
+                (session_id, client_message_id, created_at),
             )
-            conn.commit()
+        if reply_to:
+            conn.executemany(
+                "UPDATE chat_client_messages SET reply=? WHERE session_id=? AND client_message_id=?",
+                [(content, session_id, message_id) for message_id in reply_to],
+            )
+
+    def _add_event(self, conn: sqlite3.Connection, session_id: str, event_type: str, payload: Dict[str, Any], created_at: Optional[str] = None) -> None:
+        conn.execute(
+            "INSERT INTO chat_events (id, session_id, event_type, payload_json, created_at) VALUES (?, ?, ?, ?, ?)",
+            (str(uuid.uuid4()), session_id, event_type, json.dumps(payload), created_at or now_iso()),
+        )
+
+    def _add_events(self, conn: sqlite3.Connection, session_id: str, events: List[Tuple[str, Dict[str, Any]]], created_at: Optional[str] = None) -> None:
+        created_at = created_at or now_iso()
+        conn.executemany(
+            "INSERT INTO chat_events (id, session_id, event_type, payload_json, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(str(uuid.uuid4()), session_id, event_type, json.dumps(payload), created_at) for event_type, payload in events],
+        )
 
     def get_messages(self, session_id: str) -> List[ChatMessageRow]:
         with self._conn() as conn:
@@ -69,4 +172,86 @@ class SqliteChatRepo:
                 "SELECT session_id, role, content, created_at FROM chat_messages WHERE session_id=? ORDER BY created_at ASC",
                 (session_id,),
             ).fetchall()
-            return [ChatMessageRow(**dict(r)) for r in rows]
\ No newline at end of file
+            return [ChatMessageRow(**dict(r)) for r in rows]
+
+    def get_client_message(self, session_id: str, client_message_id: str) -> Optional[ClientMessageRow]:
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT client_message_id, reply, created_at FROM chat_client_messages WHERE session_id=? AND client_message_id=?",
+                (session_id, client_message_id),
+            ).fetchone()
+        return ClientMessageRow(**dict(row)) if row else None
+
+    # ranked full-text search over every stored message (chat_messages_fts, see schema.sql). the match
+    # and the ranking run inside the FTS index; `since` becomes a rowid bound found through the
+    # created_at index, so older history isn't visited at all
+    def search_messages(self, query: str, since: Optional[str] = None, limit: int = 20, offset: int = 0,
+                        role: Optional[str] = None, highlight: Tuple[str, str] = ("[", "]")) -> MessageSearchPage:
+        match = fts_query(query)
+        if not match:
+            raise ValueError("search query has no words")
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        offset = max(0, offset)
+
+        sql = (
+            "SELECT m.id, m.session_id, m.role, m.created_at, "
+            "snippet(chat_messages_fts, 0, ?, ?, '...', ?) AS snippet, chat_messages_fts.rank AS score "
+            "FROM chat_messages_fts JOIN chat_messages m ON m.rowid = chat_messages_fts.rowid "
+            "WHERE chat_messages_fts MATCH ?"
+        )
+        params: Tuple[Any, ...] = (highlight[0], highlight[1], SNIPPET_TOKENS, match)
+
+        with self._conn() as conn:
+            if since:
+                first = conn.execute(
+                    "SELECT min(rowid) FROM chat_messages WHERE created_at >= ?", (since,)
+                ).fetchone()[0]
+                if first is None:
+                    return MessageSearchPage(hits=[], next_offset=None)
+                sql += " AND chat_messages_fts.rowid >= ? AND m.created_at >= ?"
+                params += (first, since)
+            if role:
+                sql += " AND m.role = ?"
+                params += (role,)
+            # one extra row tells whether there's a next page
+            sql += " ORDER BY chat_messages_fts.rank LIMIT ? OFFSET ?"
+            rows = conn.execute(sql, params + (limit + 1, offset)).fetchall()
+
+        hits = [
+            MessageSearchHit(r["id"], r["session_id"], r["role"], r["snippet"], r["created_at"], r["score"])
+            for r in rows[:limit]
+        ]
+        return MessageSearchPage(hits=hits, next_offset=offset + limit if len(rows) > limit else None)
+
+    # streams session ids oldest first without loading them all, e.g. for loadtest.replay
+    def iter_session_ids(self, since: Optional[str] = None, limit: Optional[int] = None, batch_size: int = 500) -> Iterator[str]:
+        query = "SELECT id FROM chat_sessions"
+        params: Tuple[Any, ...] = ()
+        if since:
+            query += " WHERE created_at >= ?"
+            params += (since,)
+        query += " ORDER BY created_at ASC, id ASC"
+        if limit is not None:
+            query += " LIMIT ?"
+            params += (limit,)
+        with self._conn() as conn:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for r in rows:
+                    yield r["id"]
+
+    def get_events(self, session_id: str, event_type: Optional[str] = None) -> List[ChatEventRow]:
+        query = "SELECT session_id, event_type, payload_json, created_at FROM chat_events WHERE session_id=?"
+        params: Tuple[Any, ...] = (session_id,)
+        if event_type:
+            query += " AND event_type=?"
+            params += (event_type,)
+        with self._conn() as conn:
+            rows = conn.execute(query + " ORDER BY created_at ASC, rowid ASC", params).fetchall()
+            return [
+                ChatEventRow(r["session_id"], r["event_type"], json.loads(r["payload_json"]), r["created_at"])
+                for r in rows
+            ]
@@ -9,7 +9,15 @@ def init_db(db_path: str = DEFAULT_PATH) -> None:
     os.makedirs(os.path.dirname(db_path), exist_ok=True)
     conn = sqlite3.connect(db_path)
     try:
+        # WAL lets several worker processes read while the single writer commits
+        conn.execute("PRAGMA journal_mode=WAL")
+        had_search_index = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name='chat_messages_fts'"
+        ).fetchone() is not None
         conn.executescript(SCHEMA_PATH.read_text(encoding="utf-8"))
+        # databases from before the search index: index the messages already stored
+        if not had_search_index:
+            conn.execute("INSERT INTO chat_messages_fts(chat_messages_fts) VALUES('rebuild')")
         conn.commit()
     finally:
         conn.close()
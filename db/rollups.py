@@ -0,0 +1,274 @@
+# incrementally maintained analytics over the chat tables. refresh() folds rows past each source's
+# high-water mark into per-hour counters (chat_rollups) in small chunks, one short write transaction
+# each, so the writer is never blocked for long and the first run on an old database is a chunked
+# backfill. dashboards then read buckets -- O(buckets), however many events there are.
+#
+#   python -m db.rollups            catch up (backfill) from the command line
+#   python -m db.rollups --rebuild  drop the rollups and fold everything in again
+#
+# intent, tool and slot rollups come from the turn summary rows in chat_events -- written on every turn,
+# TRACING_ENABLED=1 only adds the other stage spans
+
+import argparse
+import json
+import os
+import sqlite3
+from collections import defaultdict
+from contextlib import contextmanager
+from collections.abc import Iterator
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from db.chat_db import DEFAULT_DB_PATH, now_iso
+from monitoring.metrics import ROLLUP_LAG_ROWS, ROLLUP_ROWS
+
+DEFAULT_CHUNK_SIZE = int(os.getenv("ROLLUP_CHUNK_SIZE", "2000"))
+
+GRANULARITIES = {"hour": 16, "day": 10}    # prefix of the hour bucket each one groups by
+
+# (metric, bucket, dimension) -> [count, total]
+Folded = Dict[Tuple[str, str, str], List[float]]
+
+
+@dataclass(frozen=True)
+class RollupPoint:
+    bucket: str
+    dimension: str
+    count: int
+    total: float
+
+
+def hour_bucket(created_at: str) -> str:
+    # "2026-03-01T14:05:09.123+00:00" -> "2026-03-01T14:00"; timestamps are stored in UTC
+    return created_at[:13] + ":00"
+
+
+def _add(folded: Folded, metric: str, bucket: str, dimension: Any = "", value: float = 0.0) -> None:
+    entry = folded[(metric, bucket, str(dimension or ""))]
+    entry[0] += 1
+    entry[1] += value
+
+
+def fold_event(folded: Folded, event_type: str, payload: Dict[str, Any], bucket: str) -> None:
+    duration = float(payload.get("duration_ms") or 0.0)
+    if event_type == "intent_detected":
+        _add(folded, "intent", bucket, payload.get("intent"), duration)
+    elif event_type == "tool_called":
+        _add(folded, "tool_call", bucket, payload.get("tool"), duration)
+        if payload.get("ok") is False or payload.get("error"):
+            _add(folded, "tool_error", bucket, payload.get("tool"))
+    elif event_type == "span":
+        if payload.get("span") != "turn":
+            return
+        _add(folded, "turn", bucket, "", duration)
+        if payload.get("slot_requested"):
+            _add(folded, "slot_requested", bucket, payload["slot_requested"])
+        if payload.get("slot_filled"):
+            _add(folded, "slot_filled", bucket, payload["slot_filled"])
+    else:
+        # session_closed, turn_coalesced, turn_cancelled, ...
+        _add(folded, "event", bucket, event_type)
+
+
+def _fold_events(folded: Folded, rows: List[sqlite3.Row]) -> None:
+    for row in rows:
+        try:
+            payload = json.loads(row["payload_json"])
+        except ValueError:
+            payload = {}
+        fold_event(folded, row["event_type"], payload, hour_bucket(row["created_at"]))
+
+
+def _fold_messages(folded: Folded, rows: List[sqlite3.Row]) -> None:
+    for row in rows:
+        _add(folded, "messages", hour_bucket(row["created_at"]), row["role"])
+        if row["role"] == "assistant":
+            # one reply per turn, counted in the hour its session started so turns and sessions line up
+            _add(folded, "session_turns", hour_bucket(row["session_created_at"] or row["created_at"]))
+
+
+def _fold_sessions(folded: Folded, rows: List[sqlite3.Row]) -> None:
+    for row in rows:
+        _add(folded, "sessions", hour_bucket(row["created_at"]))
+
+
+# source table -> (columns read, fold function)
+SOURCES: Dict[str, Tuple[str, Callable[[Folded, List[sqlite3.Row]], None]]] = {
+    "chat_events": ("event_type, payload_json, created_at", _fold_events),
+    "chat_messages": ("role, created_at, (SELECT created_at FROM chat_sessions "
+                      "WHERE chat_sessions.id = chat_messages.session_id) AS session_created_at", _fold_messages),
+    "chat_sessions": ("created_at", _fold_sessions),
+}
+
+
+def _range(metric: str, since: Optional[str], until: Optional[str],
+           dimension: Optional[str] = None) -> Tuple[str, List[Any]]:
+    where = "metric=?"
+    params: List[Any] = [metric]
+    if since:
+        where += " AND bucket >= ?"
+        params.append(since)
+    if until:
+        where += " AND bucket < ?"
+        params.append(until)
+    if dimension is not None:
+        where += " AND dimension=?"
+        params.append(dimension)
+    return where, params
+
+
+class SqliteRollups:
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("DB_PATH", DEFAULT_DB_PATH)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.db_path, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    # folds new rows from every source into chat_rollups, returns how many rows were folded in.
+    # max_chunks bounds one call (e.g. one background tick); None catches up completely
+    def refresh(self, chunk_size: int = DEFAULT_CHUNK_SIZE, max_chunks: Optional[int] = None) -> int:
+        folded_rows = 0
+        with self._conn() as conn:
+            for source in SOURCES:
+                chunks = 0
+                while max_chunks is None or chunks < max_chunks:
+                    rows = self._fold_chunk(conn, source, chunk_size)
+                    folded_rows += rows
+                    chunks += 1
+                    if rows < chunk_size:
+                        break
+                ROLLUP_LAG_ROWS.set(self._lag(conn, source), source=source)
+        return folded_rows
+
+    # one chunk in one write transaction: the high-water mark is read and moved under the same lock,
+    # so workers refreshing at the same time never fold a row twice
+    def _fold_chunk(self, conn: sqlite3.Connection, source: str, chunk_size: int) -> int:
+        columns, fold = SOURCES[source]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            mark = conn.execute("SELECT high_water FROM chat_rollup_state WHERE source=?", (source,)).fetchone()
+            high_water = mark["high_water"] if mark else 0
+            rows = conn.execute(
+                f"SELECT rowid, {columns} FROM {source} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (high_water, chunk_size),
+            ).fetchall()
+            if not rows:
+                conn.execute("ROLLBACK")
+                return 0
+
+            folded: Folded = defaultdict(lambda: [0, 0.0])
+            fold(folded, rows)
+            conn.executemany(
+                "INSERT INTO chat_rollups (metric, bucket, dimension, count, total) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(metric, bucket, dimension) DO UPDATE SET "
+                "count = count + excluded.count, total = total + excluded.total",
+                [(metric, bucket, dimension, count, total) for (metric, bucket, dimension), (count, total) in folded.items()],
+            )
+            conn.execute(
+                "INSERT INTO chat_rollup_state (source, high_water, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(source) DO UPDATE SET high_water = excluded.high_water, updated_at = excluded.updated_at",
+                (source, rows[-1]["rowid"], now_iso()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        ROLLUP_ROWS.inc(len(rows), source=source)
+        return len(rows)
+
+    def _lag(self, conn: sqlite3.Connection, source: str) -> int:
+        mark = conn.execute("SELECT high_water FROM chat_rollup_state WHERE source=?", (source,)).fetchone()
+        newest = conn.execute(f"SELECT max(rowid) FROM {source}").fetchone()[0] or 0
+        return max(0, newest - (mark["high_water"] if mark else 0))
+
+    # for after a VACUUM or a bulk edit of the source tables
+    def rebuild(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+        with self._conn() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM chat_rollups")
+            conn.execute("DELETE FROM chat_rollup_state")
+            conn.execute("COMMIT")
+        return self.refresh(chunk_size)
+
+    # one metric per bucket and dimension, bucket in [since, until); since/until compare as ISO strings
+    # so "2026-03-01" works as well as a full timestamp
+    def series(self, metric: str, since: Optional[str] = None, until: Optional[str] = None,
+               granularity: str = "hour", dimension: Optional[str] = None) -> List[RollupPoint]:
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {sorted(GRANULARITIES)}")
+        where, params = _range(metric, since, until, dimension)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"SELECT substr(bucket, 1, {GRANULARITIES[granularity]}) AS b, dimension, sum(count) AS count, "
+                f"sum(total) AS total FROM chat_rollups WHERE {where} GROUP BY b, dimension ORDER BY b, dimension",
+                params,
+            ).fetchall()
+        return [RollupPoint(bucket=r["b"], dimension=r["dimension"], count=r["count"], total=r["total"]) for r in rows]
+
+    # metric summed over the whole range, by dimension; bucket is the first one with data
+    def totals(self, metric: str, since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, RollupPoint]:
+        where, params = _range(metric, since, until)
+        with self._conn() as conn:
+            rows = conn.execute(
+                f"SELECT min(bucket) AS b, dimension, sum(count) AS count, sum(total) AS total "
+                f"FROM chat_rollups WHERE {where} GROUP BY dimension",
+                params,
+            ).fetchall()
+        return {
+            r["dimension"]: RollupPoint(bucket=r["b"], dimension=r["dimension"], count=r["count"], total=r["total"])
+            for r in rows
+        }
+
+    # what the support dashboard shows
+    def dashboard(self, since: Optional[str] = None, until: Optional[str] = None, granularity: str = "hour") -> Dict[str, Any]:
+        intents: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for p in self.series("intent", since, until, granularity):
+            intents[p.bucket][p.dimension] = p.count
+
+        errors = self.totals("tool_error", since, until)
+        tool_calls = {
+            tool: {
+                "calls": p.count,
+                "errors": errors[tool].count if tool in errors else 0,
+                "avg_ms": round(p.total / p.count, 3) if p.count else 0.0,
+            }
+            for tool, p in self.totals("tool_call", since, until).items()
+        }
+
+        requested = sum(p.count for p in self.totals("slot_requested", since, until).values())
+        filled = sum(p.count for p in self.totals("slot_filled", since, until).values())
+        # turns of the sessions that started in the range, over those sessions -- a session that runs past
+        # until still counts all its turns, one that started before since counts none
+        turns = sum(p.count for p in self.totals("session_turns", since, until).values())
+        sessions = sum(p.count for p in self.totals("sessions", since, until).values())
+
+        return {
+            "granularity": granularity,
+            "intents": dict(intents),
+            "tool_calls": tool_calls,
+            "slot_fill_rate": round(filled / requested, 4) if requested else None,
+            "avg_turns_per_session": round(turns / sessions, 3) if sessions else None,
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bring the chat analytics rollups up to date.")
+    parser.add_argument("--db", default=os.getenv("DB_PATH", DEFAULT_DB_PATH))
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--rebuild", action="store_true", help="drop the rollups and fold every row in again")
+    args = parser.parse_args()
+
+    rollups = SqliteRollups(args.db)
+    folded = rollups.rebuild(args.chunk_size) if args.rebuild else rollups.refresh(args.chunk_size)
+    print(f"folded {folded} rows into chat_rollups")
+
+
+if __name__ == "__main__":
+    main()
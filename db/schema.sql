@@ -6,7 +6,7 @@ CREATE TABLE IF NOT EXISTS chat_sessions (
 CREATE TABLE IF NOT EXISTS chat_messages (
   id TEXT PRIMARY KEY,
   session_id TEXT NOT NULL,
-  role TEXT NOT NULL,            -- "user" | "assistant" | "system"
+  role TEXT NOT NULL,            -- "user" | "assistant" | "agent" (handoff) | "system"
   content TEXT NOT NULL,
   created_at TEXT NOT NULL,
   FOREIGN KEY(session_id) REFERENCES chat_sessions(id)
@@ -19,4 +19,77 @@ CREATE TABLE IF NOT EXISTS chat_events (
   payload_json TEXT NOT NULL,    -- JSON string
   created_at TEXT NOT NULL,
   FOREIGN KEY(session_id) REFERENCES chat_sessions(id)
-);
\ No newline at end of file
+);
+
+-- latest ChatState per session, lets any worker pick a session up (SqliteSessionStore)
+CREATE TABLE IF NOT EXISTS chat_session_state (
+  session_id TEXT PRIMARY KEY,
+  state_json TEXT NOT NULL,      -- ChatState.to_dict() as JSON
+  updated_at TEXT NOT NULL
+);
+
+-- local stand-in for the order system (ORDER_BACKEND=sqlite, models/order_service.py)
+CREATE TABLE IF NOT EXISTS orders (
+  order_id TEXT PRIMARY KEY,
+  status TEXT NOT NULL,
+  eta TEXT,
+  carrier TEXT,
+  tracking TEXT
+);
+
+-- full-text index over chat_messages for agent search (SqliteChatRepo.search_messages). external content:
+-- the text is stored once, in chat_messages, and the triggers keep the index in step with it.
+-- chat_messages has no INTEGER PRIMARY KEY, so VACUUM may renumber its rowids -- rebuild the index after
+-- one with: INSERT INTO chat_messages_fts(chat_messages_fts) VALUES('rebuild')
+CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts USING fts5(
+  content,
+  content='chat_messages',
+  content_rowid='rowid',
+  tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_insert AFTER INSERT ON chat_messages BEGIN
+  INSERT INTO chat_messages_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_delete AFTER DELETE ON chat_messages BEGIN
+  INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+END;
+
+CREATE TRIGGER IF NOT EXISTS chat_messages_fts_update AFTER UPDATE OF content ON chat_messages BEGIN
+  INSERT INTO chat_messages_fts(chat_messages_fts, rowid, content) VALUES ('delete', old.rowid, old.content);
+  INSERT INTO chat_messages_fts(rowid, content) VALUES (new.rowid, new.content);
+END;
+
+-- turns a search's `since` into a rowid bound so old history is skipped inside the index
+CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON chat_messages(created_at);
+
+-- analytics rollups (db/rollups.py): counts per hour bucket, metric and dimension, folded in incrementally
+-- from chat_events/chat_messages/chat_sessions so dashboards read buckets instead of raw rows.
+-- keyed metric-first so a dashboard series is one range scan
+CREATE TABLE IF NOT EXISTS chat_rollups (
+  metric TEXT NOT NULL,          -- "intent", "tool_call", "turn", "messages", ...
+  bucket TEXT NOT NULL,          -- hour the rows fall in, "2026-03-01T14:00"
+  dimension TEXT NOT NULL,       -- intent name, tool name, role, ... ('' when the metric has none)
+  count INTEGER NOT NULL,
+  total REAL NOT NULL,           -- summed value, e.g. duration_ms for turns and tool calls
+  PRIMARY KEY (metric, bucket, dimension)
+) WITHOUT ROWID;
+
+-- last source rowid already folded into chat_rollups, per source table. rows are only appended, so
+-- everything past the mark is new. VACUUM can renumber rowids -- rebuild the rollups after one
+CREATE TABLE IF NOT EXISTS chat_rollup_state (
+  source TEXT PRIMARY KEY,
+  high_water INTEGER NOT NULL,
+  updated_at TEXT NOT NULL
+);
+
+-- client-supplied message ids (JSON frames, see models/message_dedupe.py) and the reply each one got,
+-- so a message resent after a reconnect is answered from here instead of running the turn again
+CREATE TABLE IF NOT EXISTS chat_client_messages (
+  session_id TEXT NOT NULL,
+  client_message_id TEXT NOT NULL,
+  reply TEXT,                    -- NULL until the assistant reply is stored
+  created_at TEXT NOT NULL,
+  PRIMARY KEY (session_id, client_message_id)
+) WITHOUT ROWID;
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+from collections.abc import Iterator
+from typing import Dict, Optional
+
+from db.chat_db import DEFAULT_DB_PATH, now_iso
+from models.chat_state import ChatState
+
+DEFAULT_MAX_SESSIONS = 10_000
+
+
+# where ChatState lives between turns -- swap the backend to share sessions across worker processes
+class SessionStore:
+    def load(self, session_id: str) -> Optional[ChatState]:
+        raise NotImplementedError
+
+    def save(self, session_id: str, state: ChatState) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    # what the event loop calls; stores that do I/O override these to run it on a thread
+    async def aload(self, session_id: str) -> Optional[ChatState]:
+        return self.load(session_id)
+
+    async def asave(self, session_id: str, state: ChatState) -> None:
+        self.save(session_id, state)
+
+
+# default, single process only -- least recently used sessions are dropped past max_sessions
+class InMemorySessionStore(SessionStore):
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._states: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def load(self, session_id: str) -> Optional[ChatState]:
+        data = self._states.get(session_id)
+        if data is None:
+            return None
+        self._states.move_to_end(session_id)
+        return ChatState.from_dict(data)
+
+    def save(self, session_id: str, state: ChatState) -> None:
+        # store a copy so later mutations of the live state don't leak into the store
+        self._states[session_id] = state.to_dict()
+        self._states.move_to_end(session_id)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        self._states.pop(session_id, None)
+
+
+# shared between workers on one host through the chat_session_state table; stands in for redis & co.
+class SqliteSessionStore(SessionStore):
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("DB_PATH", DEFAULT_DB_PATH)
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def load(self, session_id: str) -> Optional[ChatState]:
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT state_json FROM chat_session_state WHERE session_id=?", (session_id,)
+            ).fetchone()
+        return ChatState.from_dict(json.loads(row[0])) if row else None
+
+    def save(self, session_id: str, state: ChatState) -> None:
+        self._save_json(session_id, json.dumps(state.to_dict()))
+
+    def _save_json(self, session_id: str, state_json: str) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT INTO chat_session_state (session_id, state_json, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET state_json=excluded.state_json, updated_at=excluded.updated_at",
+                (session_id, state_json, now_iso()),
+            )
+            conn.commit()
+
+    async def aload(self, session_id: str) -> Optional[ChatState]:
+        return await asyncio.to_thread(self.load, session_id)
+
+    async def asave(self, session_id: str, state: ChatState) -> None:
+        # serialized on the loop -- the next turn may already be changing state while the thread writes
+        await asyncio.to_thread(self._save_json, session_id, json.dumps(state.to_dict()))
+
+    def delete(self, session_id: str) -> None:
+        with self._conn() as conn:
+            conn.execute("DELETE FROM chat_session_state WHERE session_id=?", (session_id,))
+            conn.commit()
+
+
+# SESSION_STORE=memory (default) | sqlite
+def create_session_store(kind: Optional[str] = None) -> SessionStore:
+    kind = (kind or os.getenv("SESSION_STORE", "memory")).lower()
+    if kind == "memory":
+        return InMemorySessionStore()
+    if kind == "sqlite":
+        return SqliteSessionStore(os.getenv("SESSION_STORE_PATH"))
+    raise ValueError(f"Unknown SESSION_STORE: {kind}")
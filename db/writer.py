@@ -0,0 +1,113 @@
+import logging
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from monitoring.metrics import DB_WRITE_ERRORS, DB_WRITE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# single writer per process: chat writes are queued from the event loop (no blocking sqlite call on a turn)
+# and a background thread commits them in batches. Works with any repo exposing the SqliteChatRepo write
+# methods; repos with write_batch() get one transaction per batch.
+#
+# reads are passed straight through to the repo, so they only see queued writes after flush()
+class ChatWriter:
+    def __init__(self, repo: Any, max_batch: int = 256):
+        self.repo = repo
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.repo, name)
+
+    def create_session(self, session_id: str, created_at: Optional[str] = None) -> None:
+        self._submit("create_session", (session_id, created_at))
+
+    def add_message(self, session_id: str, role: str, content: str, created_at: Optional[str] = None,
+                    client_message_id: Optional[str] = None, reply_to: Optional[List[str]] = None) -> None:
+        self._submit("add_message", (session_id, role, content, created_at, client_message_id, reply_to))
+
+    def add_event(self, session_id: str, event_type: str, payload: Dict[str, Any], created_at: Optional[str] = None) -> None:
+        self._submit("add_event", (session_id, event_type, payload, created_at))
+
+    def add_events(self, session_id: str, events: List[Tuple[str, Dict[str, Any]]], created_at: Optional[str] = None) -> None:
+        if events:
+            self._submit("add_events", (session_id, events, created_at))
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    # blocks until everything queued so far is committed -- for tests, shutdown and read-after-write
+    def flush(self) -> None:
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _submit(self, name: str, args: tuple) -> None:
+        if self._thread is None:
+            self.start()
+        self._queue.put((name, args))
+        DB_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+
+    # called on the first write, or up front by the server's warm-up
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="chat-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            op = self._queue.get()
+            if op is _STOP:
+                self._queue.task_done()
+                return
+
+            batch = [op]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+
+            self._write(batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            DB_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+            if stop:
+                return
+
+    def _write(self, batch: List[Tuple[str, tuple]]) -> None:
+        write_batch = getattr(self.repo, "write_batch", None)
+        if write_batch is not None:
+            try:
+                write_batch(batch)
+                return
+            except Exception:
+                # one bad row shouldn't lose the whole batch, retry one by one below
+                logger.warning("batched chat write failed, retrying %d ops individually", len(batch), exc_info=True)
+
+        for name, args in batch:
+            try:
+                getattr(self.repo, name)(*args)
+            except Exception:
+                DB_WRITE_ERRORS.inc()
+                logger.exception("chat write %s failed", name)
@@ -4,30 +4,119 @@ import { useEffect, useRef, useState } from "react";
 
 type Msg = { id: string; role: "user" | "assistant"; text: string };
 
+// server frames of the chat.v1.json protocol (models/chat_frames.py). a server that doesn't accept the
+// subprotocol talks plain text -- anything that doesn't parse as a frame is shown as an assistant message
+type ServerFrame =
+  | { type: "hello"; session_id: string; protocol: string }
+  | { type: "reply"; reply_to: string[]; text: string; replay: boolean }
+  | { type: "typing"; active: boolean }
+  | { type: "notice"; text: string }
+  | { type: "error"; code: string; detail: string }
+  | { type: "pong" };
+
+const PROTOCOLS = ["chat.v1.json"];
+const FRAME_TYPES = ["hello", "reply", "typing", "notice", "error", "pong"];
+
 const uid = () => Math.random().toString(36).slice(2) + Date.now().toString(36);
 
+const parseFrame = (data: string): ServerFrame | null => {
+  try {
+    const frame = JSON.parse(data);
+    return frame && FRAME_TYPES.includes(frame.type) ? frame : null;
+  } catch {
+    return null;
+  }
+};
+
+// the same frame works with the plain-text fallback, which reads type/id/text and ignores v
+const messageFrame = (id: string, text: string) => JSON.stringify({ v: 1, type: "message", id, text });
+
 export default function Chat() {
   const [status, setStatus] = useState<"connecting" | "connected" | "disconnected">("connecting");
   const [messages, setMessages] = useState<Msg[]>([
     { id: uid(), role: "assistant", text: "Hi! Ask me about an order, a refund, or a policy question." },
   ]);
   const [input, setInput] = useState("");
+  const [typing, setTyping] = useState(false);
   const wsRef = useRef<WebSocket | null>(null);
   const bottomRef = useRef<HTMLDivElement | null>(null);
+  // sent but not answered yet, by message id -- resent after a reconnect, the server dedupes them
+  const unanswered = useRef(new Map<string, string>());
+  // replies already shown, so a replayed reply isn't shown twice
+  const answered = useRef(new Set<string>());
+  // from the hello frame, so a reconnect resumes the session even where the cookie isn't kept
+  const sessionId = useRef<string | null>(null);
 
   useEffect(() => {
-    const ws = new WebSocket("/ws"); // <-- proxied by Vite
-    wsRef.current = ws;
+    let closed = false;
+    let retry = 0;
+    let timer: ReturnType<typeof setTimeout> | undefined;
 
-    ws.onopen = () => setStatus("connected");
-    ws.onclose = () => setStatus("disconnected");
-    ws.onerror = () => setStatus("disconnected");
+    const connect = () => {
+      // proxied by Vite; the browser negotiates permessage-deflate on its own
+      const url = sessionId.current ? `/ws?session_id=${encodeURIComponent(sessionId.current)}` : "/ws";
+      const ws = new WebSocket(url, PROTOCOLS);
+      wsRef.current = ws;
 
-    ws.onmessage = (e) => {
-      setMessages((prev) => [...prev, { id: uid(), role: "assistant", text: String(e.data ?? "") }]);
+      ws.onopen = () => {
+        retry = 0;
+        setStatus("connected");
+        unanswered.current.forEach((text, id) => ws.send(messageFrame(id, text)));
+      };
+      ws.onclose = () => {
+        setTyping(false);
+        if (closed) {
+          setStatus("disconnected");
+          return;
+        }
+        // back off 0.5s, 1s, 2s ... up to 10s between attempts
+        setStatus("connecting");
+        timer = setTimeout(connect, Math.min(10_000, 500 * 2 ** retry++));
+      };
+      ws.onerror = () => ws.close();
+
+      const show = (text: string) => setMessages((prev) => [...prev, { id: uid(), role: "assistant", text }]);
+
+      ws.onmessage = (e) => {
+        const data = String(e.data ?? "");
+        const frame = parseFrame(data);
+        if (!frame) {
+          show(data);
+          return;
+        }
+        switch (frame.type) {
+          case "hello":
+            sessionId.current = frame.session_id;
+            return;
+          case "typing":
+            setTyping(frame.active);
+            return;
+          case "notice":
+            show(frame.text);
+            return;
+          case "error":
+            console.warn("chat frame rejected:", frame.code, frame.detail);
+            return;
+          case "pong":
+            return;
+          case "reply": {
+            setTyping(false);
+            frame.reply_to.forEach((id) => unanswered.current.delete(id));
+            const fresh = frame.reply_to.filter((id) => !answered.current.has(id));
+            if (frame.reply_to.length > 0 && fresh.length === 0) return;
+            fresh.forEach((id) => answered.current.add(id));
+            show(frame.text);
+          }
+        }
+      };
     };
 
-    return () => ws.close();
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      wsRef.current?.close();
+    };
   }, []);
 
   useEffect(() => {
@@ -38,15 +127,16 @@ export default function Chat() {
     const text = input.trim();
     if (!text) return;
 
-    setMessages((prev) => [...prev, { id: uid(), role: "user", text }]);
+    const id = uid();
+    setMessages((prev) => [...prev, { id, role: "user", text }]);
     setInput("");
 
+    // kept until its reply arrives; if the socket is down it goes out on the next connect
+    unanswered.current.set(id, text);
     const ws = wsRef.current;
-    if (!ws || ws.readyState !== WebSocket.OPEN) {
-      setMessages((prev) => [...prev, { id: uid(), role: "assistant", text: "Not connected yet—try again in a second." }]);
-      return;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      ws.send(messageFrame(id, text));
     }
-    ws.send(text);
   };
 
   return (
@@ -71,6 +161,7 @@ export default function Chat() {
                   </div>
                 </div>
               ))}
+              {typing && <div className="text-sm text-zinc-500">Assistant is typing…</div>}
               <div ref={bottomRef} />
             </div>
           </div>
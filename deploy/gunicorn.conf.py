@@ -0,0 +1,20 @@
+# gunicorn -c deploy/gunicorn.conf.py server:app
+#
+# one uvicorn worker per core; every worker runs its own event loop, chat writer thread and
+# knowledge index, and shares session state through SESSION_STORE=sqlite (or another shared backend)
+
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# websocket sessions are long lived, don't recycle workers under them
+timeout = 0
+graceful_timeout = 30
+keepalive = 75
+
+raw_env = [
+    f"SESSION_STORE={os.getenv('SESSION_STORE', 'sqlite')}",
+]
@@ -1,19 +1,93 @@
 # llm_router.py
 
 
+import asyncio
+import contextvars
 import json
+import logging
 from dataclasses import dataclass
-from typing import Any, Dict, Optional, Literal
+from typing import Any, Awaitable, Dict, Optional, Literal, Tuple
 
-from openai import AsyncOpenAI
+from models.circuit_breaker import CircuitBreaker, CircuitOpenError
 from models.intent import Intent  
 from models.knowledge_search import knowledge_search
+from models.model_policy import ModelPolicy, record_decision
+from models.order_service import create_order_service
+from models.response_templates import render_order_reply
+from models.tool_args import ToolArgsError, compile_tool, compile_tools
+from monitoring.metrics import LLM_BREAKER_OPEN, TOOL_ARGS, record_llm_call
+from monitoring.tracing import tracer, traced
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-client = AsyncOpenAI(api_key= os.getenv("OPENAI_API_KEY"))
+logger = logging.getLogger(__name__)
+
+# built on first use (or by the server's lifespan warm-up) -- importing openai is most of a cold
+# worker's import time. tests and the replay tool assign their own client here
+client = None
+
+def get_client():
+    global client
+    if client is None:
+        from openai import AsyncOpenAI
+        client = AsyncOpenAI(api_key= os.getenv("OPENAI_API_KEY"))
+    return client
+
+# one cheap authenticated request so the first turn reuses a pooled connection instead of paying
+# for DNS + TLS; failures are left for the first real call to surface
+async def connect_client() -> None:
+    await get_client().models.list()
+
+async def close_client() -> None:
+    global client
+    if client is not None and hasattr(client, "close"):
+        await client.close()
+    client = None
+
+
+class LLMUnavailableError(Exception):
+    """The provider failed, timed out, or the circuit breaker is open."""
+
+
+# what the breaker counts and degraded mode answers for: the provider unreachable, timing out, rate
+# limiting or failing with a 5xx. a 4xx bad request or a bug on our side is raised as it is -- it would
+# fail the same way on every retry, and must not push all traffic into degraded mode
+def provider_failure(e: BaseException) -> bool:
+    if isinstance(e, asyncio.TimeoutError):
+        return True
+    # already imported by get_client() if a call got this far
+    import openai
+    return isinstance(e, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError,
+                          openai.InternalServerError))
+
+
+# every chat completion goes through one breaker per worker (see models/circuit_breaker.py). batch runs
+# (models/batch_runner.py) get their own, so a bad batch can't push live customers into degraded mode
+llm_breaker = CircuitBreaker.from_env(is_failure=provider_failure)
+batch_breaker = CircuitBreaker.from_env(is_failure=provider_failure, name="batch")
+LLM_BREAKER_OPEN.set_callback(lambda: 0 if llm_breaker.is_closed else 1)
+
+# set for the calls made on behalf of a batch conversation
+batch_calls: contextvars.ContextVar[bool] = contextvars.ContextVar("batch_calls", default=False)
+
+
+async def _complete(**kwargs: Any) -> Any:
+    breaker = batch_breaker if batch_calls.get() else llm_breaker
+    try:
+        return await breaker.call(lambda: get_client().chat.completions.create(**kwargs))
+    except CircuitOpenError as e:
+        raise LLMUnavailableError(str(e)) from e
+    except asyncio.TimeoutError as e:
+        raise LLMUnavailableError(f"no response within {breaker.call_timeout}s") from e
+    except Exception as e:
+        if not provider_failure(e):
+            raise
+        raise LLMUnavailableError(f"{type(e).__name__}: {e}") from e
+
+# routing on the smallest model with escalation, generation by intent (see models/model_policy.py)
+model_policy = ModelPolicy.from_env()
 
 NextAction = Literal["respond", "ask_for_slot"]
 SlotName = Literal["order_id", "phone_or_email"]
@@ -75,6 +149,9 @@ ROUTER_TOOL = [
     }
 ]
 
+# compiled once from the schema above, see models/tool_args.py
+ROUTE_ARGS = compile_tool(ROUTER_TOOL[0])
+
 
 routing_prompt = f"""
 You are an intent router for a customer support assistant.
@@ -121,27 +198,90 @@ def build_route_state_summary(state: Any) -> str:
 
 
 async def get_intent(user_text: str, state: Any) -> RouteResult:
-    state_summary = build_route_state_summary(state)
+    with tracer.span("get_intent") as span:
+        result, model, escalation = await _get_intent(user_text, state)
+        span.set("intent", result.intent.value)
+        span.set("confidence", result.confidence)
+        span.set("next_action", result.next_action)
+        span.set("model", model)
+        if escalation:
+            span.set("escalation", escalation)
+        return result
 
-    resp = await client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=[
-            {"role": "system", "content": routing_prompt},
-            {"role": "system", "content": f"STATE: {state_summary}"},
-            {"role": "user", "content": user_text},
-        ],
-        tools=ROUTER_TOOL,
-        tool_choice="required",  # force a tool call 
-    )
+
+def _unknown_route() -> RouteResult:
+    return RouteResult(intent=Intent.UNKNOWN, confidence=0.0, next_action="respond")
+
+
+# route arguments neither model got right: answered as an unknown intent rather than failing the turn
+# (and with it the customer's connection)
+def _unparseable_route(error: Exception, model: str) -> RouteResult:
+    logger.warning("route arguments from %s couldn't be repaired: %s: %s", model, type(error).__name__, error)
+    return _unknown_route()
+
+
+# (route result, model that produced it, why it was escalated or None)
+async def _get_intent(user_text: str, state: Any) -> Tuple[RouteResult, str, Optional[str]]:
+    state_summary = build_route_state_summary(state)
+    messages = [
+        {"role": "system", "content": routing_prompt},
+        {"role": "system", "content": f"STATE: {state_summary}"},
+        {"role": "user", "content": user_text},
+    ]
+    policy = model_policy
+
+    record_decision("route", policy.route, "default")
+    result, error = await _route(policy.route, messages)
+    escalation = policy.escalation_reason(result.confidence if result else None, parse_failed=error is not None)
+    if escalation is None:
+        if error is not None:
+            return _unparseable_route(error, policy.route), policy.route, None
+        return result or _unknown_route(), policy.route, None
+
+    # the small model wasn't sure or didn't answer usably -- ask the stronger one once
+    record_decision("route", policy.route_escalation, escalation)
+    stronger, stronger_error = await _route(policy.route_escalation, messages)
+    if stronger is not None:
+        return stronger, policy.route_escalation, escalation
+    if result is not None:
+        return result, policy.route, escalation
+    if stronger_error is not None:
+        return _unparseable_route(stronger_error, policy.route_escalation), policy.route_escalation, escalation
+    return _unknown_route(), policy.route_escalation, escalation
+
+
+# one routing call; a missing route call is (None, None), arguments that don't parse are (None, error)
+async def _route(model: str, messages: list) -> Tuple[Optional[RouteResult], Optional[Exception]]:
+    with tracer.span("llm_call", stage="route", model=model):
+        resp = await _complete(
+            model=model,
+            messages=messages,
+            tools=ROUTER_TOOL,
+            tool_choice="required",  # force a tool call 
+        )
+    record_llm_call(model, "route", resp)
 
     msg = resp.choices[0].message
     
     tool_calls = msg.tool_calls or []
     if not tool_calls:
-        return RouteResult(intent=Intent.UNKNOWN, confidence=0.0, next_action="respond")
+        return None, None
 
     call = tool_calls[0]
-    args = json.loads(call.function.arguments)
+    try:
+        return parse_route_args(call.function.arguments), None
+    except ToolArgsError as e:
+        # already counted as failed by the validator
+        return None, e
+    except (ValueError, KeyError, TypeError) as e:
+        TOOL_ARGS.inc(tool="route", outcome="failed")
+        return None, e
+
+
+# turns the "route" tool call arguments into a RouteResult
+# raises ToolArgsError (a ValueError) when the arguments can't be repaired into the schema
+def parse_route_args(arguments: str) -> RouteResult:
+    args, _ = ROUTE_ARGS.parse(arguments)
 
     # Convert returned intent string into your Intent enum
     intent = Intent(args["intent"])
@@ -218,6 +358,8 @@ GENERATE_TOOL = [
     },
 ]
 
+# built once, checked (and repaired where possible) on every tool call
+GENERATE_ARGS = compile_tools(GENERATE_TOOL)
 
 
 generate_prompt = f"""
@@ -255,18 +397,48 @@ def build_gen_state_summary(state) -> str:
 
 
 # intent passed into here in order to 
-async def generate_result(user_text: str, state: Any) -> GenerationResult:
+# prefetched is an order lookup ChatManager already started for state.user_data["order_id"] (during the
+# route call when the message carried the id) -- for order intents with a known id the prompt always calls
+# get_order first, so that first LLM round-trip is skipped and the result is injected as if the model had
+# asked for it
+@traced("generate_result")
+async def generate_result(user_text: str, state: Any, prefetched: Optional[Awaitable[dict]] = None) -> GenerationResult:
     messages= [
             {"role": "system", "content": generate_prompt},
             {"role": "system", "content": f"STATE: {build_gen_state_summary(state)}"},
             {"role": "user", "content": user_text},
     ]
+
+    if prefetched is not None:
+        with tracer.span("tool_call", tool="get_order", prefetched=True) as span:
+            tool_output = await prefetched
+            span.set("ok", "error" not in tool_output)
+
+        order_id = state.user_data.get("order_id")
+        messages.append({
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": PREFETCH_CALL_ID,
+                "type": "function",
+                "function": {"name": "get_order", "arguments": json.dumps({"order_id": order_id})},
+            }],
+        })
+        messages.append({"role": "tool", "tool_call_id": PREFETCH_CALL_ID, "content": json.dumps(tool_output)})
+
+        templated = render_order_reply(state.current_intent, order_id, tool_output)
+        if templated is not None:
+            return GenerationResult(next_action = "respond", response_text = templated)
+        return await _respond_from_tools(messages, state)
     
-    response1 = await client.chat.completions.create(
-        model="gpt-4.1-mini",
-        messages=messages,
-        tools=GENERATE_TOOL,
-    )
+    model = _generation_model(state, "generate")
+    with tracer.span("llm_call", stage="generate", model=model):
+        response1 = await _complete(
+            model=model,
+            messages=messages,
+            tools=GENERATE_TOOL,
+        )
+    record_llm_call(model, "generate", response1)
     
     message1 = response1.choices[0].message
     
@@ -283,14 +455,28 @@ async def generate_result(user_text: str, state: Any) -> GenerationResult:
 
     for call in tool_calls:
         tool_name = call.function.name
-        tool_args = json.loads(call.function.arguments or "{}")
 
-        if tool_name == "get_order":
-            tool_output = get_order(tool_args.get("order_id", ""))
-        elif tool_name == "knowledge_search":
-            tool_output = knowledge_search(tool_args.get("query", ""), int(tool_args.get("top_k", 3)))
-        else:
-            tool_output = {"error": f"Unknown Tool: {tool_name}"}
+        with tracer.span("tool_call", tool=tool_name) as span:
+            validator = GENERATE_ARGS.get(tool_name)
+            tool_args: dict = {}
+            if validator is None:
+                tool_output = {"error": f"Unknown Tool: {tool_name}"}
+            else:
+                try:
+                    tool_args, repairs = validator.parse(call.function.arguments)
+                except ToolArgsError as e:
+                    # the respond call sees the error and can answer or ask instead
+                    tool_output = {"error": f"Invalid arguments: {e}"}
+                else:
+                    if repairs:
+                        span.set("repairs", repairs)
+                    if tool_name == "get_order":
+                        tool_output = await get_order(tool_args["order_id"])
+                    else:
+                        # reads the folder and may rebuild the index -- keep it off the event loop
+                        tool_output = await asyncio.to_thread(knowledge_search, tool_args["query"], tool_args["top_k"])
+
+            span.set("ok", "error" not in tool_output)
 
         # append the result of tool to messages2
         messages.append({
@@ -299,12 +485,31 @@ async def generate_result(user_text: str, state: Any) -> GenerationResult:
             "content" : json.dumps(tool_output)
         })
 
-        # now we can perform final call based on tool result to get output
+    # a lone order lookup can usually be answered from a template without the second call
+    if len(tool_calls) == 1 and tool_name == "get_order" and "order_id" in tool_args:
+        templated = render_order_reply(state.current_intent, tool_args["order_id"], tool_output)
+        if templated is not None:
+            return GenerationResult(next_action = "respond", response_text = templated)
 
-    response2 = await client.chat.completions.create(
-        model = "gpt-4.1-mini",
-        messages = messages
-    )
+    return await _respond_from_tools(messages, state)
+
+
+def _generation_model(state: Any, stage: str) -> str:
+    intent = getattr(state, "current_intent", None)
+    model = model_policy.generation_model(intent)
+    record_decision(stage, model, "intent" if intent in model_policy.generate_by_intent else "default")
+    return model
+
+
+# now we can perform final call based on tool result to get output
+async def _respond_from_tools(messages: list, state: Any) -> GenerationResult:
+    model = _generation_model(state, "respond")
+    with tracer.span("llm_call", stage="respond", model=model):
+        response2 = await _complete(
+            model = model,
+            messages = messages
+        )
+    record_llm_call(model, "respond", response2)
 
     final_response = response2.choices[0].message
     return GenerationResult(next_action = "respond", response_text = final_response.content)
@@ -312,15 +517,11 @@ async def generate_result(user_text: str, state: Any) -> GenerationResult:
 
 # tool calls that LLM can call in generate_result
 
-# temporary 'database' for testing
-
-
-FAKE_ORDERS = {
-  "124": {"status": "Shipped", "eta": "2026-02-25", "carrier": "UPS", "tracking": "1Z..."},
-  "555": {"status": "Processing", "eta": "2026-02-28", "carrier": None, "tracking": None},
-}
+# order lookups go through one cached, coalescing service per worker (ORDER_BACKEND picks the backend)
+order_service = create_order_service()
 
-def get_order(order_id: str) -> dict:
-    return FAKE_ORDERS.get(order_id, {"error": "not found"})
+async def get_order(order_id: str) -> dict:
+    return await order_service.get_order(order_id)
 
+PREFETCH_CALL_ID = "call_prefetched_get_order"
 
@@ -0,0 +1,249 @@
+# deterministic OpenAI-compatible fake for load tests -- serves POST /v1/chat/completions with
+# scripted routing/tool-calling answers, a configurable latency distribution, streaming and error injection
+#
+#   python -m loadtest.fake_llm --port 9000 --latency lognormal:120,0.4 --error-rate 0.01
+#   OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=fake uvicorn server:app
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai.types.chat import ChatCompletion
+
+from models.intent import Intent
+from models.intent_classifier import IntentClassifier
+
+KNOWLEDGE_WORDS = ("policy", "warranty", "return", "hours", "repair", "contact", "support", "product")
+ORDER_INTENTS = (Intent.GET_ORDER_INFORMATION.value, Intent.REFUND_ORDER.value)
+
+
+@dataclass
+class LatencyModel:
+    kind: str = "fixed"
+    params: List[float] = field(default_factory=lambda: [0.0])
+
+    # "fixed:50", "uniform:20,200", "lognormal:120,0.4" (median ms, sigma) -- all in milliseconds
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyModel":
+        kind, _, raw = spec.partition(":")
+        params = [float(p) for p in raw.split(",") if p] or [0.0]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"unknown latency distribution: {kind}")
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            return rng.uniform(self.params[0], self.params[1]) / 1000
+        if self.kind == "lognormal":
+            median, sigma = self.params[0], self.params[1] if len(self.params) > 1 else 0.5
+            return rng.lognormvariate(0, sigma) * median / 1000
+        return self.params[0] / 1000
+
+
+@dataclass
+class FakeLLMConfig:
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0
+    error_status: int = 500
+    stream_chunk_delay: float = 0.0
+    seed: int = 0
+
+
+def _last(messages: List[Dict[str, Any]], role: str) -> Optional[Dict[str, Any]]:
+    for m in reversed(messages):
+        if m.get("role") == role:
+            return m
+    return None
+
+
+def _state(messages: List[Dict[str, Any]]) -> Dict[str, str]:
+    # parses the "STATE: key=value, ..." system message written by llm_router
+    for m in messages:
+        content = m.get("content") or ""
+        if m.get("role") == "system" and content.startswith("STATE:"):
+            return dict(re.findall(r"(\w+)=([^,]+)", content))
+    return {}
+
+
+def _tool_call(call_id: str, name: str, args: Dict[str, Any]) -> Dict[str, Any]:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+class FakeLLM:
+    def __init__(self, config: Optional[FakeLLMConfig] = None):
+        self.config = config or FakeLLMConfig()
+        self.rng = random.Random(self.config.seed)
+        self.calls = 0
+
+    def route(self, text: str, state: Dict[str, str]) -> Dict[str, Any]:
+        digits = re.search(r"\b\d{2,}\b", text)
+        if state.get("pending_data") == "order_id" and digits:
+            intent = state.get("current_intent", Intent.GET_ORDER_INFORMATION.value)
+        else:
+            intent = IntentClassifier.classify(text).value
+            if intent == Intent.UNKNOWN.value and any(w in text.lower() for w in KNOWLEDGE_WORDS):
+                intent = Intent.KNOWLEDGE_QA.value
+
+        args = {"intent": intent, "confidence": 0.9, "next_action": "respond",
+                "slot_to_request": None, "tool_name": None, "tool_args": None}
+        if intent in ORDER_INTENTS:
+            if digits:
+                args.update(next_action="call_tool", tool_name="get_order", tool_args={"order_id": digits.group(0)})
+            elif state.get("order_id", "None") == "None":
+                args.update(next_action="ask_for_slot", slot_to_request="order_id")
+        return {"tool_calls": [_tool_call("call_route", "route", args)]}
+
+    def generate(self, text: str, state: Dict[str, str]) -> Dict[str, Any]:
+        intent = state.get("current_intent")
+        order_id = state.get("order_id", "None")
+        if intent in ORDER_INTENTS and order_id != "None":
+            return {"tool_calls": [_tool_call("call_order", "get_order", {"order_id": order_id})]}
+        if intent == Intent.KNOWLEDGE_QA.value:
+            return {"tool_calls": [_tool_call("call_ks", "knowledge_search", {"query": text, "top_k": 3})]}
+        if intent == Intent.GREETING.value:
+            return {"content": "Hello! How can I help you today?"}
+        if intent == Intent.GOODBYE.value:
+            return {"content": "Goodbye, have a great day!"}
+        return {"content": "Could you tell me a bit more about what you need?"}
+
+    def answer_from_tool(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        tool = _last(messages, "tool") or {}
+        try:
+            payload = json.loads(tool.get("content") or "{}")
+        except json.JSONDecodeError:
+            payload = {}
+        if "status" in payload:
+            return {"content": f"Your order is {payload['status']} (ETA {payload.get('eta')})."}
+        if payload.get("matches"):
+            return {"content": payload["matches"][0].get("content", "")[:200]}
+        return {"content": "I couldn't find that -- can you double-check the order ID?"}
+
+    def complete(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages", [])
+        tools = [t["function"]["name"] for t in body.get("tools") or []]
+        user = (_last(messages, "user") or {}).get("content") or ""
+        state = _state(messages)
+
+        if "route" in tools:
+            message = self.route(user, state)
+        elif _last(messages, "tool") is not None:
+            message = self.answer_from_tool(messages)
+        elif tools:
+            message = self.generate(user, state)
+        else:
+            message = {"content": "OK."}
+
+        self.calls += 1
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        completion = message.get("content") or json.dumps(message.get("tool_calls"))
+        return {
+            "id": f"chatcmpl-fake-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": message.get("content"),
+                            "tool_calls": message.get("tool_calls")},
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            }],
+            "usage": {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(completion) // 4,
+                      "total_tokens": (prompt_chars + len(completion)) // 4},
+        }
+
+
+# in-process stand-in for AsyncOpenAI with the same answers as the HTTP fake, swapped in as
+# llm_router.client by loadtest.replay. injected errors surface as RuntimeError here
+class FakeAsyncClient:
+    def __init__(self, config: Optional[FakeLLMConfig] = None):
+        self.fake = FakeLLM(config)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **body: Any) -> ChatCompletion:
+        await asyncio.sleep(self.fake.config.latency.sample(self.fake.rng))
+        if self.fake.rng.random() < self.fake.config.error_rate:
+            raise RuntimeError("injected failure")
+        return ChatCompletion.model_validate(self.fake.complete(body))
+
+
+def _stream_chunks(response: Dict[str, Any]) -> List[Dict[str, Any]]:
+    base = {k: response[k] for k in ("id", "created", "model")}
+    message = response["choices"][0]["message"]
+    deltas: List[Dict[str, Any]] = [{"role": "assistant"}]
+    if message.get("tool_calls"):
+        deltas.append({"tool_calls": [dict(call, index=i) for i, call in enumerate(message["tool_calls"])]})
+    else:
+        deltas.extend({"content": word} for word in re.findall(r"\S+\s*", message.get("content") or ""))
+
+    chunks = [dict(base, object="chat.completion.chunk",
+                   choices=[{"index": 0, "delta": d, "finish_reason": None}]) for d in deltas]
+    chunks.append(dict(base, object="chat.completion.chunk",
+                       choices=[{"index": 0, "delta": {}, "finish_reason": response["choices"][0]["finish_reason"]}]))
+    return chunks
+
+
+def create_app(config: Optional[FakeLLMConfig] = None) -> FastAPI:
+    fake = FakeLLM(config)
+    app = FastAPI()
+    app.state.fake = fake
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        await asyncio.sleep(fake.config.latency.sample(fake.rng))
+
+        if fake.rng.random() < fake.config.error_rate:
+            return JSONResponse(
+                {"error": {"message": "injected failure", "type": "server_error", "code": None}},
+                status_code=fake.config.error_status,
+            )
+
+        response = fake.complete(body)
+        if not body.get("stream"):
+            return JSONResponse(response)
+
+        async def events():
+            for chunk in _stream_chunks(response):
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if fake.config.stream_chunk_delay:
+                    await asyncio.sleep(fake.config.stream_chunk_delay)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic fake OpenAI chat completions server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS | uniform:LO,HI | lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.0, help="seconds between streamed chunks")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = FakeLLMConfig(
+        latency=LatencyModel.parse(args.latency),
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        stream_chunk_delay=args.stream_chunk_delay,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
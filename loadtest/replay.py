@@ -0,0 +1,249 @@
+# offline evaluation -- replays stored sessions from chat_messages through the current ChatManager/router
+# and compares intents, tool calls and turn latency against the chat_events recorded at the time.
+# run it before shipping a prompt or model change to catch routing and latency regressions.
+#
+#   python -m loadtest.replay --db data/app.db --llm fake --latency lognormal:150,0.4
+#   python -m loadtest.replay --db prod-copy.db --llm real --limit 200 --min-intent-agreement 0.95
+#
+# sessions are streamed: ids come off a cursor, each session is loaded and replayed by one of
+# `concurrency` workers, and only aggregates are kept, so memory stays flat for any history size
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+import llm_router
+from db.chat_db import SqliteChatRepo
+from loadtest.fake_llm import FakeAsyncClient, FakeLLMConfig, LatencyModel
+from models.batch_runner import bounded_map
+from models.chat_manager import ChatManager
+from models.chat_state import ChatState
+from monitoring.tracing import percentile, tracer
+
+MAX_EXAMPLES = 20
+
+
+@dataclass
+class Turn:
+    user: str
+    assistant: Optional[str] = None
+    intent: Optional[str] = None
+    tools: List[str] = field(default_factory=list)
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class SessionReplay:
+    session_id: str
+    recorded: List[Turn]
+    replayed: List[Turn]
+
+    def pairs(self):
+        return zip(self.recorded, self.replayed)
+
+
+def load_recorded(repo: SqliteChatRepo, session_id: str) -> List[Turn]:
+    # consecutive user messages answered by one reply were a coalesced turn, rebuild it the same way
+    turns: List[Turn] = []
+    parts: List[str] = []
+    for m in repo.get_messages(session_id):
+        if m.role == "user":
+            parts.append(m.content)
+        elif m.role == "assistant" and parts:
+            turns.append(Turn(user="\n".join(parts), assistant=m.content))
+            parts = []
+
+    # per-turn spans are written in finish order: get_intent/tool_call spans, then the enclosing "turn"
+    # span -- so every event up to a "turn" span belongs to that turn (nothing here when tracing was off)
+    index = 0
+    for event in repo.get_events(session_id):
+        if index >= len(turns):
+            break
+        payload = event.payload
+        if event.event_type == "intent_detected":
+            turns[index].intent = payload.get("intent")
+        elif event.event_type == "tool_called":
+            turns[index].tools.append(payload.get("tool"))
+        elif payload.get("span") == "turn":
+            turns[index].latency_ms = payload.get("duration_ms")
+            index += 1
+    return turns
+
+
+async def replay_turns(turns: List[Turn]) -> List[Turn]:
+    state = ChatState()
+    replayed: List[Turn] = []
+    for recorded in turns:
+        turn = Turn(user=recorded.user)
+        start = time.perf_counter()
+        with tracer.collect() as spans:
+            try:
+                turn.assistant = await ChatManager.handle_client_input(recorded.user, state)
+            except Exception as e:
+                turn.error = type(e).__name__
+        turn.latency_ms = round((time.perf_counter() - start) * 1000, 3)
+        for span in spans:
+            if span.name == "get_intent":
+                turn.intent = span.attributes.get("intent")
+            elif span.name == "tool_call":
+                turn.tools.append(span.attributes.get("tool"))
+        replayed.append(turn)
+        if turn.error:
+            break
+    return replayed
+
+
+@dataclass
+class ReplayReport:
+    sessions: int = 0
+    turns: int = 0
+    errors: int = 0
+    intents_compared: int = 0
+    intents_matched: int = 0
+    tools_compared: int = 0
+    tools_matched: int = 0
+    recorded_ms: List[float] = field(default_factory=list)
+    replayed_ms: List[float] = field(default_factory=list)
+    examples: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def intent_agreement(self) -> Optional[float]:
+        return self.intents_matched / self.intents_compared if self.intents_compared else None
+
+    @property
+    def tool_agreement(self) -> Optional[float]:
+        return self.tools_matched / self.tools_compared if self.tools_compared else None
+
+    # replayed p95 over recorded p95, >1 means the new version is slower
+    @property
+    def p95_ratio(self) -> Optional[float]:
+        recorded = percentile(self.recorded_ms, 95)
+        return percentile(self.replayed_ms, 95) / recorded if recorded else None
+
+    def add(self, replay: SessionReplay) -> None:
+        self.sessions += 1
+        for i, (old, new) in enumerate(replay.pairs()):
+            self.turns += 1
+            if new.error:
+                self.errors += 1
+                self._example(replay.session_id, i, old, new, "error")
+                continue
+            if new.latency_ms is not None:
+                self.replayed_ms.append(new.latency_ms)
+            if old.latency_ms is not None:
+                self.recorded_ms.append(old.latency_ms)
+            # turns without a recorded intent (slot fills, tracing off) can't be compared
+            if old.intent is not None:
+                self.intents_compared += 1
+                if old.intent == new.intent:
+                    self.intents_matched += 1
+                else:
+                    self._example(replay.session_id, i, old, new, "intent")
+            if old.intent is not None or old.tools:
+                self.tools_compared += 1
+                if old.tools == new.tools:
+                    self.tools_matched += 1
+                else:
+                    self._example(replay.session_id, i, old, new, "tools")
+
+    def _example(self, session_id: str, index: int, old: Turn, new: Turn, kind: str) -> None:
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append({"session_id": session_id, "turn": index, "kind": kind,
+                                  "recorded": asdict(old), "replayed": asdict(new)})
+
+    def format(self) -> str:
+        def pct(value: Optional[float]) -> str:
+            return "n/a" if value is None else f"{value:.1%}"
+
+        def latency(values: List[float]) -> str:
+            return f"p50={percentile(values, 50):.1f}ms p95={percentile(values, 95):.1f}ms" if values else "n/a"
+
+        lines = [
+            f"sessions          {self.sessions} ({self.turns} turns, {self.errors} errors)",
+            f"intent agreement  {pct(self.intent_agreement)} of {self.intents_compared} turns",
+            f"tool agreement    {pct(self.tool_agreement)} of {self.tools_compared} turns",
+            f"recorded latency  {latency(self.recorded_ms)}",
+            f"replayed latency  {latency(self.replayed_ms)}",
+        ]
+        for ex in self.examples[:5]:
+            old, new = ex["recorded"], ex["replayed"]
+            lines.append(f"mismatch          {ex['kind']} {ex['session_id']}#{ex['turn']}: "
+                         f"{old['intent']} {old['tools']} -> {new['intent']} {new['tools']} {new['error'] or ''}".rstrip())
+        return "\n".join(lines)
+
+    # reasons the replay should fail a deploy check, empty when it passes
+    def regressions(self, min_intent_agreement: float = 0.0, max_p95_ratio: Optional[float] = None) -> List[str]:
+        found = []
+        if self.intent_agreement is not None and self.intent_agreement < min_intent_agreement:
+            found.append(f"intent agreement {self.intent_agreement:.1%} < {min_intent_agreement:.1%}")
+        ratio = self.p95_ratio
+        if max_p95_ratio is not None and ratio is not None and ratio > max_p95_ratio:
+            found.append(f"p95 latency x{ratio:.2f} > x{max_p95_ratio:.2f}")
+        if self.errors:
+            found.append(f"{self.errors} turns raised")
+        return found
+
+
+async def replay_sessions(repo: SqliteChatRepo, session_ids: Iterable[str], concurrency: int = 16,
+                          report: Optional[ReplayReport] = None, sink=None) -> ReplayReport:
+    report = report or ReplayReport()
+
+    async def one(session_id: str) -> SessionReplay:
+        recorded = await asyncio.to_thread(load_recorded, repo, session_id)
+        return SessionReplay(session_id, recorded, await replay_turns(recorded))
+
+    # spans are needed to see the replayed intents and tool calls
+    was_enabled = tracer.enabled
+    tracer.enabled = True
+    try:
+        async for replay in bounded_map(one, session_ids, concurrency):
+            report.add(replay)
+            if sink is not None:
+                sink.write(json.dumps({"session_id": replay.session_id,
+                                       "recorded": [asdict(t) for t in replay.recorded],
+                                       "replayed": [asdict(t) for t in replay.replayed]}) + "\n")
+    finally:
+        tracer.enabled = was_enabled
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="replay stored chat sessions and compare against what was recorded")
+    parser.add_argument("--db", default=None, help="sqlite file to read (default: DB_PATH / data/app.db)")
+    parser.add_argument("--since", default=None, help="only sessions created at or after this ISO timestamp")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm", choices=["fake", "real"], default="fake")
+    parser.add_argument("--latency", default="fixed:0", help="fake LLM latency, see loadtest.fake_llm")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write per-session comparisons as NDJSON")
+    parser.add_argument("--min-intent-agreement", type=float, default=0.0)
+    parser.add_argument("--max-p95-ratio", type=float, default=None, help="fail if replayed p95 / recorded p95 exceeds this")
+    args = parser.parse_args()
+
+    if args.llm == "fake":
+        llm_router.client = FakeAsyncClient(FakeLLMConfig(latency=LatencyModel.parse(args.latency), seed=args.seed))
+
+    repo = SqliteChatRepo(args.db)
+    sink = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        report = asyncio.run(replay_sessions(repo, repo.iter_session_ids(args.since, args.limit),
+                                             args.concurrency, sink=sink))
+    finally:
+        if sink is not None:
+            sink.close()
+
+    print(report.format())
+    problems = report.regressions(args.min_intent_agreement, args.max_p95_ratio)
+    for problem in problems:
+        print(f"REGRESSION        {problem}", file=sys.stderr)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
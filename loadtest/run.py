@@ -0,0 +1,314 @@
+# load generator -- opens many concurrent WebSocket sessions against server.py and replays scripted
+# conversations, then reports throughput, turn latency percentiles, memory and event-loop lag
+#
+# "client lag" is this process's own loop -- if it's high the numbers above it are suspect. "server lag"
+# is scraped from the server's event_loop_lag_seconds histogram on /metrics (needs DIAGNOSTICS_ENABLED=1,
+# which --spawn sets). each worker has its own registry and a scrape lands on one of them, so with
+# --workers N we scrape a few times and report the worst worker seen
+#
+#   python -m loadtest.run --spawn --sessions 2000 --latency lognormal:150,0.4
+#   python -m loadtest.run --url ws://localhost:8000/ws --sessions 500 --scenario order_lookup
+
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from loadtest.scenarios import SCENARIOS, pick_scripts
+from monitoring.tracing import percentile
+
+
+@dataclass
+class SessionResult:
+    latencies: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class LoadReport:
+    sessions: int
+    failed: int
+    turns: int
+    elapsed_s: float
+    latencies: List[float]
+    loop_lag: List[float]
+    errors: List[str]
+    # pid -> MB for the server process and every worker under it
+    server_rss_mb: Dict[int, float] = field(default_factory=dict)
+    server_lag_p99: Optional[float] = None
+    server_lag_mean: Optional[float] = None
+
+    @property
+    def turns_per_s(self) -> float:
+        return self.turns / self.elapsed_s if self.elapsed_s else 0.0
+
+    def format(self) -> str:
+        ms = [x * 1000 for x in self.latencies]
+        lag = [x * 1000 for x in self.loop_lag]
+        lines = [
+            f"sessions        {self.sessions} ({self.failed} failed)",
+            f"turns           {self.turns} in {self.elapsed_s:.2f}s -> {self.turns_per_s:.1f} turns/s",
+            f"turn latency    p50={percentile(ms, 50):.1f}ms p95={percentile(ms, 95):.1f}ms "
+            f"p99={percentile(ms, 99):.1f}ms max={max(ms, default=0):.1f}ms",
+            f"client lag      p99={percentile(lag, 99):.1f}ms max={max(lag, default=0):.1f}ms",
+            f"client max rss  {client_max_rss_mb():.1f} MB",
+        ]
+        if self.server_lag_p99 is not None:
+            lines.append(f"server lag      p99<={self.server_lag_p99 * 1000:.1f}ms "
+                         f"mean={(self.server_lag_mean or 0) * 1000:.1f}ms")
+        if self.server_rss_mb:
+            per_pid = " ".join(f"{pid}={mb:.1f}" for pid, mb in sorted(self.server_rss_mb.items()))
+            lines.append(f"server rss      {sum(self.server_rss_mb.values()):.1f} MB ({per_pid})")
+        for error in sorted(set(self.errors))[:5]:
+            lines.append(f"error           {error} x{self.errors.count(error)}")
+        return "\n".join(lines)
+
+
+def client_max_rss_mb() -> float:
+    # ru_maxrss is KiB on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+def child_pids(pid: int) -> List[int]:
+    # pid plus all its descendants -- uvicorn --workers N forks the workers under a supervisor
+    parents: Dict[int, int] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r", encoding="utf-8") as f:
+                # comm can contain spaces and parens, ppid is the second field after its closing paren
+                parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    found, frontier = [pid], [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [p for p, pp in parents.items() if pp == parent]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def server_rss(pid: int) -> Dict[int, float]:
+    rss = {p: process_rss_mb(p) for p in child_pids(pid)}
+    return {p: mb for p, mb in rss.items() if mb is not None}
+
+
+def parse_histogram(text: str, name: str) -> Optional[Tuple[List[Tuple[float, int]], float, int]]:
+    # (cumulative buckets, sum, count) from prometheus text, label sets added together
+    buckets: Dict[float, int] = {}
+    total, count, seen = 0.0, 0, False
+    for line in text.splitlines():
+        if not line.startswith(name):
+            continue
+        series, _, value = line.rpartition(" ")
+        if series.startswith(f"{name}_bucket"):
+            le = series.split('le="', 1)[1].split('"', 1)[0]
+            bound = float("inf") if le == "+Inf" else float(le)
+            buckets[bound] = buckets.get(bound, 0) + int(float(value))
+        elif series.startswith(f"{name}_sum"):
+            total += float(value)
+        elif series.startswith(f"{name}_count"):
+            count += int(float(value))
+            seen = True
+    if not seen:
+        return None
+    return sorted(buckets.items()), total, count
+
+
+def bucket_quantile(buckets: List[Tuple[float, int]], count: int, q: float) -> float:
+    # upper bound of the bucket the q-th sample falls in -- all a histogram can tell us
+    for bound, cumulative in buckets:
+        if cumulative >= q * count:
+            return bound
+    return float("inf")
+
+
+def scrape_server_lag(metrics_url: str, scrapes: int = 1,
+                      timeout: float = 5.0) -> Tuple[Optional[float], Optional[float]]:
+    # (p99, mean) of event_loop_lag_seconds, worst of `scrapes` requests
+    worst: Tuple[Optional[float], Optional[float]] = (None, None)
+    for _ in range(scrapes):
+        try:
+            with urllib.request.urlopen(metrics_url, timeout=timeout) as res:
+                text = res.read().decode("utf-8")
+        except OSError:
+            continue
+        parsed = parse_histogram(text, "event_loop_lag_seconds")
+        if parsed is None or not parsed[2]:
+            continue
+        buckets, total, count = parsed
+        p99 = bucket_quantile(buckets, count, 0.99)
+        if worst[0] is None or p99 > worst[0]:
+            worst = (p99, total / count)
+    return worst
+
+
+def metrics_url_for(ws_url: str) -> str:
+    # ws://host:port/ws -> http://host:port/metrics
+    scheme, rest = ws_url.split("://", 1)
+    host = rest.split("/", 1)[0]
+    return f"{'https' if scheme == 'wss' else 'http'}://{host}/metrics"
+
+
+async def sample_loop_lag(samples: List[float], stop: asyncio.Event, interval: float = 0.05) -> None:
+    # how late the loop wakes us up compared to the requested sleep
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - start - interval))
+
+
+async def run_session(url: str, script: List[str], timeout: float, think_time: float) -> SessionResult:
+    import websockets
+
+    result = SessionResult()
+    try:
+        async with websockets.connect(url, open_timeout=timeout, max_size=None) as ws:
+            for message in script:
+                start = time.perf_counter()
+                await ws.send(message)
+                await asyncio.wait_for(ws.recv(), timeout)
+                result.latencies.append(time.perf_counter() - start)
+                if think_time:
+                    await asyncio.sleep(think_time)
+    except Exception as e:
+        result.error = type(e).__name__
+    return result
+
+
+async def run_load(url: str, scripts: List[List[str]], concurrency: int, timeout: float = 30.0,
+                   think_time: float = 0.0, ramp_s: float = 0.0) -> LoadReport:
+    limit = asyncio.Semaphore(concurrency)
+    lag: List[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(sample_loop_lag(lag, stop))
+
+    async def one(i: int, script: List[str]) -> SessionResult:
+        if ramp_s:
+            await asyncio.sleep(ramp_s * i / len(scripts))
+        async with limit:
+            return await run_session(url, script, timeout, think_time)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i, s) for i, s in enumerate(scripts)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await lag_task
+
+    latencies = [x for r in results for x in r.latencies]
+    errors = [r.error for r in results if r.error]
+    return LoadReport(
+        sessions=len(results),
+        failed=len(errors),
+        turns=len(latencies),
+        elapsed_s=elapsed,
+        latencies=latencies,
+        loop_lag=lag,
+        errors=errors,
+    )
+
+
+def _wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with socket.socket() as s:
+            if s.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def spawn_stack(args: argparse.Namespace) -> List[subprocess.Popen]:
+    # fake LLM + server.py pointed at it, both on localhost
+    fake = subprocess.Popen([
+        sys.executable, "-m", "loadtest.fake_llm", "--port", str(args.llm_port),
+        "--latency", args.latency, "--error-rate", str(args.error_rate), "--seed", str(args.seed),
+    ])
+    _wait_for_port(args.llm_port)
+
+    env = dict(os.environ,
+               OPENAI_BASE_URL=f"http://127.0.0.1:{args.llm_port}/v1",
+               OPENAI_API_KEY="fake-key",
+               DB_PATH=args.db_path)
+    # the server's own loop-lag sampler, scraped from /metrics after the run
+    env.setdefault("DIAGNOSTICS_ENABLED", "1")
+    subprocess.run([sys.executable, "-m", "db.init_db"], env=env, check=True)
+    server = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "server:app", "--port", str(args.port),
+        "--workers", str(args.workers), "--log-level", "warning",
+    ], env=env)
+    _wait_for_port(args.port)
+    return [fake, server]
+
+
+def _raise_fd_limit() -> None:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="WebSocket load generator for server.py")
+    parser.add_argument("--url", default=None, help="ws URL of a running server (default: spawned stack)")
+    parser.add_argument("--spawn", action="store_true", help="start the fake LLM and server.py locally")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=None, help="open sessions at once (default: all)")
+    parser.add_argument("--scenario", default="mix", choices=["mix", *SCENARIOS])
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--ramp", type=float, default=0.0, help="seconds over which sessions are started")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--llm-port", type=int, default=9000)
+    parser.add_argument("--latency", default="lognormal:150,0.4")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--db-path", default="data/loadtest.db")
+    parser.add_argument("--metrics-url", default=None,
+                        help="server /metrics to read event-loop lag from (default: derived from the ws URL)")
+    args = parser.parse_args()
+
+    if not args.url and not args.spawn:
+        parser.error("pass --url or --spawn")
+
+    _raise_fd_limit()
+    procs = spawn_stack(args) if args.spawn else []
+    url = args.url or f"ws://127.0.0.1:{args.port}/ws"
+    try:
+        scripts = pick_scripts(args.scenario, args.sessions, args.seed)
+        report = asyncio.run(run_load(url, scripts, args.concurrency or args.sessions,
+                                      args.timeout, args.think_time, args.ramp))
+        report.server_lag_p99, report.server_lag_mean = scrape_server_lag(
+            args.metrics_url or metrics_url_for(url), scrapes=args.workers * 3)
+        if args.spawn:
+            report.server_rss_mb = server_rss(procs[1].pid)
+        print(report.format())
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# scripted conversations replayed by the load generator -- order ids match models.order_service.FAKE_ORDERS
+# ("999" is intentionally unknown so the not-found path gets load too)
+
+import random
+from typing import Dict, List
+
+SCENARIOS: Dict[str, List[str]] = {
+    "greeting": ["hi there", "bye"],
+    "order_lookup": ["where is my order?", "124"],
+    "order_inline": ["what is the status of order 555"],
+    "order_not_found": ["i want a refund", "999"],
+    "knowledge": ["what is your return policy?", "how long is the warranty?"],
+}
+
+# relative weights for the default "mix"
+MIX_WEIGHTS: Dict[str, int] = {
+    "greeting": 1,
+    "order_lookup": 4,
+    "order_inline": 2,
+    "order_not_found": 1,
+    "knowledge": 3,
+}
+
+
+def pick_scripts(name: str, sessions: int, seed: int = 0) -> List[List[str]]:
+    if name != "mix":
+        return [SCENARIOS[name]] * sessions
+
+    rng = random.Random(seed)
+    names = list(MIX_WEIGHTS)
+    weights = [MIX_WEIGHTS[n] for n in names]
+    return [SCENARIOS[n] for n in rng.choices(names, weights=weights, k=sessions)]
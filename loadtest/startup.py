@@ -0,0 +1,90 @@
+# cold-start timings for a server worker, each run in a fresh interpreter so nothing is already imported:
+#   import          import server (module scope only, nothing is built here)
+#   warm_up         the lifespan startup -- knowledge index, db, LLM client (WARMUP=0 skips it)
+#   first_response  connect a websocket and get the reply to one order question, LLM faked out
+#
+#   python -m loadtest.startup --runs 5
+#   python -m loadtest.startup --runs 5 --no-warmup
+#
+# the scratch database lives in a temp dir, data/app.db is never touched
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+from db.init_db import init_db
+
+STAGES = ("import", "warm_up", "first_response")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs in the child. the real client is built by the warm-up (that's part of the cold start) and then
+# swapped for the fake, so the first reply measures our own code path rather than the API
+_CHILD = """
+import json, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+
+import llm_router
+from fastapi.testclient import TestClient
+from loadtest.fake_llm import FakeAsyncClient, FakeLLMConfig
+
+client = TestClient(server.app)
+before_warm_up = time.perf_counter()
+with client:
+    ready = time.perf_counter()
+    llm_router.client = FakeAsyncClient(FakeLLMConfig())
+    with client.websocket_connect("/ws") as ws:
+        ws.send_text("where is my order 124")
+        ws.receive_text()
+    answered = time.perf_counter()
+
+print(json.dumps({
+    "import": imported - start,
+    "warm_up": ready - before_warm_up,
+    "first_response": answered - ready,
+}))
+"""
+
+
+def measure(warmup: bool = True, env: Optional[Dict[str, str]] = None) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "app.db")
+        init_db(db_path)
+        # no debounce, otherwise every first reply waits out the 150ms coalescing window
+        child_env = {**os.environ, "DB_PATH": db_path, "WARMUP": "1" if warmup else "0", "INPUT_DEBOUNCE_MS": "0",
+                     "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "startup-bench"), **(env or {})}
+        out = subprocess.run([sys.executable, "-c", _CHILD], cwd=ROOT, env=child_env,
+                             capture_output=True, text=True, check=True)
+    timings = json.loads(out.stdout.strip().splitlines()[-1])
+    timings["total"] = sum(timings[stage] for stage in STAGES)
+    return timings
+
+
+def summarize(runs: List[Dict[str, float]]) -> str:
+    lines = []
+    for stage in STAGES + ("total",):
+        values = [r[stage] * 1000 for r in runs]
+        lines.append(f"{stage:<15} median={statistics.median(values):7.1f}ms  min={min(values):7.1f}ms  max={max(values):7.1f}ms")
+    return "\n".join(lines)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="measure server import time and time to first response")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-warmup", dest="warmup", action="store_false", help="run with WARMUP=0")
+    args = parser.parse_args()
+
+    runs = [measure(args.warmup) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts, warm-up {'on' if args.warmup else 'off'}")
+    print(summarize(runs))
+
+
+if __name__ == "__main__":
+    main()
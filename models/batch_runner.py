@@ -0,0 +1,183 @@
+# runs many whole conversations through ChatManager with bounded concurrency -- shared by
+# POST /v1/chat/batch and the CLI below. Results come back in completion order.
+#
+#   python -m models.batch_runner conversations.jsonl --concurrency 32 > results.jsonl
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, TypeVar
+
+import llm_router
+from models.chat_manager import ChatManager
+from models.chat_state import ChatState
+from monitoring.metrics import BATCH_CONVERSATIONS
+
+DEFAULT_CONCURRENCY = 16
+MAX_CONCURRENCY = 256
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class BatchConversation:
+    id: str
+    messages: List[str] = field(default_factory=list)
+    error: Optional[str] = None   # set when the input line itself was unusable
+
+
+# accepts {"id": ..., "messages": [...]}, {"id": ..., "text": "..."} or a bare list of messages
+def parse_conversation(raw: Any, index: int) -> BatchConversation:
+    if isinstance(raw, list):
+        raw = {"messages": raw}
+    if not isinstance(raw, dict):
+        return BatchConversation(id=str(index), error="conversation must be an object or a list of messages")
+
+    conv_id = str(raw.get("id", index))
+    messages = raw.get("messages")
+    if messages is None and "text" in raw:
+        messages = [raw["text"]]
+    if not isinstance(messages, list) or not all(isinstance(m, str) for m in messages):
+        return BatchConversation(id=conv_id, error="messages must be a list of strings")
+    return BatchConversation(id=conv_id, messages=messages)
+
+
+def parse_jsonl(lines: Iterable[str]) -> Iterable[BatchConversation]:
+    index = 0
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield parse_conversation(json.loads(line), index)
+        except json.JSONDecodeError as e:
+            yield BatchConversation(id=str(index), error=f"invalid json: {e.msg}")
+        index += 1
+
+
+async def run_conversation(conv: BatchConversation) -> Dict[str, Any]:
+    if conv.error:
+        BATCH_CONVERSATIONS.inc(status="invalid")
+        return {"type": "result", "id": conv.id, "error": conv.error}
+
+    state = ChatState()
+    state.user_data["session_id"] = f"batch-{conv.id}"
+    turns = []
+    start = time.perf_counter()
+    # LLM calls from here go through the batch breaker
+    token = llm_router.batch_calls.set(True)
+    try:
+        for message in conv.messages:
+            reply = await ChatManager.handle_client_input(message, state)
+            turns.append({
+                "user": message,
+                "assistant": reply,
+                "intent": state.current_intent.value if state.current_intent else None,
+                "pending_data": state.pending_data,
+            })
+    except Exception as e:
+        BATCH_CONVERSATIONS.inc(status="failed")
+        return {"type": "result", "id": conv.id, "turns": turns, "error": f"{type(e).__name__}: {e}"}
+    finally:
+        llm_router.batch_calls.reset(token)
+
+    BATCH_CONVERSATIONS.inc(status="ok")
+    return {"type": "result", "id": conv.id, "turns": turns, "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+# applies func to items with at most `concurrency` calls in flight, yielding results as they finish.
+# the items iterator is consumed lazily so a large input is never fully in memory
+async def bounded_map(func: Callable[[T], Awaitable[R]], items: Iterable[T], concurrency: int) -> AsyncIterator[R]:
+    concurrency = max(1, concurrency)
+    source = iter(items)
+    results: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=concurrency * 2)
+    finished = object()
+
+    async def worker() -> None:
+        # workers share one iterator; next() never awaits, so each item is taken exactly once
+        for item in source:
+            await results.put(await func(item))
+
+    async def run_workers() -> None:
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            await results.put(finished)
+
+    runner = asyncio.create_task(run_workers())
+    try:
+        while True:
+            result = await results.get()
+            if result is finished:
+                break
+            yield result
+        runner.result()
+    finally:
+        runner.cancel()
+
+
+async def run_batch(conversations: Iterable[BatchConversation], concurrency: int = DEFAULT_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    async for result in bounded_map(run_conversation, conversations, min(concurrency, MAX_CONCURRENCY)):
+        yield result
+
+
+async def run_batch_with_summary(conversations: Iterable[BatchConversation], concurrency: int = DEFAULT_CONCURRENCY) -> AsyncIterator[Dict[str, Any]]:
+    done = failed = 0
+    start = time.perf_counter()
+    async for result in run_batch(conversations, concurrency):
+        done += 1
+        failed += "error" in result
+        yield result
+
+    elapsed = time.perf_counter() - start
+    yield {
+        "type": "summary",
+        "conversations": done,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        "per_minute": round(done / elapsed * 60, 1) if elapsed else None,
+    }
+
+
+async def _run_cli(lines: Iterable[str], out, concurrency: int, progress_every: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    summary: Dict[str, Any] = {}
+    done = 0
+    async for item in run_batch_with_summary(parse_jsonl(lines), concurrency):
+        if item["type"] == "summary":
+            summary = item
+            continue
+        out.write(json.dumps(item) + "\n")
+        done += 1
+        if progress_every and done % progress_every == 0:
+            rate = done / (time.perf_counter() - start) * 60
+            print(f"{done} conversations done ({rate:.0f}/min)", file=sys.stderr, flush=True)
+    return summary
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="run JSONL conversations through the chat pipeline")
+    parser.add_argument("input", help="JSONL file, one conversation per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="NDJSON results ('-' for stdout)")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+
+    src = sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")
+    out = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        summary = asyncio.run(_run_cli(src, out, args.concurrency, args.progress_every))
+    finally:
+        if src is not sys.stdin:
+            src.close()
+        if out is not sys.stdout:
+            out.close()
+    print(json.dumps(summary), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
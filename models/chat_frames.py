@@ -0,0 +1,172 @@
+# frames on the chat websocket.
+#
+# versioned protocol, negotiated at the handshake through Sec-WebSocket-Protocol -- the client offers
+# e.g. ["chat.v1.msgpack", "chat.v1.json"] and the server accepts the first one it supports. every frame
+# is one envelope {"v": 1, "type": ..., ...}; chat.v1.json sends it as a JSON text frame, chat.v1.msgpack
+# as a msgpack binary frame (only offered when msgpack is installed).
+#
+#   client -> server   message  {"id": "c-42", "text": "where is my order?"}
+#                      ping     {}                       answered with pong, for app-level RTT
+#                      typing   {"active": true}         accepted and ignored for now
+#   server -> client   hello    {"session_id": ..., "protocol": ...}   first frame after the handshake
+#                      reply    {"reply_to": ["c-42"], "text": ..., "replay": false}
+#                      typing   {"active": true}         a turn started; its reply ends it
+#                      notice   {"text": ...}            e.g. the position in the waiting room
+#                      pong     {}
+#                      error    {"code": ..., "detail": ...}   bad frame, the connection stays open
+#
+# no subprotocol is the plain-text fallback: text frames in both directions, except that a client may
+# send {"type": "message", "id": ..., "text": ...} JSON frames for resend dedupe
+# (models/message_dedupe.py) and then gets JSON reply frames back.
+#
+# compression is the transport's job: uvicorn negotiates permessage-deflate with clients that offer it
+# (every browser does), which pays off on long, tool-grounded answers
+
+import json
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+PROTOCOL_VERSION = 1
+JSON_PROTOCOL = "chat.v1.json"
+MSGPACK_PROTOCOL = "chat.v1.msgpack"
+MAX_MESSAGE_ID_CHARS = 128
+
+Payload = Union[str, bytes]
+
+
+class FrameError(ValueError):
+    """A frame that doesn't decode into a valid envelope."""
+
+
+@dataclass(frozen=True)
+class ClientFrame:
+    text: str = ""
+    message_id: Optional[str] = None
+    structured: bool = False      # sent as an envelope rather than plain text
+    type: str = "message"
+
+
+@dataclass(frozen=True)
+class Codec:
+    encode: Callable[[Dict[str, Any]], Payload]
+    decode: Callable[[Payload], Any]
+
+
+def _json_decode(data: Payload) -> Any:
+    if not isinstance(data, str):
+        raise FrameError("expected a text frame")
+    return json.loads(data)
+
+
+def _msgpack_decode(data: Payload) -> Any:
+    if not isinstance(data, bytes):
+        raise FrameError("expected a binary frame")
+    return msgpack.unpackb(data, raw=False)
+
+
+CODECS: Dict[str, Codec] = {JSON_PROTOCOL: Codec(json.dumps, _json_decode)}
+if msgpack is not None:
+    CODECS[MSGPACK_PROTOCOL] = Codec(msgpack.packb, _msgpack_decode)
+
+
+# the first protocol the client offered that we speak, None for the plain-text fallback
+def negotiate(offered: Sequence[str]) -> Optional[str]:
+    for protocol in offered:
+        if protocol in CODECS:
+            return protocol
+    return None
+
+
+def _message_id(value: Any) -> Optional[str]:
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value or len(value) > MAX_MESSAGE_ID_CHARS:
+        return None
+    return value
+
+
+# plain-text fallback: anything that isn't a message frame is the user's text as typed
+def parse_client_frame(data: str) -> ClientFrame:
+    if not data.lstrip().startswith("{"):
+        return ClientFrame(text=data)
+    try:
+        frame = json.loads(data)
+    except ValueError:
+        return ClientFrame(text=data)
+    if not isinstance(frame, dict) or frame.get("type") != "message" or not isinstance(frame.get("text"), str):
+        # just a message that happens to look like JSON
+        return ClientFrame(text=data)
+    return ClientFrame(text=frame["text"], message_id=_message_id(frame.get("id")), structured=True)
+
+
+def reply_frame(text: str, reply_to: List[str], replay: bool = False) -> str:
+    return json.dumps({"type": "reply", "reply_to": reply_to, "text": text, "replay": replay})
+
+
+# how one connection's frames are encoded, fixed at the handshake
+class Framing:
+    def __init__(self, protocol: Optional[str] = None):
+        self.protocol = protocol
+        self.codec = CODECS.get(protocol) if protocol else None
+        # fallback only: reply in JSON once the client has sent a JSON message frame
+        self.json_replies = False
+
+    @property
+    def versioned(self) -> bool:
+        return self.codec is not None
+
+    def _encode(self, type_: str, **fields: Any) -> Payload:
+        return self.codec.encode({"v": PROTOCOL_VERSION, "type": type_, **fields})
+
+    def decode(self, data: Payload) -> ClientFrame:
+        if not self.versioned:
+            if isinstance(data, bytes):
+                data = data.decode("utf-8", errors="replace")
+            frame = parse_client_frame(data)
+            self.json_replies = self.json_replies or frame.structured
+            return frame
+
+        try:
+            envelope = self.codec.decode(data)
+        except FrameError:
+            raise
+        except Exception as e:
+            raise FrameError(f"undecodable frame: {e}") from None
+        if not isinstance(envelope, dict):
+            raise FrameError("frame must be an object")
+        if envelope.get("v", PROTOCOL_VERSION) != PROTOCOL_VERSION:
+            raise FrameError(f"unsupported protocol version {envelope.get('v')!r}")
+        type_ = envelope.get("type")
+        if type_ == "message":
+            if not isinstance(envelope.get("text"), str):
+                raise FrameError("message frame needs a text")
+            return ClientFrame(text=envelope["text"], message_id=_message_id(envelope.get("id")), structured=True)
+        if type_ in ("ping", "typing"):
+            return ClientFrame(structured=True, type=type_)
+        raise FrameError(f"unknown frame type {type_!r}")
+
+    def hello(self, session_id: str) -> Optional[Payload]:
+        return self._encode("hello", session_id=session_id, protocol=self.protocol) if self.versioned else None
+
+    def reply(self, text: str, reply_to: List[str], replay: bool = False) -> Payload:
+        if self.versioned:
+            return self._encode("reply", reply_to=reply_to, text=text, replay=replay)
+        return reply_frame(text, reply_to, replay) if self.json_replies else text
+
+    def notice(self, text: str) -> Payload:
+        return self._encode("notice", text=text) if self.versioned else text
+
+    # control frames have no plain-text form
+    def typing(self, active: bool) -> Optional[Payload]:
+        return self._encode("typing", active=active) if self.versioned else None
+
+    def pong(self) -> Optional[Payload]:
+        return self._encode("pong") if self.versioned else None
+
+    def error(self, code: str, detail: str) -> Optional[Payload]:
+        return self._encode("error", code=code, detail=detail) if self.versioned else None
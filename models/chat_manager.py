@@ -1,9 +1,28 @@
 # wrapper for all of the helper classes for getting message -- called by server, and this class
 # will call all other classes, message_creator(replaced by this class), intent_classifier, etc. 
+import asyncio
+import os
+import re
+from typing import Optional, Tuple
+
+import llm_router
+
 from models.intent_classifier import IntentClassifier
 from models.intent import Intent
 from models.chat_state import ChatState
-from llm_router import get_intent, generate_result
+from llm_router import LLMUnavailableError, get_intent, generate_result
+from models.degraded_mode import degraded_reply
+from models.input_pipeline import first_message
+
+ORDER_INTENTS = (Intent.GET_ORDER_INFORMATION, Intent.REFUND_ORDER)
+
+# ORDER_PREFETCH=0 leaves the get_order decision to the generator model again
+ORDER_PREFETCH = os.getenv("ORDER_PREFETCH", "1").strip().lower() not in ("0", "false", "no", "off")
+# what an order id typed into a message looks like, for the lookup that runs alongside the route call
+_order_id_in_text = re.compile(r"\b\d{3,}\b")
+
+# (order_id, lookup task)
+Lookup = Tuple[str, asyncio.Task]
 
 
 SLOT_PROMPTS = {
@@ -21,15 +40,26 @@ class ChatManager:
 
         if not message:
             return "Please ask your quesion here, can't help if you don't type anything!"
-        
+
+        snapshot = state.to_dict()
+        try:
+            return await ChatManager._handle_with_llm(message, state)
+        except LLMUnavailableError:
+            # provider down or breaker open -- undo whatever the turn changed and answer it locally
+            state.restore(snapshot)
+            return await degraded_reply(message, state)
+
+    @staticmethod
+    async def _handle_with_llm(message: str, state: ChatState) -> str:
         # checks if we are still needing to do something, ie order lookup, 
         if state.pending_data:
             slot = state.pending_data
-            state.user_data[slot] = message
+            state.user_data[slot] = first_message(message)
             state.pending_data = None
 
-            # now get result here instead of rerouting below
-            result = await generate_result(message, state)
+            # now get result here instead of rerouting below; no route call to overlap with, the
+            # lookup just spares the model's get_order decision
+            result = await generate_result(message, state, prefetched=_order_lookup(state))
 
             # if we still need a slot, handle here -- shold only happen with bad user input or bad llm response
             if result.next_action == "ask_for_slot" and result.slot_to_request:
@@ -38,14 +68,24 @@ class ChatManager:
             
             return result.response_text or "Got it."
         
-        intent = await get_intent(message, state)
-        state.current_intent = intent.intent
-
-        if intent.next_action == "ask_for_slot" and intent.slot_to_request:
-            state.pending_data = intent.slot_to_request
-            return SLOT_PROMPTS.get(intent.slot_to_request, "What more informtion can you provide so I can lookup your order?")
-        
-        result = await generate_result(message, state)
+        # an id in the message is looked up while the route call runs; unused if it isn't an order turn
+        speculative = _speculative_lookup(message)
+        try:
+            intent = await get_intent(message, state)
+            state.current_intent = intent.intent
+
+            # the router already pulled the order id out of the message
+            if intent.tool_name == "get_order" and (intent.tool_args or {}).get("order_id"):
+                state.user_data["order_id"] = str(intent.tool_args["order_id"])
+
+            if intent.next_action == "ask_for_slot" and intent.slot_to_request:
+                state.pending_data = intent.slot_to_request
+                return SLOT_PROMPTS.get(intent.slot_to_request, "What more informtion can you provide so I can lookup your order?")
+
+            result = await generate_result(message, state, prefetched=_order_lookup(state, speculative))
+        finally:
+            if speculative is not None:
+                speculative[1].cancel()
         if result.next_action == "ask_for_slot" and result.slot_to_request:
             state.pending_data = result.slot_to_request
             return SLOT_PROMPTS.get(result.slot_to_request, "Can you provide some more information?")
@@ -53,6 +93,26 @@ class ChatManager:
         return result.response_text or "Got it."
 
 
+# the first order id in a message, looked up before the router has said whether this is an order turn.
+# lookups go through OrderService, whose TTL cache and coalescing keep a wasted one cheap
+def _speculative_lookup(message: str) -> Optional[Lookup]:
+    found = _order_id_in_text.search(message) if ORDER_PREFETCH else None
+    if found is None:
+        return None
+    return found.group(0), asyncio.create_task(llm_router.get_order(found.group(0)))
+
+
+# the get_order result for an order turn with a known id, so generate_result can skip asking the model
+# whether to call get_order -- the speculative lookup when it was for the same id, a new one otherwise
+def _order_lookup(state: ChatState, speculative: Optional[Lookup] = None) -> Optional[asyncio.Task]:
+    order_id = state.user_data.get("order_id")
+    if not ORDER_PREFETCH or state.current_intent not in ORDER_INTENTS or not order_id:
+        return None
+    if speculative is not None and speculative[0] == str(order_id):
+        return speculative[1]
+    return asyncio.create_task(llm_router.get_order(str(order_id)))
+
+
 
         
 
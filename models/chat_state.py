@@ -3,7 +3,7 @@
 from models.intent import Intent
 from dataclasses import dataclass, field
 
-from typing import Optional
+from typing import Any, Dict, Optional
 
 # instantated on a per connection basis, stored in db (sqlite -> eventually ling term like postgres)
 
@@ -20,3 +20,29 @@ class ChatState:
     pending_data: Optional[str] = None            # like user_id used for state preservation across messages with same intent (refund)
     user_data: dict  = field(default_factory=dict)        # like {"user_id" : "123"}
 
+    # plain-json form used by the session stores so a session can move between workers
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "chat_history": list(self.chat_history),
+            "current_intent": self.current_intent.value if self.current_intent else None,
+            "pending_data": self.pending_data,
+            "user_data": dict(self.user_data),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ChatState":
+        intent = data.get("current_intent")
+        return cls(
+            chat_history=list(data.get("chat_history") or []),
+            current_intent=Intent(intent) if intent else None,
+            pending_data=data.get("pending_data"),
+            user_data=dict(data.get("user_data") or {}),
+        )
+
+    # roll back in place to a to_dict() snapshot, e.g. when a turn is cancelled halfway through
+    def restore(self, data: Dict[str, Any]) -> None:
+        snapshot = ChatState.from_dict(data)
+        self.chat_history = snapshot.chat_history
+        self.current_intent = snapshot.current_intent
+        self.pending_data = snapshot.pending_data
+        self.user_data = snapshot.user_data
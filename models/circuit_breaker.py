@@ -0,0 +1,146 @@
+# circuit breaker around the LLM provider. every call is capped by a timeout and recorded in a rolling
+# window; once enough of the window failed or was slower than the latency SLO the breaker opens and
+# calls fail straight away (ChatManager answers those turns locally, see models/degraded_mode.py).
+# after open_s one call is let through as a probe: success closes the breaker, failure re-opens it.
+# every state change starts a new generation and a call only counts in the generation it was admitted
+# in -- a slow call from before the breaker opened can't close it, re-open it or outvote the probe.
+# is_failure decides which exceptions say something about the provider; the rest (bad requests, bugs
+# in our own code) are re-raised without being counted.
+#
+#   LLM_CALL_TIMEOUT=10  LLM_SLOW_CALL_S=5  LLM_BREAKER_WINDOW=20  LLM_BREAKER_MIN_CALLS=5
+#   LLM_BREAKER_ERROR_RATE=0.5  LLM_BREAKER_SLOW_RATE=0.5  LLM_BREAKER_OPEN_S=15
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple, TypeVar
+
+from monitoring.metrics import LLM_BREAKER_TRANSITIONS
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """The breaker is open, the call wasn't attempted."""
+
+
+@dataclass
+class CircuitBreaker:
+    call_timeout: float = 10.0
+    slow_call_s: float = 5.0
+    window: int = 20
+    min_calls: int = 5
+    error_rate: float = 0.5
+    slow_rate: float = 0.5
+    open_s: float = 15.0
+    name: str = "llm"
+    # timeouts always count; other exceptions count when this says so
+    is_failure: Callable[[BaseException], bool] = field(default=lambda e: True, repr=False)
+
+    state: str = field(default=CLOSED, init=False)
+    # (failed, slow) per call, newest last
+    _calls: Deque[Tuple[bool, bool]] = field(init=False, repr=False)
+    _opened_at: float = field(default=0.0, init=False, repr=False)
+    _probing: bool = field(default=False, init=False, repr=False)
+    _generation: int = field(default=0, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._calls = deque(maxlen=self.window)
+
+    @classmethod
+    def from_env(cls, **kwargs: Any) -> "CircuitBreaker":
+        return cls(
+            **kwargs,
+            call_timeout=float(os.getenv("LLM_CALL_TIMEOUT", "10")),
+            slow_call_s=float(os.getenv("LLM_SLOW_CALL_S", "5")),
+            window=int(os.getenv("LLM_BREAKER_WINDOW", "20")),
+            min_calls=int(os.getenv("LLM_BREAKER_MIN_CALLS", "5")),
+            error_rate=float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5")),
+            slow_rate=float(os.getenv("LLM_BREAKER_SLOW_RATE", "0.5")),
+            open_s=float(os.getenv("LLM_BREAKER_OPEN_S", "15")),
+        )
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == CLOSED
+
+    def _transition(self, state: str) -> None:
+        if state != self.state:
+            self.state = state
+            self._generation += 1
+            LLM_BREAKER_TRANSITIONS.inc(breaker=self.name, to=state)
+
+    # the generation this call is admitted in, None when it may not go to the provider; in half-open
+    # only the single probe does
+    def _admit(self) -> Optional[int]:
+        if self.state == CLOSED:
+            return self._generation
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_s:
+                return None
+            self._transition(HALF_OPEN)
+        if self._probing:
+            return None
+        self._probing = True
+        return self._generation
+
+    def _release_probe(self, generation: int) -> None:
+        if generation == self._generation and self.state == HALF_OPEN:
+            self._probing = False
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._calls.clear()
+        self._transition(OPEN)
+
+    def _record(self, generation: int, failed: bool, slow: bool) -> None:
+        if generation != self._generation:
+            # admitted before the last state change, says nothing about the provider now
+            return
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if failed or slow:
+                self._open()
+            else:
+                self._calls.clear()
+                self._transition(CLOSED)
+            return
+
+        self._calls.append((failed, slow))
+        total = len(self._calls)
+        if total < self.min_calls:
+            return
+        failures = sum(1 for f, _ in self._calls if f)
+        slow_calls = sum(1 for _, s in self._calls if s)
+        if failures / total >= self.error_rate or slow_calls / total >= self.slow_rate:
+            self._open()
+
+    async def call(self, func: Callable[[], Awaitable[T]], timeout: Optional[float] = None) -> T:
+        generation = self._admit()
+        if generation is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(func(), timeout or self.call_timeout)
+        except asyncio.CancelledError:
+            # the turn was cancelled (newer message, disconnect) -- says nothing about the provider
+            self._release_probe(generation)
+            raise
+        except asyncio.TimeoutError:
+            self._record(generation, failed=True, slow=False)
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._record(generation, failed=True, slow=False)
+            else:
+                self._release_probe(generation)
+            raise
+        self._record(generation, failed=False, slow=time.monotonic() - start > self.slow_call_s)
+        return result
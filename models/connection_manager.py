@@ -0,0 +1,92 @@
+# admission control and send-side backpressure for websocket sessions
+
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional
+
+from monitoring.tracing import tracer
+
+
+class SlowConsumerError(Exception):
+    """The client isn't reading its replies fast enough."""
+
+
+class IdleTimeoutError(Exception):
+    """The client hasn't sent anything within the idle timeout."""
+
+
+# caps concurrently served sessions; past the cap, up to max_waiting sessions wait in FIFO order
+# and everyone else is turned away at the handshake
+class ConnectionLimiter:
+    def __init__(self, max_active: int, max_waiting: int = 0):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        # may hold futures of waiters that gave up, release() skips them
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    def try_acquire(self) -> bool:
+        if self.active < self.max_active and not self.waiting:
+            self.active += 1
+            return True
+        return False
+
+    # 1-based position a new waiter would get, None when the waiting room is full too
+    def next_position(self) -> Optional[int]:
+        return self.waiting + 1 if self.waiting < self.max_waiting else None
+
+    async def wait_for_slot(self) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        self.waiting += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # the slot was handed over just as we gave up, pass it on
+                self.release()
+            else:
+                fut.cancel()
+            raise
+        finally:
+            self.waiting -= 1
+
+    def release(self) -> None:
+        # hand the slot straight to the oldest waiter, active stays the same
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.active -= 1
+
+
+# per-connection outbound buffer -- replies are queued without blocking the turn, and a client that
+# lets max_pending replies pile up (or stalls a single send past send_timeout) is disconnected
+# instead of growing server memory
+class BoundedSender:
+    def __init__(self, send: Callable[[Any], Awaitable[None]], max_pending: int = 16, send_timeout: float = 10.0):
+        self._send = send
+        self.send_timeout = send_timeout
+        # text or binary frames, passed to send as queued
+        self._queue: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=max_pending)
+
+    def send_nowait(self, text: Any) -> None:
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            raise SlowConsumerError(f"{self._queue.qsize()} replies waiting to be sent") from None
+
+    # for bulk streams (e.g. history pages): waits for room instead of treating a full queue as a slow client
+    async def send(self, text: Any) -> None:
+        await self._queue.put(text)
+
+    async def run(self) -> None:
+        while True:
+            text = await self._queue.get()
+            with tracer.span("ws_send"):
+                try:
+                    await asyncio.wait_for(self._send(text), self.send_timeout)
+                except asyncio.TimeoutError:
+                    raise SlowConsumerError(f"send blocked for more than {self.send_timeout}s") from None
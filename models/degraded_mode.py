@@ -0,0 +1,79 @@
+# local answers for when the LLM provider is down or the circuit breaker is open -- rule-based intent,
+# direct order lookups, the top knowledge snippet and canned replies. nothing here calls the model, so
+# these turns stay fast however badly the provider is doing.
+
+import asyncio
+import re
+from typing import Optional
+
+import llm_router
+from models.chat_state import ChatState
+from models.input_pipeline import first_message
+from models.intent import Intent
+from models.intent_classifier import IntentClassifier
+from models.knowledge_search import knowledge_search
+from models.response_templates import order_summary
+from monitoring.metrics import DEGRADED_TURNS
+
+ORDER_INTENTS = (Intent.GET_ORDER_INFORMATION, Intent.REFUND_ORDER)
+SNIPPET_CHARS = 400
+
+_order_id = re.compile(r"\b\d{3,}\b")
+
+CANNED = {
+    Intent.GREETING: "Hi! I'm running in a limited mode right now, but I can look up orders and answer policy questions.",
+    Intent.GOODBYE: "Thanks for reaching out -- goodbye!",
+    Intent.ESCALATE_TO_HUMAN: (
+        "I'm passing this conversation to a support agent. They'll pick it up here as soon as one is free."
+    ),
+}
+ASK_ORDER_ID = "Sure -- what's your order ID?"
+REFUND_FOLLOW_UP = " I can't start a refund right now, so a support agent will follow up on it."
+NO_ANSWER = (
+    "I'm having trouble answering that right now. You can ask about an order by its ID, "
+    "or type \"agent\" to reach a person."
+)
+
+
+async def _knowledge_answer(message: str) -> Optional[str]:
+    # reads the folder and may rebuild the index -- keep it off the event loop
+    matches = (await asyncio.to_thread(knowledge_search, message, top_k=1))["matches"]
+    if not matches:
+        return None
+    top = matches[0]
+    content = top["content"]
+    if len(content) > SNIPPET_CHARS:
+        content = content[:SNIPPET_CHARS].rsplit(" ", 1)[0] + "..."
+    return f"Here's what our {top['section']} guide says: {content}"
+
+
+async def degraded_reply(message: str, state: ChatState) -> str:
+    # an answer to our own slot question continues the current intent
+    if state.pending_data:
+        state.user_data[state.pending_data] = first_message(message)
+        state.pending_data = None
+        intent = state.current_intent or Intent.UNKNOWN
+    else:
+        intent = IntentClassifier.classify(message)
+        state.current_intent = intent
+        found = _order_id.search(message)
+        if found and intent in ORDER_INTENTS:
+            state.user_data["order_id"] = found.group(0)
+
+    DEGRADED_TURNS.inc(intent=intent.value)
+
+    if intent in ORDER_INTENTS:
+        order_id = state.user_data.get("order_id")
+        if not order_id:
+            state.pending_data = "order_id"
+            return ASK_ORDER_ID
+        output = await llm_router.get_order(str(order_id))
+        reply = order_summary(str(order_id), output)
+        if intent == Intent.REFUND_ORDER and "error" not in output:
+            reply += REFUND_FOLLOW_UP
+        return reply
+
+    if intent in CANNED:
+        return CANNED[intent]
+
+    return await _knowledge_answer(message) or NO_ANSWER
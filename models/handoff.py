@@ -0,0 +1,307 @@
+# human handoff for escalated sessions (Intent.ESCALATE_TO_HUMAN). escalated sessions wait in a priority
+# queue until a support agent takes them over /ws/agent; from then on the customer's messages go to that
+# agent instead of the bot, so a session in handoff costs no LLM calls. releasing it hands it back.
+#
+# priority: a session's place in line is fixed when it's queued -- the time it escalated, moved forward by
+# a credit for its intent and for the customer's tier. everyone waits at the same rate, so that order never
+# changes and a plain heap is enough (O(log n) queue/take, no re-prioritising). a credit is how long a
+# session may jump the line, e.g. with vip=600 a VIP who just escalated goes ahead of a standard customer
+# who has waited 9 minutes, but not one who has waited 11.
+#
+#   HANDOFF_ENABLED=1  HANDOFF_INTENT_CREDIT_S=refund_order=120,get_order_information=60
+#   HANDOFF_TIER_CREDIT_S=vip=600,gold=300  HANDOFF_ABANDON_S=120 (a customer gone this long is dropped)
+#
+# the server only queues escalations when an agent can actually connect (AGENT_TOKEN set, see server.py);
+# without one the bot keeps answering. customers who left are swept out on every escalation and on a
+# timer, not only when an agent takes the next session, so a queue nobody works doesn't grow forever.
+#
+# the queue is per worker, like the connection limiter -- run agents against the worker(s) their
+# sessions are routed to (sticky sessions), or a single worker for the handoff traffic.
+
+import heapq
+import itertools
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from models.connection_manager import SlowConsumerError
+from monitoring.metrics import HANDOFF_EVENTS, HANDOFF_WAIT
+
+HANDOFF_ENABLED = os.getenv("HANDOFF_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+HANDOFF_ABANDON_S = float(os.getenv("HANDOFF_ABANDON_S", "120"))
+DEFAULT_TIER = "standard"
+
+
+def parse_credits(spec: str) -> Dict[str, float]:
+    credits = {}
+    for item in spec.split(","):
+        name, sep, seconds = item.partition("=")
+        if sep and name.strip():
+            credits[name.strip().lower()] = float(seconds)
+    return credits
+
+
+INTENT_CREDIT_S = parse_credits(os.getenv("HANDOFF_INTENT_CREDIT_S", "refund_order=120,get_order_information=60"))
+TIER_CREDIT_S = parse_credits(os.getenv("HANDOFF_TIER_CREDIT_S", "vip=600,gold=300"))
+
+
+class HandoffError(Exception):
+    """An agent acted on a session it doesn't hold."""
+
+
+@dataclass
+class Ticket:
+    session_id: str
+    intent: str
+    tier: str
+    queued_at: float               # clock() when it escalated
+    key: float                     # place in line, lower goes first
+    agent_id: Optional[str] = None
+    assigned_at: Optional[float] = None
+    # when the customer's connection went away, None while connected
+    detached_at: Optional[float] = None
+    seq: int = 0                   # heap entry that is current, older ones are skipped
+    order: int = 0                 # when it was first queued, breaks ties between equal keys
+
+    def waited(self, now: float) -> float:
+        return (self.assigned_at or now) - self.queued_at
+
+    def to_frame(self, now: float) -> Dict[str, Any]:
+        return {"session_id": self.session_id, "intent": self.intent, "tier": self.tier,
+                "waited_s": round(self.waited(now), 3)}
+
+
+# min-heap of waiting sessions. removal is lazy: a ticket that was taken, requeued or dropped leaves its
+# old entry behind, pop skips it, and the heap is rebuilt once stale entries outnumber live ones
+class HandoffQueue:
+    def __init__(self, intent_credit: Optional[Dict[str, float]] = None,
+                 tier_credit: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.monotonic):
+        self.intent_credit = INTENT_CREDIT_S if intent_credit is None else intent_credit
+        self.tier_credit = TIER_CREDIT_S if tier_credit is None else tier_credit
+        self.clock = clock
+        self._heap: List[Tuple[float, int, int, str]] = []
+        self._seq = itertools.count(1)
+        # every session in handoff, waiting or assigned
+        self._tickets: Dict[str, Ticket] = {}
+        # waiting sessions, for the depth and the oldest wait
+        self._waiting: Dict[str, Ticket] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._tickets
+
+    def get(self, session_id: str) -> Optional[Ticket]:
+        return self._tickets.get(session_id)
+
+    def priority(self, intent: str, tier: str, queued_at: float) -> float:
+        return queued_at - self.intent_credit.get(intent, 0.0) - self.tier_credit.get(tier, 0.0)
+
+    # queue a session; one already in handoff keeps its place
+    def push(self, session_id: str, intent: str, tier: str = DEFAULT_TIER) -> Ticket:
+        ticket = self._tickets.get(session_id)
+        if ticket is not None:
+            return ticket
+        now = self.clock()
+        intent, tier = (intent or "").lower(), (tier or DEFAULT_TIER).lower()
+        ticket = Ticket(session_id, intent, tier, queued_at=now, key=self.priority(intent, tier, now),
+                        order=next(self._seq))
+        self._tickets[session_id] = ticket
+        self._enter(ticket)
+        return ticket
+
+    # back in line at its original place, e.g. when its agent disconnected
+    def requeue(self, session_id: str) -> Optional[Ticket]:
+        ticket = self._tickets.get(session_id)
+        if ticket is None or ticket.agent_id is None:
+            return ticket
+        ticket.agent_id = ticket.assigned_at = None
+        self._enter(ticket)
+        return ticket
+
+    def _enter(self, ticket: Ticket) -> None:
+        ticket.seq = next(self._seq)
+        heapq.heappush(self._heap, (ticket.key, ticket.order, ticket.seq, ticket.session_id))
+        self._waiting[ticket.session_id] = ticket
+
+    # the first waiting session, now assigned to agent_id
+    def pop(self, agent_id: str) -> Optional[Ticket]:
+        while self._heap:
+            _, _, seq, session_id = heapq.heappop(self._heap)
+            ticket = self._waiting.get(session_id)
+            if ticket is None or ticket.seq != seq:
+                continue
+            del self._waiting[session_id]
+            ticket.agent_id, ticket.assigned_at = agent_id, self.clock()
+            return ticket
+        return None
+
+    # out of handoff altogether (released, abandoned)
+    def remove(self, session_id: str) -> Optional[Ticket]:
+        ticket = self._tickets.pop(session_id, None)
+        if self._waiting.pop(session_id, None) is not None and len(self._heap) > 2 * len(self._waiting) + 64:
+            self._heap = [(t.key, t.order, t.seq, t.session_id) for t in self._waiting.values()]
+            heapq.heapify(self._heap)
+        return ticket
+
+    # a scan, but only at scrape time and for the agents' queue stats -- requeued tickets rejoin
+    # _waiting at the end, so the first one isn't always the oldest
+    def oldest_wait(self) -> float:
+        oldest = min((t.queued_at for t in self._waiting.values()), default=None)
+        return 0.0 if oldest is None else self.clock() - oldest
+
+
+# who is connected: agents by id, customers by session. sends are the connections' non-blocking outbox
+# puts; a full outbox drops the frame here (the message is stored either way) and that connection is
+# closed as a slow consumer on its own next send, not the one that called in
+def _send(send: Callable[[Any], None], payload: Any) -> bool:
+    try:
+        send(payload)
+    except SlowConsumerError:
+        return False
+    return True
+
+
+class HandoffDesk:
+    def __init__(self, queue: Optional[HandoffQueue] = None, abandon_after: float = HANDOFF_ABANDON_S):
+        self.queue = queue if queue is not None else HandoffQueue()
+        self.abandon_after = abandon_after
+        self._agents: Dict[str, Callable[[Dict[str, Any]], None]] = {}
+        self._held: Dict[str, Set[str]] = {}
+        # session -> (reply, notice) senders of the customer's connection
+        self._customers: Dict[str, Tuple[Callable[[str], None], Callable[[str], None]]] = {}
+        # tickets whose customer is gone, oldest detach first -- what sweep() looks at
+        self._detached: "OrderedDict[str, Ticket]" = OrderedDict()
+
+    @property
+    def agents(self) -> int:
+        return len(self._agents)
+
+    def active(self, session_id: str) -> bool:
+        return session_id in self.queue
+
+    # in handoff but no agent has taken it yet
+    def waiting(self, session_id: str) -> bool:
+        ticket = self.queue.get(session_id)
+        return ticket is not None and ticket.agent_id is None
+
+    def escalate(self, session_id: str, intent: str, tier: str = DEFAULT_TIER) -> Ticket:
+        self.sweep()
+        if session_id not in self.queue:
+            HANDOFF_EVENTS.inc(event="queued")
+        return self.queue.push(session_id, intent, tier)
+
+    # drops waiting sessions whose customer has been gone longer than abandon_after; returns how many.
+    # only walks the detached tickets, oldest first, and stops at the first one still within the limit
+    def sweep(self) -> int:
+        now = self.queue.clock()
+        dropped = 0
+        while self._detached:
+            session_id, ticket = next(iter(self._detached.items()))
+            if ticket.detached_at is not None and now - ticket.detached_at <= self.abandon_after:
+                break
+            del self._detached[session_id]
+            if ticket.detached_at is None or ticket.agent_id is not None or self.queue.get(session_id) is not ticket:
+                # back, taken by an agent (who decides) or already gone
+                continue
+            self.queue.remove(session_id)
+            HANDOFF_EVENTS.inc(event="abandoned")
+            dropped += 1
+        return dropped
+
+    def attach_customer(self, session_id: str, reply: Callable[[str], None], notice: Callable[[str], None]) -> None:
+        self._customers[session_id] = (reply, notice)
+        self._detached.pop(session_id, None)
+        ticket = self.queue.get(session_id)
+        if ticket is not None:
+            ticket.detached_at = None
+
+    # reply is the one attached, so a connection that already replaced this one stays attached
+    def detach_customer(self, session_id: str, reply: Callable[[str], None]) -> None:
+        customer = self._customers.get(session_id)
+        if customer is None or customer[0] is not reply:
+            return
+        del self._customers[session_id]
+        ticket = self.queue.get(session_id)
+        if ticket is not None:
+            ticket.detached_at = self.queue.clock()
+            self._detached[session_id] = ticket
+
+    def has_agent(self, agent_id: str) -> bool:
+        return agent_id in self._agents
+
+    def connect_agent(self, agent_id: str, send: Callable[[Dict[str, Any]], None]) -> None:
+        self._agents[agent_id] = send
+        self._held.setdefault(agent_id, set())
+
+    # the agent's sessions go back in line at their original place
+    def disconnect_agent(self, agent_id: str) -> List[str]:
+        self._agents.pop(agent_id, None)
+        requeued = sorted(self._held.pop(agent_id, set()))
+        for session_id in requeued:
+            ticket = self.queue.requeue(session_id)
+            if ticket is not None and ticket.detached_at is not None:
+                # its customer left while the agent had it, sweepable again now it's waiting (queued
+                # behind newer detaches, so it can outlive abandon_after by up to another abandon_after)
+                self._detached[session_id] = ticket
+            HANDOFF_EVENTS.inc(event="requeued")
+            self._notice(session_id, "Your agent got disconnected -- you're back in line for the next one.")
+        return requeued
+
+    def held(self, agent_id: str) -> Set[str]:
+        return set(self._held.get(agent_id, ()))
+
+    # the highest-priority waiting session for this agent, skipping customers who gave up
+    def take(self, agent_id: str) -> Optional[Ticket]:
+        while True:
+            ticket = self.queue.pop(agent_id)
+            if ticket is None:
+                return None
+            if ticket.detached_at is not None and self.queue.clock() - ticket.detached_at > self.abandon_after:
+                self.queue.remove(ticket.session_id)
+                self._detached.pop(ticket.session_id, None)
+                HANDOFF_EVENTS.inc(event="abandoned")
+                continue
+            self._held.setdefault(agent_id, set()).add(ticket.session_id)
+            HANDOFF_EVENTS.inc(event="assigned")
+            HANDOFF_WAIT.observe(ticket.waited(self.queue.clock()))
+            self._notice(ticket.session_id, "A support agent has joined the conversation.")
+            return ticket
+
+    def release(self, agent_id: str, session_id: str) -> Ticket:
+        self._check(agent_id, session_id)
+        self._held[agent_id].discard(session_id)
+        HANDOFF_EVENTS.inc(event="released")
+        self._notice(session_id, "The agent has left the conversation -- the assistant can help you from here.")
+        self._detached.pop(session_id, None)
+        return self.queue.remove(session_id)
+
+    # customer -> the agent holding the session; False while it's still waiting for one
+    def from_customer(self, session_id: str, text: str) -> bool:
+        ticket = self.queue.get(session_id)
+        send = self._agents.get(ticket.agent_id) if ticket and ticket.agent_id else None
+        if send is None:
+            return False
+        return _send(send, {"type": "customer_message", "session_id": session_id, "text": text})
+
+    # agent -> customer; False when the customer isn't connected right now
+    def to_customer(self, agent_id: str, session_id: str, text: str) -> bool:
+        self._check(agent_id, session_id)
+        customer = self._customers.get(session_id)
+        return customer is not None and _send(customer[0], text)
+
+    def _check(self, agent_id: str, session_id: str) -> None:
+        if session_id not in self._held.get(agent_id, ()):
+            raise HandoffError(f"session {session_id} isn't assigned to agent {agent_id}")
+
+    def _notice(self, session_id: str, text: str) -> None:
+        customer = self._customers.get(session_id)
+        if customer is not None:
+            _send(customer[1], text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"type": "queue", "depth": len(self.queue), "oldest_wait_s": round(self.queue.oldest_wait(), 3),
+                "agents": self.agents}
@@ -0,0 +1,210 @@
+# hybrid retrieval for knowledge_search (KNOWLEDGE_SEARCH_MODE=hybrid). keyword scoring catches exact
+# terms like SKUs and order numbers, a hashed tf-idf vector over stemmed words (with a few support-domain
+# synonyms folded together) catches inflections and rephrasings; the two rankings are fused with
+# reciprocal-rank fusion and the head of the list is optionally reranked, all inside a latency budget.
+# the budget is checked between stages, not enforced inside one: the stages are synchronous CPU work on
+# the caller's thread and can't be interrupted, so a search can overrun by up to one stage's time.
+#
+# no embedding model or numpy here -- vectors are sparse, hashed and searched through an inverted index
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from models.knowledge_search import Chunk, score_query
+from monitoring.metrics import KNOWLEDGE_BUDGET_EXCEEDED, KNOWLEDGE_VECTOR_BUILD_FAILURES
+from monitoring.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+FEATURE_BITS = 20
+RRF_K = 60
+
+LATENCY_BUDGET_MS = float(os.getenv("KNOWLEDGE_LATENCY_BUDGET_MS", "50"))
+RERANK_ENABLED = os.getenv("KNOWLEDGE_RERANK", "1").strip().lower() not in ("0", "false", "no", "off")
+RERANK_TOP_N = int(os.getenv("KNOWLEDGE_RERANK_TOP_N", "20"))
+
+# words customers use for the same thing, mapped onto one stem
+SYNONYMS = {
+    "monei": "refund", "reimburs": "refund", "reimbursement": "refund", "repai": "refund", "repaid": "refund",
+    "shipp": "ship", "deliver": "ship", "deliveri": "ship", "arriv": "ship", "arrive": "ship", "shipment": "ship",
+    "broken": "defect", "damag": "defect", "damage": "defect", "faulti": "defect", "fix": "repair",
+    "guarantee": "warranti", "guarante": "warranti", "phone": "contact", "email": "contact", "call": "contact",
+    "open": "hour", "clos": "hour", "close": "hour",
+}
+
+_word = re.compile(r"[a-z0-9]+")
+
+
+def stem(word: str) -> str:
+    # crude suffix stripping, good enough to line up refund/refunds/refunded
+    for suffix in ("ing", "ies", "ied", "es", "ed", "ly", "s", "y"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: -len(suffix)] + ("i" if suffix in ("ies", "ied", "y") else "")
+            break
+    return SYNONYMS.get(word, word)
+
+
+def stems(text: str) -> List[str]:
+    return [stem(w) for w in _word.findall(text.lower()) if len(w) >= 3 or w.isdigit()]
+
+
+def _feature(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & ((1 << FEATURE_BITS) - 1)
+
+
+def _tf(text: str) -> Dict[int, float]:
+    counts = Counter(_feature(s) for s in stems(text))
+    return {f: 1.0 + math.log(c) for f, c in counts.items()}
+
+
+class VectorIndex:
+    def __init__(self, chunks: Sequence[Chunk]):
+        self.chunks = chunks
+        vectors = [_tf(c.section + "\n" + c.content) for c in chunks]
+        df = Counter(f for vec in vectors for f in vec)
+        n = len(chunks)
+        self.idf = {f: math.log((1 + n) / (1 + d)) + 1.0 for f, d in df.items()}
+
+        # feature -> (chunk indexes, normalised weights), arrays keep 100k+ chunks affordable
+        ids: Dict[int, array] = defaultdict(lambda: array("i"))
+        weights: Dict[int, array] = defaultdict(lambda: array("f"))
+        for i, vec in enumerate(vectors):
+            weighted = {f: w * self.idf[f] for f, w in vec.items()}
+            norm = math.sqrt(sum(w * w for w in weighted.values())) or 1.0
+            for f, w in weighted.items():
+                ids[f].append(i)
+                weights[f].append(w / norm)
+        self.postings = {f: (ids[f], weights[f]) for f in ids}
+
+    def search(self, query: str, limit: int) -> List[int]:
+        q = {f: w * self.idf[f] for f, w in _tf(query).items() if f in self.idf}
+        norm = math.sqrt(sum(w * w for w in q.values())) or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        for f, qw in q.items():
+            chunk_ids, chunk_weights = self.postings[f]
+            qw /= norm
+            for i, w in zip(chunk_ids, chunk_weights):
+                scores[i] += qw * w
+        return sorted(scores, key=scores.__getitem__, reverse=True)[:limit]
+
+
+# folder -> vector index over that folder's current chunk list, rebuilt when load_chunks rebuilds
+_vector_indexes: Dict[str, VectorIndex] = {}
+_building: Dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+
+
+# a build that raises still clears _building, so the next search starts a fresh one instead of
+# serving lexical-only results forever behind a dead thread
+def _build(folder: str, chunks: List[Chunk]) -> None:
+    try:
+        index = VectorIndex(chunks)
+        with _lock:
+            _vector_indexes[folder] = index
+    except Exception:
+        KNOWLEDGE_VECTOR_BUILD_FAILURES.inc()
+        logger.exception("vector index build for %s failed", folder)
+        raise
+    finally:
+        with _lock:
+            _building.pop(folder, None)
+
+
+def _build_in_background(folder: str, chunks: List[Chunk]) -> None:
+    try:
+        _build(folder, chunks)
+    except Exception:
+        pass  # logged and counted in _build
+
+
+# the vector index for these chunks, or None while it's still being built in the background --
+# building over a large corpus takes far longer than one query's budget. wait=True builds inline
+def vector_index(folder: str, chunks: List[Chunk], wait: bool = False) -> Optional[VectorIndex]:
+    with _lock:
+        index = _vector_indexes.get(folder)
+        if index is not None and index.chunks is chunks:
+            return index
+        if wait:
+            thread = None
+        else:
+            thread = _building.get(folder)
+            if thread is None:
+                thread = _building[folder] = threading.Thread(target=_build_in_background, args=(folder, chunks), daemon=True)
+                thread.start()
+    if wait:
+        _build(folder, chunks)
+        return _vector_indexes[folder]
+    return None
+
+
+def lexical_search(terms: List[str], chunks: Sequence[Chunk], limit: int) -> List[int]:
+    scored = [(score_query(terms, c), i) for i, c in enumerate(chunks)]
+    scored = [(s, i) for s, i in scored if s > 0]
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [i for _, i in scored[:limit]]
+
+
+def rrf(rankings: Sequence[List[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    fused: Dict[int, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, i in enumerate(ranking):
+            fused[i] += 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
+
+
+# cheap CPU reranker over the fused head: share of query stems the chunk covers, whether the section
+# title matches, and exact hits on tokens with digits (SKUs, model numbers); fused score breaks ties
+def rerank(query: str, candidates: List[Tuple[int, float]], chunks: Sequence[Chunk]) -> List[Tuple[int, float]]:
+    query_stems = set(stems(query))
+    if not query_stems:
+        return candidates
+    exact = {w for w in _word.findall(query.lower()) if any(ch.isdigit() for ch in w)}
+
+    rescored = []
+    for i, fused in candidates:
+        chunk = chunks[i]
+        chunk_stems = set(stems(chunk.content))
+        coverage = len(query_stems & chunk_stems) / len(query_stems)
+        in_section = 1.0 if query_stems & set(stems(chunk.section)) else 0.0
+        exact_hit = 1.0 if exact and any(t in chunk.content_lower for t in exact) else 0.0
+        rescored.append((i, 0.6 * coverage + 0.25 * in_section + 0.15 * exact_hit + fused))
+    rescored.sort(key=lambda x: x[1], reverse=True)
+    return rescored
+
+
+def hybrid_search(query: str, terms: List[str], chunks: List[Chunk], top_k: int, folder: str,
+                  budget_ms: Optional[float] = None) -> List[Chunk]:
+    deadline = time.perf_counter() + (LATENCY_BUDGET_MS if budget_ms is None else budget_ms) / 1000
+    depth = max(top_k, RERANK_TOP_N)
+
+    # lexical goes first: it's the cheapest and always has an answer when the budget runs out.
+    # both retrievers are pure-python CPU work, so running them on threads wouldn't overlap under the GIL
+    with tracer.span("retrieve_lexical"):
+        lexical = lexical_search(terms, chunks, depth)
+    if time.perf_counter() > deadline:
+        KNOWLEDGE_BUDGET_EXCEEDED.inc(stage="vector")
+        return [chunks[i] for i in lexical[:top_k]]
+
+    index = vector_index(folder, chunks)
+    if index is None:
+        KNOWLEDGE_BUDGET_EXCEEDED.inc(stage="vector_index_building")
+        return [chunks[i] for i in lexical[:top_k]]
+    with tracer.span("retrieve_vector"):
+        vector = index.search(query, depth)
+    fused = rrf([lexical, vector])[:depth]
+
+    if RERANK_ENABLED and fused:
+        if time.perf_counter() > deadline:
+            KNOWLEDGE_BUDGET_EXCEEDED.inc(stage="rerank")
+        else:
+            with tracer.span("rerank", candidates=len(fused)):
+                fused = rerank(query, fused, chunks)
+    return [chunks[i] for i, _ in fused[:top_k]]
@@ -0,0 +1,107 @@
+# knowledge index build -- reading and chunking files is spread over a process pool for large corpora,
+# results stream back in file order into the index so raw file contents never pile up in this process.
+# the pool is for the CLI and the server's warm-up (KNOWLEDGE_BUILD_WORKERS, default 1) only: a rebuild
+# on the request path is always serial, it must not fork cores x gunicorn workers processes
+#
+#   python -m models.index_builder knowledge --workers 8
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Iterator, List, Optional, Tuple
+
+from models.knowledge_search import DEFAULT_CHUNKER, Chunk, ChunkerConfig, chunk_file
+
+# below this many files a pool costs more to start than it saves
+MIN_FILES_FOR_POOL = 64
+FILES_PER_TASK = 16
+
+
+@dataclass
+class BuildReport:
+    files: int = 0
+    chunks: int = 0
+    bytes: int = 0
+    workers: int = 1
+    elapsed_s: float = 0.0
+
+    @property
+    def files_per_s(self) -> float:
+        return self.files / self.elapsed_s if self.elapsed_s else 0.0
+
+    @property
+    def mb_per_s(self) -> float:
+        return self.bytes / 1e6 / self.elapsed_s if self.elapsed_s else 0.0
+
+    def format(self) -> str:
+        return (f"{self.files} files, {self.chunks} chunks, {self.bytes / 1e6:.1f} MB in {self.elapsed_s:.2f}s "
+                f"with {self.workers} worker(s) -> {self.files_per_s:.0f} files/s, {self.mb_per_s:.1f} MB/s")
+
+
+def markdown_paths(folder: str) -> List[str]:
+    return sorted(entry.path for entry in os.scandir(folder) if entry.name.lower().endswith(".md"))
+
+
+# runs in the worker: read, chunk (which also precomputes each chunk's search fields) and hand back
+def build_files(paths: List[str], config: ChunkerConfig) -> List[Tuple[int, List[Chunk]]]:
+    built = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        built.append((len(content.encode("utf-8")), chunk_file(os.path.basename(path), content, config)))
+    return built
+
+
+def _batches(paths: List[str], size: int) -> Iterator[List[str]]:
+    for i in range(0, len(paths), size):
+        yield paths[i:i + size]
+
+
+def iter_built(folder: str, config: ChunkerConfig, workers: int) -> Iterator[Tuple[int, List[Chunk]]]:
+    paths = markdown_paths(folder)
+    if workers <= 1 or len(paths) < MIN_FILES_FOR_POOL:
+        yield from build_files(paths, config)
+        return
+
+    # at most 2 batches per worker in flight, consumed oldest first so the index keeps file order
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Future] = deque()
+        for batch in _batches(paths, FILES_PER_TASK):
+            pending.append(pool.submit(build_files, batch, config))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def build_index(folder: str = "knowledge", config: Optional[ChunkerConfig] = None,
+                workers: int = 1) -> Tuple[List[Chunk], BuildReport]:
+    config = config or DEFAULT_CHUNKER
+    report = BuildReport(workers=workers)
+    chunks: List[Chunk] = []
+
+    start = time.perf_counter()
+    for size, file_chunks in iter_built(folder, config, workers):
+        report.files += 1
+        report.bytes += size
+        chunks.extend(file_chunks)
+    report.elapsed_s = time.perf_counter() - start
+    report.chunks = len(chunks)
+    return chunks, report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="build the knowledge index and report throughput")
+    parser.add_argument("folder", nargs="?", default="knowledge")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (default: all cores)")
+    args = parser.parse_args()
+
+    _, report = build_index(args.folder, workers=args.workers)
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
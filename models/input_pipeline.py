@@ -0,0 +1,99 @@
+# per-session input pipeline: the socket's receive loop submits messages, a worker task turns them into turns.
+# messages arriving within the debounce window become one turn, and a message that arrives while a turn
+# is still being computed cancels it -- the cancelled text is carried into the next turn so nothing is lost.
+# messages may carry the client's message id; message_ids holds the ids a reply answers while it's delivered.
+
+import asyncio
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+DEFAULT_DEBOUNCE = 0.15
+DEFAULT_MAX_PENDING = 32
+# coalesced messages are joined with this into one turn's text
+SEPARATOR = "\n"
+
+
+# the first message of a (possibly coalesced) turn -- what answers a slot question. "124\nand when does
+# it ship?" fills order_id with "124"; the whole text still goes to the model
+def first_message(text: str) -> str:
+    return text.split(SEPARATOR, 1)[0].strip()
+
+
+class InputPipeline:
+    def __init__(
+        self,
+        respond: Callable[[str], Awaitable[str]],
+        deliver: Callable[[str, str], Awaitable[None]],
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_pending: int = DEFAULT_MAX_PENDING,
+        on_coalesced: Optional[Callable[[int], None]] = None,
+        on_cancelled: Optional[Callable[[str], None]] = None,
+    ):
+        # respond(text) is cancellable and must leave state as it found it when cancelled,
+        # deliver(text, reply) runs to completion once a reply exists
+        self.respond = respond
+        self.deliver = deliver
+        self.debounce = debounce
+        self.on_coalesced = on_coalesced
+        self.on_cancelled = on_cancelled
+        # bounded, so a flooding client stalls its own receive loop instead of growing memory
+        self._queue: "asyncio.Queue[Tuple[str, Optional[str]]]" = asyncio.Queue(maxsize=max_pending)
+        self._current: Optional[asyncio.Task] = None
+        self._superseded = False
+        # client message ids answered by the reply being delivered
+        self.message_ids: List[str] = []
+
+    async def submit(self, text: str, message_id: Optional[str] = None) -> None:
+        await self._queue.put((text, message_id))
+        if self._current is not None and not self._current.done():
+            self._superseded = True
+            self._current.cancel()
+
+    async def _next_batch(self, carry: List[Tuple[str, Optional[str]]]) -> List[Tuple[str, Optional[str]]]:
+        parts = list(carry)
+        if not parts:
+            parts.append(await self._queue.get())
+
+        # keep collecting until the window passes without a new message
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.debounce
+        while True:
+            while not self._queue.empty():
+                parts.append(self._queue.get_nowait())
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return parts
+            try:
+                parts.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                return parts
+
+    async def run(self) -> None:
+        carry: List[Tuple[str, Optional[str]]] = []
+        while True:
+            parts = await self._next_batch(carry)
+            carry = []
+            text = SEPARATOR.join(t for t, _ in parts)
+            if len(parts) > 1 and self.on_coalesced:
+                self.on_coalesced(len(parts))
+
+            self._superseded = False
+            self._current = asyncio.create_task(self.respond(text))
+            try:
+                reply = await self._current
+            except asyncio.CancelledError:
+                if not self._superseded:
+                    # the pipeline itself is being shut down
+                    self._current.cancel()
+                    raise
+                if self.on_cancelled:
+                    self.on_cancelled(text)
+                carry = parts
+                continue
+            finally:
+                self._current = None
+
+            self.message_ids = [i for _, i in parts if i]
+            try:
+                await self.deliver(text, reply)
+            finally:
+                self.message_ids = []
@@ -1,24 +1,30 @@
+import re
+
 from models.intent import Intent
 
-# classify will be replaced with LLM calls after testing
+_word = re.compile(r"[a-z]+")
+
+# rule-based intent, the router's stand-in while the LLM is unavailable (models/degraded_mode.py).
+# matches whole words so "this" isn't a greeting and "shipping" isn't a "hi"
 class IntentClassifier():
     @staticmethod
     def classify(text: str) -> Intent:
 
         message = text.lower()
+        words = set(_word.findall(message))
 
 
-        if any(word in message for word in ("refund", "money back")):
+        if "refund" in words or "money back" in message:
             return Intent.REFUND_ORDER
-        if any(word in message for word in ("order", "info", "status", "shipping")):
+        if words & {"order", "orders", "info", "information", "status", "shipping", "tracking"}:
             return Intent.GET_ORDER_INFORMATION
-        if any(word in message for word in ("human", "representative", "manager", "boss")):
+        if words & {"human", "representative", "manager", "boss", "agent", "person"}:
             return Intent.ESCALATE_TO_HUMAN
-        
-        if any(word in message for word in ("hi", "hello", "hey")):
+
+        if words & {"hi", "hello", "hey"}:
             return Intent.GREETING
-        if any(word in message for word in ("bye", "goodbye")):
+        if words & {"bye", "goodbye"}:
             return Intent.GOODBYE
-        
+
         # if none of those passes work, just return unknown intent
-        return Intent.UNKNOWN
\ No newline at end of file
+        return Intent.UNKNOWN
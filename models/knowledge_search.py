@@ -1,18 +1,52 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import os, re
-from typing import List, Dict, Any, Tuple
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from monitoring.metrics import KNOWLEDGE_CACHE_HITS, KNOWLEDGE_CACHE_MISSES, KNOWLEDGE_INDEX_BUILD_SECONDS, KNOWLEDGE_INDEX_CHUNKS
+from monitoring.tracing import traced
 
 # regex pattern matching to find heading (# .....) or sub heading (## .....)
 # capture just heading text -- # heading 1 -> heading 1
 heading = re.compile(r"^#\s+(.*)\s*$", flags = re.IGNORECASE)
 sub_heading = re.compile(r"^##\s+(.*)\s*$", flags = re.IGNORECASE)
 
+# sentence ends, line breaks and blank lines (paragraphs) -- the only places a chunk or snippet is cut
+boundary = re.compile(r"\n\s*\n|(?<=[.!?])\s+|\n")
+paragraph_break = re.compile(r"\n\s*\n")
+
 @dataclass
 class Chunk:
     filename: str
     title: str      # main heading
     section: str    # sub heading
     content: str
+    # precomputed once at index time so a query doesn't re-lowercase or re-split anything
+    section_lower: str = field(init=False, repr=False, compare=False)
+    content_lower: str = field(init=False, repr=False, compare=False)
+    offsets: Tuple[int, ...] = field(init=False, repr=False, compare=False)  # where snippets may start
+
+    def __post_init__(self):
+        self.section_lower = self.section.lower()
+        self.content_lower = self.content.lower()
+        self.offsets = (0,) + tuple(m.end() for m in boundary.finditer(self.content) if m.end() < len(self.content))
+
+
+@dataclass(frozen=True)
+class ChunkerConfig:
+    max_chars: int = 500       # target chunk size, a single unbreakable word can exceed it
+    overlap: int = 80          # trailing sentences repeated at the start of the next chunk, up to this many chars
+    snippet_chars: int = 700   # most content returned per match
+
+    @classmethod
+    def from_env(cls) -> "ChunkerConfig":
+        return cls(
+            max_chars=int(os.getenv("KNOWLEDGE_CHUNK_CHARS", "500")),
+            overlap=int(os.getenv("KNOWLEDGE_CHUNK_OVERLAP", "80")),
+            snippet_chars=int(os.getenv("KNOWLEDGE_SNIPPET_CHARS", "700")),
+        )
+
+DEFAULT_CHUNKER = ChunkerConfig.from_env()
 
 # default is knowledge for testing purposes, replace with wherever your company/product information files are
 
@@ -27,7 +61,8 @@ def read_files(folder: str = "knowledge") -> List[Tuple[str, str]]:
     return files
 
 
-def chunk_file(filename: str, content: str) -> List[Chunk]:
+def chunk_file(filename: str, content: str, config: Optional[ChunkerConfig] = None) -> List[Chunk]:
+    config = config or DEFAULT_CHUNKER
     lines = content.splitlines()
 
     # setting defualt title to filename if # main heading does not exist
@@ -54,7 +89,8 @@ def chunk_file(filename: str, content: str) -> List[Chunk]:
             section_content = "\n".join(buffer).strip()
 
             if section and section_content:
-                chunks.append(Chunk(filename=filename, title=title, section=section, content=section_content))
+                chunks.extend(Chunk(filename=filename, title=title, section=section, content=part)
+                              for part in split_section(section_content, config))
                 
                 # reset buffer
             buffer = []
@@ -67,11 +103,105 @@ def chunk_file(filename: str, content: str) -> List[Chunk]:
     # close final section -- no header after it
     final_content = "\n".join(buffer).strip()
     if section and final_content:
-        chunks.append(Chunk(filename=filename, title=title, section=section, content=final_content))
+        chunks.extend(Chunk(filename=filename, title=title, section=section, content=part)
+                      for part in split_section(final_content, config))
 
 
     return chunks
 
+# (start, end) of every sentence/line in text, with sentences longer than max_chars cut at a space
+def _units(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    spans: List[Tuple[int, int]] = []
+    pos = 0
+    for m in boundary.finditer(text):
+        if m.start() > pos:
+            spans.append((pos, m.start()))
+        pos = m.end()
+    if pos < len(text):
+        spans.append((pos, len(text)))
+
+    units: List[Tuple[int, int]] = []
+    for start, end in spans:
+        while end - start > max_chars:
+            cut = text.rfind(" ", start, start + max_chars)
+            if cut <= start:
+                break   # one unbreakable word, keep it whole
+            units.append((start, cut))
+            start = cut + 1
+        units.append((start, end))
+    return units
+
+
+# splits one section into chunks of about max_chars, cut only between sentences/lines and preferring
+# paragraph breaks; every chunk is a plain slice of the section text
+def split_section(text: str, config: ChunkerConfig = DEFAULT_CHUNKER) -> List[str]:
+    if len(text) <= config.max_chars:
+        return [text]
+
+    units = _units(text, config.max_chars)
+    paragraph_starts = {m.end() for m in paragraph_break.finditer(text)}
+    parts: List[str] = []
+    i = 0
+    while i < len(units):
+        j = i
+        while j + 1 < len(units) and units[j + 1][1] - units[i][0] <= config.max_chars:
+            # close a reasonably full chunk at a paragraph break rather than mid-paragraph
+            if units[j + 1][0] in paragraph_starts and units[j][1] - units[i][0] >= config.max_chars * 0.6:
+                break
+            j += 1
+        parts.append(text[units[i][0]:units[j][1]])
+        if j + 1 >= len(units):
+            break
+
+        # the next chunk repeats the trailing units of this one that fit in the overlap
+        k = j + 1
+        while k - 1 > i and units[j][1] - units[k - 1][0] <= config.overlap:
+            k -= 1
+        i = k
+    return parts
+
+# (folder, chunker) -> (file signature, chunks); only re-read and re-chunked when a .md file is added, removed or edited
+_index_cache: Dict[Tuple[str, ChunkerConfig], Tuple[tuple, List[Chunk]]] = {}
+# one rebuild at a time: searches on other threads that see the same change wait for it and reuse the
+# result instead of each chunking the folder again
+_build_lock = threading.Lock()
+
+def _folder_signature(folder: str) -> tuple:
+    entries = []
+    for entry in os.scandir(folder):
+        if entry.name.lower().endswith(".md"):
+            stat = entry.stat()
+            entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(entries))
+
+# workers > 1 builds on a process pool -- only from warm-up or the CLI, searches rebuild serially.
+# blocking (a scandir per call, a rebuild after an edit): async callers go through asyncio.to_thread
+def load_chunks(folder: str = "knowledge", config: Optional[ChunkerConfig] = None, workers: int = 1) -> List[Chunk]:
+    config = config or DEFAULT_CHUNKER
+    signature = _folder_signature(folder)
+    cached = _index_cache.get((folder, config))
+    if cached is not None and cached[0] == signature:
+        KNOWLEDGE_CACHE_HITS.inc()
+        return cached[1]
+
+    with _build_lock:
+        cached = _index_cache.get((folder, config))
+        if cached is not None and cached[0] == signature:
+            # built by another search while this one waited
+            KNOWLEDGE_CACHE_HITS.inc()
+            return cached[1]
+
+        KNOWLEDGE_CACHE_MISSES.inc()
+        # imported here, the builder itself depends on chunk_file from this module
+        from models.index_builder import build_index
+
+        chunks, report = build_index(folder, config, workers=workers)
+        KNOWLEDGE_INDEX_CHUNKS.set(report.chunks)
+        KNOWLEDGE_INDEX_BUILD_SECONDS.set(report.elapsed_s)
+
+        _index_cache[(folder, config)] = (signature, chunks)
+        return chunks
+
 # create list ofnormalized user query -- words >= 3 chars, no punctuation, lowercase
 def tokenize(query: str) -> List[str]:
     return [w.lower() for w in re.findall(r"[a-zA-Z0-9]+", query) if len(w) >= 3]
@@ -79,43 +209,66 @@ def tokenize(query: str) -> List[str]:
 
 # simple scoring based on keyword similarity -- should replace with cosine similarity and vector embeddings
 def score_query(split_query: List[str], chunk: Chunk) -> int:
-    text = (chunk.section+ "\n" + chunk.content).lower()
     score = 0
     for word in split_query:
-        score += text.count(word)
+        score += chunk.section_lower.count(word) + chunk.content_lower.count(word)
     return score
 
-def knowledge_search(query: str, top_k: int = 3, folder: str= "knowledge") -> Dict[str, Any]:
-    files = read_files(folder)
 
-    chunks: List[Chunk] = []
+# the part of the chunk with the most query term hits, starting at a sentence boundary and cut at a space
+def best_passage(chunk: Chunk, terms: List[str], limit: int) -> str:
+    content = chunk.content
+    if len(content) <= limit:
+        return content
 
-    for filename, content in files:
-        chunks.extend(chunk_file(filename, content))
+    hits = sorted(m.start() for term in set(terms) for m in re.finditer(re.escape(term), chunk.content_lower))
+    # ties go to the later start, which puts the first hit near the top of the passage
+    start, best = 0, 0
+    for offset in chunk.offsets:
+        count = sum(1 for h in hits if offset <= h < offset + limit)
+        if count and count >= best:
+            start, best = offset, count
 
-    terms = tokenize(query)
+    prefix = "..." if start else ""
+    end = start + limit - len(prefix)
+    if end >= len(content):
+        return prefix + content[start:]
+    cut = content.rfind(" ", start, end)
+    if cut > start:
+        end = cut
+    return prefix + content[start:end] + "..."
+
+# KNOWLEDGE_SEARCH_MODE=lexical (default) | hybrid, see models/hybrid_search.py
+SEARCH_MODE = os.getenv("KNOWLEDGE_SEARCH_MODE", "lexical").strip().lower()
 
-    scores: List[Tuple[int, Chunk]] = []
-    for chunk in chunks:
-        s = score_query(terms, chunk)
-        if s > 0:
-            scores.append((s, chunk))
+@traced("knowledge_search")
+def knowledge_search(query: str, top_k: int = 3, folder: str= "knowledge", mode: Optional[str] = None) -> Dict[str, Any]:
+    chunks = load_chunks(folder)
 
-    # in descending order
-    scores.sort(key = lambda x: x[0], reverse = True)
+    terms = tokenize(query)
 
-    top_matches = []
-    for score, chunk in scores[:top_k]:
-        top_matches.append(chunk)
+    if (mode or SEARCH_MODE) == "hybrid":
+        # imported here, hybrid_search builds on the scoring in this module
+        from models.hybrid_search import hybrid_search
+        top_matches = hybrid_search(query, terms, chunks, top_k, folder)
+    else:
+        scores: List[Tuple[int, Chunk]] = []
+        for chunk in chunks:
+            s = score_query(terms, chunk)
+            if s > 0:
+                scores.append((s, chunk))
 
-    
+        # in descending order
+        scores.sort(key = lambda x: x[0], reverse = True)
+
+        top_matches = []
+        for score, chunk in scores[:top_k]:
+            top_matches.append(chunk)
 
     final_matches = []
     for chunk in top_matches:
-        content = chunk.content.strip()
         # to normalize larger repsponses
-        if len(content) > 700:
-            content = content[:700].rstrip() + "..."
+        content = best_passage(chunk, terms, DEFAULT_CHUNKER.snippet_chars)
         final_matches.append({"source" : chunk.filename, "title" : chunk.title, "section" : chunk.section, "content" : content})
 
 
@@ -0,0 +1,83 @@
+# per-session window of client message ids (see models/chat_frames.py) and the replies they got. a
+# resent message is answered from here -- no new turn, no LLM call, no duplicate chat_messages row.
+#
+# the window lives in memory for the sessions this worker has seen recently; chat_client_messages is
+# the source of truth behind it, so a session that reconnects to another worker is deduped too. a
+# session started on this worker has a complete window and never needs the DB to rule an id new.
+#
+#   DEDUPE_WINDOW=256 ids per session  DEDUPE_MAX_SESSIONS=10000
+
+import asyncio
+import os
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from db.chat_db import ClientMessageRow
+
+DEDUPE_WINDOW = int(os.getenv("DEDUPE_WINDOW", "256"))
+DEDUPE_MAX_SESSIONS = int(os.getenv("DEDUPE_MAX_SESSIONS", "10000"))
+
+NEW = "new"            # never seen -- store it and run the turn
+SEEN = "seen"          # stored before but never answered (e.g. the connection dropped mid-turn)
+REPLIED = "replied"    # answered -- replay the stored reply
+
+
+@dataclass
+class _Window:
+    # message id -> reply, None while unanswered; oldest first
+    replies: "OrderedDict[str, Optional[str]]" = field(default_factory=OrderedDict)
+    # every id of the session went through this window, so a miss means the id is new
+    complete: bool = False
+
+
+class MessageDedupe:
+    def __init__(self, lookup: Callable[[str, str], Optional[ClientMessageRow]],
+                 window: int = DEDUPE_WINDOW, max_sessions: int = DEDUPE_MAX_SESSIONS):
+        # lookup(session_id, message_id) reads the DB, e.g. SqliteChatRepo.get_client_message
+        self.lookup = lookup
+        self.window = window
+        self.max_sessions = max_sessions
+        self._windows: "OrderedDict[str, _Window]" = OrderedDict()
+
+    def _get(self, session_id: str) -> _Window:
+        win = self._windows.get(session_id)
+        if win is None:
+            win = self._windows[session_id] = _Window()
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+        self._windows.move_to_end(session_id)
+        return win
+
+    def _put(self, win: _Window, message_id: str, reply: Optional[str]) -> None:
+        win.replies[message_id] = reply
+        win.replies.move_to_end(message_id)
+        while len(win.replies) > self.window:
+            win.replies.popitem(last=False)
+            win.complete = False
+
+    # a session created on this worker: nothing about it can be in the DB yet
+    def open_session(self, session_id: str) -> None:
+        self._get(session_id).complete = True
+
+    async def check(self, session_id: str, message_id: str) -> Tuple[str, Optional[str]]:
+        win = self._get(session_id)
+        if message_id in win.replies:
+            reply = win.replies[message_id]
+            return (SEEN, None) if reply is None else (REPLIED, reply)
+        if win.complete:
+            return NEW, None
+
+        row = await asyncio.to_thread(self.lookup, session_id, message_id)
+        if row is None:
+            return NEW, None
+        self._put(win, message_id, row.reply)
+        return (SEEN, None) if row.reply is None else (REPLIED, row.reply)
+
+    def seen(self, session_id: str, message_id: str) -> None:
+        self._put(self._get(session_id), message_id, None)
+
+    def replied(self, session_id: str, message_ids: List[str], reply: str) -> None:
+        win = self._get(session_id)
+        for message_id in message_ids:
+            self._put(win, message_id, reply)
@@ -0,0 +1,67 @@
+# which model each LLM call uses. routing runs on the smallest model and is retried on a stronger one
+# only when its answer is unusable (no route call, arguments that don't parse) or under the confidence
+# threshold; generation and the final reply pick a model by intent. most turns are simple and never
+# touch the bigger model.
+#
+#   MODEL_ROUTE=gpt-4.1-nano  MODEL_ROUTE_ESCALATE=gpt-4.1-mini (empty disables)  ROUTE_MIN_CONFIDENCE=0.6
+#   MODEL_GENERATE=gpt-4.1-mini  MODEL_GENERATE_BY_INTENT="knowledge_qa=gpt-4.1,greeting=gpt-4.1-nano"
+
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from models.intent import Intent
+from monitoring.metrics import MODEL_DECISIONS
+
+DEFAULT_ROUTE_MODEL = "gpt-4.1-nano"
+DEFAULT_ESCALATION_MODEL = "gpt-4.1-mini"
+DEFAULT_GENERATE_MODEL = "gpt-4.1-mini"
+DEFAULT_GENERATE_BY_INTENT = f"{Intent.GREETING.value}=gpt-4.1-nano,{Intent.GOODBYE.value}=gpt-4.1-nano"
+
+
+def parse_intent_models(raw: str) -> Dict[Intent, str]:
+    models = {}
+    for part in raw.split(","):
+        name, _, model = part.partition("=")
+        if name.strip() and model.strip():
+            models[Intent(name.strip())] = model.strip()
+    return models
+
+
+@dataclass
+class ModelPolicy:
+    route: str = DEFAULT_ROUTE_MODEL
+    route_escalation: Optional[str] = DEFAULT_ESCALATION_MODEL
+    min_confidence: float = 0.6
+    generate: str = DEFAULT_GENERATE_MODEL
+    generate_by_intent: Dict[Intent, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_env(cls) -> "ModelPolicy":
+        return cls(
+            route=os.getenv("MODEL_ROUTE", DEFAULT_ROUTE_MODEL),
+            route_escalation=os.getenv("MODEL_ROUTE_ESCALATE", DEFAULT_ESCALATION_MODEL).strip() or None,
+            min_confidence=float(os.getenv("ROUTE_MIN_CONFIDENCE", "0.6")),
+            generate=os.getenv("MODEL_GENERATE", DEFAULT_GENERATE_MODEL),
+            generate_by_intent=parse_intent_models(os.getenv("MODEL_GENERATE_BY_INTENT", DEFAULT_GENERATE_BY_INTENT)),
+        )
+
+    # why the routing answer should be asked again of the stronger model, or None to keep it
+    def escalation_reason(self, intent_confidence: Optional[float], parse_failed: bool = False) -> Optional[str]:
+        if self.route_escalation is None or self.route_escalation == self.route:
+            return None
+        if parse_failed:
+            return "parse_error"
+        if intent_confidence is None:
+            return "no_route_call"
+        if intent_confidence < self.min_confidence:
+            return "low_confidence"
+        return None
+
+    def generation_model(self, intent: Optional[Intent]) -> str:
+        return self.generate_by_intent.get(intent, self.generate) if intent is not None else self.generate
+
+
+# counted for every LLM call so cost and latency can be split by why a model was picked
+def record_decision(stage: str, model: str, reason: str) -> None:
+    MODEL_DECISIONS.inc(stage=stage, model=model, reason=reason)
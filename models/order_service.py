@@ -0,0 +1,196 @@
+# order lookups for the get_order tool -- an async service in front of a pluggable backend with a
+# per-order TTL cache, single-flight coalescing (concurrent lookups of one order_id share a backend call)
+# and a timeout, since order-status turns are the most common traffic and the order system is slow
+
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from db.chat_db import DEFAULT_DB_PATH
+from monitoring.metrics import ORDER_LOOKUPS
+
+if TYPE_CHECKING:
+    import httpx
+
+# stand-in data for local runs and tests, also what the load test scenarios ask for
+FAKE_ORDERS = {
+  "124": {"status": "Shipped", "eta": "2026-02-25", "carrier": "UPS", "tracking": "1Z..."},
+  "555": {"status": "Processing", "eta": "2026-02-28", "carrier": None, "tracking": None},
+}
+
+# order ids come from the user or the model; anything else is not-found without touching a backend
+ORDER_ID_PATTERN = re.compile(os.getenv("ORDER_ID_PATTERN", r"^[A-Za-z0-9-]{1,32}$"))
+
+NOT_FOUND = {"error": "not found"}
+UNAVAILABLE = {"error": "order service unavailable"}
+
+
+# fetch returns the order dict, or None when the order doesn't exist; anything else should raise
+class OrderBackend:
+    async def fetch(self, order_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryOrderBackend(OrderBackend):
+    def __init__(self, orders: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.orders = FAKE_ORDERS if orders is None else orders
+
+    async def fetch(self, order_id: str) -> Optional[Dict[str, Any]]:
+        order = self.orders.get(order_id)
+        return dict(order) if order is not None else None
+
+
+# reads the orders table (db/schema.sql) off the event loop
+class SqliteOrderBackend(OrderBackend):
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("DB_PATH", DEFAULT_DB_PATH)
+
+    def _fetch(self, order_id: str) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(
+                "SELECT status, eta, carrier, tracking FROM orders WHERE order_id=?", (order_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row else None
+
+    async def fetch(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._fetch, order_id)
+
+    def add(self, order_id: str, order: Dict[str, Any]) -> None:
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        try:
+            conn.execute(
+                "INSERT INTO orders (order_id, status, eta, carrier, tracking) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(order_id) DO UPDATE SET status=excluded.status, eta=excluded.eta, "
+                "carrier=excluded.carrier, tracking=excluded.tracking",
+                (order_id, order.get("status"), order.get("eta"), order.get("carrier"), order.get("tracking")),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# GET {base_url}/orders/{order_id} -- one pooled client per worker, 404 means no such order
+class HttpOrderBackend(OrderBackend):
+    def __init__(self, base_url: str, timeout: float = 2.0, max_connections: int = 100,
+                 transport: Optional["httpx.AsyncBaseTransport"] = None):
+        # imported here, only this backend needs httpx and it's a noticeable share of worker import time
+        import httpx
+
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            transport=transport,
+        )
+
+    async def fetch(self, order_id: str) -> Optional[Dict[str, Any]]:
+        # OrderService already rejects ids outside ORDER_ID_PATTERN; quoted anyway in case the pattern is widened
+        response = await self._client.get(f"/orders/{quote(order_id, safe='')}")
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+class OrderService:
+    def __init__(self, backend: OrderBackend, ttl: float = 30.0, negative_ttl: float = 5.0,
+                 timeout: float = 2.0, max_entries: int = 10_000):
+        self.backend = backend
+        self.ttl = ttl
+        # unknown ids are cached briefly too, users retype the same wrong id
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _cached(self, order_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._cache.get(order_id)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._cache[order_id]
+            return None
+        self._cache.move_to_end(order_id)
+        return value
+
+    def _store(self, order_id: str, value: Dict[str, Any], ttl: float) -> None:
+        self._cache[order_id] = (time.monotonic() + ttl, value)
+        self._cache.move_to_end(order_id)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, order_id: str) -> None:
+        self._cache.pop(order_id, None)
+
+    async def _load(self, order_id: str) -> Dict[str, Any]:
+        try:
+            order = await asyncio.wait_for(self.backend.fetch(order_id), self.timeout)
+        except Exception:
+            # failures aren't cached, the next lookup tries the backend again
+            ORDER_LOOKUPS.inc(source="error")
+            return dict(UNAVAILABLE)
+        finally:
+            self._inflight.pop(order_id, None)
+
+        value = order if order is not None else dict(NOT_FOUND)
+        self._store(order_id, value, self.ttl if order is not None else self.negative_ttl)
+        return value
+
+    # the tool result: the order, {"error": "not found"} or {"error": "order service unavailable"}
+    async def get_order(self, order_id: str) -> Dict[str, Any]:
+        order_id = str(order_id).strip()
+        if not ORDER_ID_PATTERN.match(order_id):
+            ORDER_LOOKUPS.inc(source="invalid")
+            return dict(NOT_FOUND)
+
+        cached = self._cached(order_id)
+        if cached is not None:
+            ORDER_LOOKUPS.inc(source="cache")
+            return dict(cached)
+
+        task = self._inflight.get(order_id)
+        if task is None:
+            ORDER_LOOKUPS.inc(source="backend")
+            task = self._inflight[order_id] = asyncio.create_task(self._load(order_id))
+        else:
+            ORDER_LOOKUPS.inc(source="coalesced")
+        # shielded so one cancelled turn doesn't cancel the lookup the others are waiting on
+        return dict(await asyncio.shield(task))
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+# ORDER_BACKEND=memory (default) | sqlite | http
+def create_order_service(kind: Optional[str] = None) -> OrderService:
+    kind = (kind or os.getenv("ORDER_BACKEND", "memory")).lower()
+    timeout = float(os.getenv("ORDER_TIMEOUT", "2.0"))
+    if kind == "memory":
+        backend: OrderBackend = InMemoryOrderBackend()
+    elif kind == "sqlite":
+        backend = SqliteOrderBackend(os.getenv("ORDER_DB_PATH"))
+    elif kind == "http":
+        url = os.getenv("ORDER_SERVICE_URL")
+        if not url:
+            raise ValueError("ORDER_BACKEND=http needs ORDER_SERVICE_URL")
+        backend = HttpOrderBackend(url, timeout=timeout, max_connections=int(os.getenv("ORDER_MAX_CONNECTIONS", "100")))
+    else:
+        raise ValueError(f"Unknown ORDER_BACKEND: {kind}")
+    return OrderService(backend, ttl=float(os.getenv("ORDER_CACHE_TTL", "30")), timeout=timeout)
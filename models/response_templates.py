@@ -0,0 +1,76 @@
+# canned answers for tool results that don't need the model to phrase them -- keyed by intent and the
+# outcome of the get_order lookup. generate_result uses these instead of the final LLM call; a missing
+# template (or an intent switched off in TEMPLATE_INTENTS) falls back to the model
+
+import os
+from typing import Any, Dict, Optional, Tuple
+
+from models.intent import Intent
+from monitoring.metrics import TEMPLATED_RESPONSES
+
+NOT_FOUND_TEXT = (
+    "I couldn't find an order with ID {order_id}. Could you double-check it, "
+    "or share the email or phone number on the order?"
+)
+UNAVAILABLE_TEXT = "I can't reach our order system right now -- please try again in a minute."
+
+TEMPLATES: Dict[Tuple[Intent, str], str] = {
+    (Intent.GET_ORDER_INFORMATION, "found"): "Order {order_id} is {status}{eta}{shipping}.",
+    (Intent.GET_ORDER_INFORMATION, "not_found"): NOT_FOUND_TEXT,
+    (Intent.GET_ORDER_INFORMATION, "unavailable"): UNAVAILABLE_TEXT,
+    # a found order on a refund still needs the model to walk through the return
+    (Intent.REFUND_ORDER, "not_found"): NOT_FOUND_TEXT,
+    (Intent.REFUND_ORDER, "unavailable"): UNAVAILABLE_TEXT,
+}
+
+DEFAULT_TEMPLATE_INTENTS = f"{Intent.GET_ORDER_INFORMATION.value},{Intent.REFUND_ORDER.value}"
+
+
+# TEMPLATE_INTENTS=get_order_information,refund_order (default) -- empty turns templating off
+def enabled_intents() -> frozenset:
+    raw = os.getenv("TEMPLATE_INTENTS", DEFAULT_TEMPLATE_INTENTS)
+    return frozenset(part.strip() for part in raw.split(",") if part.strip())
+
+
+def order_outcome(tool_output: Dict[str, Any]) -> str:
+    error = tool_output.get("error")
+    if error is None:
+        return "found" if tool_output.get("status") else "unknown"
+    return "not_found" if error == "not found" else "unavailable"
+
+
+def _order_fields(order_id: str, order: Dict[str, Any]) -> Dict[str, str]:
+    eta = f", expected {order['eta']}" if order.get("eta") else ""
+    shipping = ""
+    if order.get("carrier"):
+        shipping = f" via {order['carrier']}"
+        if order.get("tracking"):
+            shipping += f" (tracking {order['tracking']})"
+    return {"order_id": order_id, "status": str(order.get("status", "")).lower(), "eta": eta, "shipping": shipping}
+
+
+FOUND_TEXT = TEMPLATES[(Intent.GET_ORDER_INFORMATION, "found")]
+
+
+# plain status line for any lookup outcome, for when no model is available to phrase it
+def order_summary(order_id: str, tool_output: Dict[str, Any]) -> str:
+    outcome = order_outcome(tool_output)
+    if outcome == "not_found":
+        return NOT_FOUND_TEXT.format(order_id=order_id)
+    if outcome == "unavailable":
+        return UNAVAILABLE_TEXT
+    if outcome == "unknown":
+        return f"I found order {order_id}, but I can't read its status right now."
+    return FOUND_TEXT.format_map(_order_fields(order_id, tool_output))
+
+
+# the reply for a get_order result, or None when the model should write it
+def render_order_reply(intent: Optional[Intent], order_id: str, tool_output: Dict[str, Any]) -> Optional[str]:
+    if intent is None or intent.value not in enabled_intents():
+        return None
+    outcome = order_outcome(tool_output)
+    template = TEMPLATES.get((intent, outcome))
+    if template is None:
+        return None
+    TEMPLATED_RESPONSES.inc(intent=intent.value, outcome=outcome)
+    return template.format_map(_order_fields(order_id, tool_output))
@@ -0,0 +1,191 @@
+# validation for tool-call arguments, compiled once per tool from its JSON schema. the model's argument
+# string goes through a fast decode (orjson when installed), then the checks; common slips are repaired
+# locally instead of costing a second LLM call:
+#   - code fences or text around the JSON object
+#   - enum values in the wrong case or with spaces/dashes ("Get Order Information")
+#   - nullable fields left out, unknown fields added
+#   - numbers sent as strings, numbers outside minimum/maximum, whole floats for integers
+# anything else raises ToolArgsError (a ValueError), counted per tool as ok/repaired/failed
+
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Tuple
+
+from monitoring.metrics import TOOL_ARG_REPAIRS, TOOL_ARGS
+
+try:
+    import orjson
+
+    _loads: Callable[[str], Any] = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+_decoder = json.JSONDecoder()
+_fence = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_separators = re.compile(r"[\s\-]+")
+
+_PY_TYPES = {
+    "string": (str,),
+    "number": (int, float),
+    "integer": (int,),
+    "boolean": (bool,),
+    "object": (dict,),
+    "array": (list,),
+}
+
+
+class ToolArgsError(ValueError):
+    """Arguments that couldn't be decoded or repaired into the tool's schema."""
+
+
+def _enum_key(value: str) -> str:
+    return _separators.sub("_", value.strip().lower())
+
+
+@dataclass(frozen=True)
+class _Field:
+    name: str
+    types: FrozenSet[str]
+    nullable: bool
+    enum: Optional[Tuple[Any, ...]] = None
+    # normalised spelling -> enum value, for repairing casing
+    enum_lookup: Dict[str, Any] = field(default_factory=dict)
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+
+    # (value, repair name or None); raises ToolArgsError when it can't be made valid
+    def check(self, value: Any) -> Tuple[Any, Optional[str]]:
+        if value is None:
+            if self.nullable:
+                return None, None
+            raise ToolArgsError(f"{self.name} must not be null")
+
+        repair = None
+        if self.enum is not None:
+            if value in self.enum:
+                return value, None
+            if isinstance(value, str) and _enum_key(value) in self.enum_lookup:
+                return self.enum_lookup[_enum_key(value)], "enum_case"
+            raise ToolArgsError(f"{self.name}: {value!r} is not one of {list(self.enum)}")
+
+        if self.types & {"number", "integer"}:
+            if isinstance(value, str):
+                try:
+                    value, repair = float(value.strip()), "number_string"
+                except ValueError:
+                    raise ToolArgsError(f"{self.name} must be a number") from None
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ToolArgsError(f"{self.name} must be a number")
+            if "integer" in self.types and "number" not in self.types and not isinstance(value, int):
+                if not float(value).is_integer():
+                    raise ToolArgsError(f"{self.name} must be an integer")
+                value, repair = int(value), repair or "integer_float"
+            if self.minimum is not None and value < self.minimum:
+                value, repair = type(value)(self.minimum), "clamped"
+            if self.maximum is not None and value > self.maximum:
+                value, repair = type(value)(self.maximum), "clamped"
+            return value, repair
+
+        if not any(isinstance(value, _PY_TYPES[t]) for t in self.types if t in _PY_TYPES):
+            raise ToolArgsError(f"{self.name} must be {'/'.join(sorted(self.types))}")
+        return value, None
+
+
+@dataclass
+class ToolArgsValidator:
+    tool: str
+    fields: Dict[str, _Field]
+    required: FrozenSet[str]
+    additional: bool = True
+    defaults: Dict[str, Any] = field(default_factory=dict)
+
+    # decoded and validated arguments, plus the names of the repairs that were needed
+    def parse(self, arguments: Optional[str]) -> Tuple[Dict[str, Any], List[str]]:
+        repairs: List[str] = []
+        try:
+            args = self._validate(self._decode(arguments or "{}", repairs), repairs)
+        except ToolArgsError:
+            TOOL_ARGS.inc(tool=self.tool, outcome="failed")
+            raise
+        for name in repairs:
+            TOOL_ARG_REPAIRS.inc(tool=self.tool, repair=name)
+        TOOL_ARGS.inc(tool=self.tool, outcome="repaired" if repairs else "ok")
+        return args, repairs
+
+    def _decode(self, text: str, repairs: List[str]) -> Dict[str, Any]:
+        try:
+            value = _loads(text)
+        except ValueError:
+            # fall back to the first JSON object in the text, ignoring fences and anything around it
+            stripped = _fence.sub("", text)
+            start = stripped.find("{")
+            if start < 0:
+                raise ToolArgsError("arguments are not JSON") from None
+            try:
+                value, _ = _decoder.raw_decode(stripped, start)
+            except ValueError as e:
+                raise ToolArgsError(f"arguments are not JSON: {e}") from None
+            repairs.append("extracted_json")
+        if not isinstance(value, dict):
+            raise ToolArgsError("arguments must be a JSON object")
+        return value
+
+    def _validate(self, args: Dict[str, Any], repairs: List[str]) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for name, value in args.items():
+            spec = self.fields.get(name)
+            if spec is None:
+                if not self.additional:
+                    repairs.append("dropped_unknown")
+                    continue
+                out[name] = value
+                continue
+            out[name], repair = spec.check(value)
+            if repair:
+                repairs.append(repair)
+
+        for name in self.required:
+            if name in out:
+                continue
+            if self.fields[name].nullable:
+                out[name] = None
+                repairs.append("filled_null")
+            else:
+                raise ToolArgsError(f"missing required argument {name}")
+        for name, value in self.defaults.items():
+            out.setdefault(name, value)
+        return out
+
+
+def compile_tool(tool: Dict[str, Any]) -> ToolArgsValidator:
+    function = tool["function"]
+    schema = function.get("parameters") or {}
+    fields: Dict[str, _Field] = {}
+    defaults: Dict[str, Any] = {}
+    for name, prop in (schema.get("properties") or {}).items():
+        types = prop.get("type", [])
+        types = frozenset([types] if isinstance(types, str) else types)
+        enum = prop.get("enum")
+        fields[name] = _Field(
+            name=name,
+            types=types - {"null"},
+            nullable="null" in types,
+            enum=tuple(enum) if enum is not None else None,
+            enum_lookup={_enum_key(v): v for v in enum or () if isinstance(v, str)},
+            minimum=prop.get("minimum"),
+            maximum=prop.get("maximum"),
+        )
+        if "default" in prop:
+            defaults[name] = prop["default"]
+    return ToolArgsValidator(
+        tool=function["name"],
+        fields=fields,
+        required=frozenset(schema.get("required", ())),
+        additional=schema.get("additionalProperties", True) is not False,
+        defaults=defaults,
+    )
+
+
+def compile_tools(tools: List[Dict[str, Any]]) -> Dict[str, ToolArgsValidator]:
+    return {tool["function"]["name"]: compile_tool(tool) for tool in tools}
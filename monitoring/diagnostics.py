@@ -0,0 +1,185 @@
+# opt-in production diagnostics for "why did latency spike" -- DIAGNOSTICS_ENABLED=1 turns on:
+#
+#   - an event-loop lag sampler: a task that sleeps LOOP_LAG_INTERVAL_MS and records how late it woke up
+#     (event_loop_lag_seconds). anything blocking the loop -- a sqlite call, knowledge file I/O, a big
+#     json.dumps -- shows up here first
+#   - a slow-callback watchdog: a thread that notices when that task stops waking up for longer than
+#     SLOW_CALLBACK_MS and logs the loop thread's stack and coroutine *while it is still blocked*
+#   - GET /debug/profile and /debug/allocations: a timed sampling profile or tracemalloc diff, returned
+#     as folded stacks ("a;b;c 42" per line) for flamegraph.pl, speedscope or inferno
+#
+# cost when on: a few wakeups a second plus one stack capture per stall. profiling and tracemalloc only
+# run for the requested window, one at a time, capped at MAX_CAPTURE_S
+
+import asyncio
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import tracemalloc
+from collections import Counter
+from types import FrameType
+from typing import Dict, Iterable, List, Optional
+
+from monitoring.metrics import EVENT_LOOP_LAG, SLOW_CALLBACKS
+
+logger = logging.getLogger(__name__)
+
+DIAGNOSTICS_ENABLED = os.getenv("DIAGNOSTICS_ENABLED", "0").strip().lower() not in ("0", "false", "no", "off")
+LOOP_LAG_INTERVAL_S = float(os.getenv("LOOP_LAG_INTERVAL_MS", "250")) / 1000
+SLOW_CALLBACK_S = float(os.getenv("SLOW_CALLBACK_MS", "100")) / 1000
+MAX_CAPTURE_S = 30.0
+
+# profiles and allocation diffs share one slot -- two at once would measure each other
+_capture_lock = threading.Lock()
+
+
+class CaptureBusyError(RuntimeError):
+    """Another profile or allocation capture is already running."""
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+# outermost first, the order folded stacks use
+def _stack(frame: Optional[FrameType]) -> List[FrameType]:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+# the task's own coroutine, i.e. the outermost coroutine frame on the loop thread's stack
+def blocking_coroutine(frame: Optional[FrameType]) -> Optional[str]:
+    for f in _stack(frame):
+        if f.f_code.co_flags & inspect.CO_COROUTINE:
+            return getattr(f.f_code, "co_qualname", f.f_code.co_name)
+    return None
+
+
+def fold(stacks: Iterable[str]) -> str:
+    counts = Counter(stacks)
+    return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_S, threshold: float = SLOW_CALLBACK_S):
+        self.interval = interval
+        self.threshold = threshold
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # call from the event loop; starts the lag sampler task and the watchdog thread
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._sample())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join()
+            self._watchdog = None
+
+    async def _sample(self) -> None:
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._heartbeat = now
+            EVENT_LOOP_LAG.observe(max(0.0, now - start - self.interval))
+
+    def _watch(self) -> None:
+        reported = None
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._heartbeat
+            blocked = time.monotonic() - beat - self.interval
+            # one report per stall, taken while the offending code is still on the stack
+            if blocked < self.threshold or beat == reported:
+                continue
+            reported = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            SLOW_CALLBACKS.inc()
+            logger.warning(
+                "event loop blocked for %.0fms+ in %s\n%s",
+                blocked * 1000,
+                blocking_coroutine(frame) or "a non-coroutine callback",
+                "".join(traceback.format_stack(frame)) if frame is not None else "(no stack)",
+            )
+
+
+def _acquire() -> None:
+    if not _capture_lock.acquire(blocking=False):
+        raise CaptureBusyError("a capture is already running")
+
+
+# samples every thread's stack every `interval` seconds for `duration` seconds, blocking the calling
+# thread -- run it off the loop (asyncio.to_thread) so the loop is profiled, not stopped
+def sample_profile(duration: float, interval: float = 0.005) -> str:
+    duration = min(duration, MAX_CAPTURE_S)
+    _acquire()
+    try:
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        stacks: List[str] = []
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                labels = [names.get(ident, str(ident))] + [_frame_label(f) for f in _stack(frame)]
+                stacks.append(";".join(labels))
+            time.sleep(interval)
+        return fold(stacks)
+    finally:
+        _capture_lock.release()
+
+
+# bytes allocated and still alive after `duration` seconds, by allocating stack, as folded stacks.
+# tracemalloc slows allocations down while it traces, so it is only on for the window
+def allocation_diff(duration: float, frames: int = 16) -> str:
+    duration = min(duration, MAX_CAPTURE_S)
+    _acquire()
+    started = not tracemalloc.is_tracing()
+    try:
+        if started:
+            tracemalloc.start(frames)
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        before = tracemalloc.take_snapshot().filter_traces(ignore)
+        time.sleep(duration)
+        after = tracemalloc.take_snapshot().filter_traces(ignore)
+    finally:
+        if started:
+            tracemalloc.stop()
+        _capture_lock.release()
+
+    lines = []
+    for stat in after.compare_to(before, "traceback"):
+        if stat.size_diff <= 0:
+            continue
+        stack = ";".join(f"{os.path.basename(f.filename)}:{f.lineno}" for f in stat.traceback)
+        lines.append(f"{stack} {stat.size_diff}\n")
+    return "".join(lines)
+
+
+loop_monitor = LoopMonitor()
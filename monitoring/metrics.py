@@ -0,0 +1,307 @@
+# prometheus-style metrics rendered in the text exposition format on GET /metrics
+#
+# series are updated from the event loop and from threads too (the ChatWriter, rollup refreshes, index
+# builds, anything behind asyncio.to_thread), and a read-modify-write like inc() can lose updates between
+# threads -- so every metric has its own lock. uncontended it adds a few hundred nanoseconds to an update
+
+import os
+import threading
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from monitoring.tracing import Span, tracer
+
+LabelKey = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+HANDOFF_WAIT_BUCKETS = (5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1200.0, 1800.0, 3600.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelKey, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelKey, float] = {}
+        # evaluated at scrape time instead of on the hot path
+        self._callback = callback
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set_callback(self, callback: Callable[[], float]) -> None:
+        self._callback = callback
+
+    def value(self, **labels: Any) -> float:
+        if self._callback is not None:
+            return self._callback()
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        if self._callback is not None:
+            lines.append(f"{self.name} {_format_value(self._callback())}")
+            return lines
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [non-cumulative bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelKey, List[Any]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        bucket = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bucket] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        with self._lock:
+            # a consistent snapshot: bucket counts, sum and count of a series move together
+            series = [(key, (list(counts), total, n)) for key, (counts, total, n) in sorted(self._series.items())]
+        for key, (counts, total, n) in series:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                labels = _format_labels(self.label_names, key, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {repr(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+ACTIVE_CONNECTIONS = registry.register(Gauge(
+    "ws_active_connections", "Open WebSocket chat sessions."))
+WAITING_CONNECTIONS = registry.register(Gauge(
+    "ws_waiting_connections", "Accepted WebSocket sessions waiting for a free slot."))
+REJECTED_CONNECTIONS = registry.register(Counter(
+    "ws_rejected_connections_total", "WebSocket handshakes refused because the server was full."))
+IDLE_CLOSED_CONNECTIONS = registry.register(Counter(
+    "ws_idle_closed_total", "WebSocket sessions closed after the idle timeout."))
+SLOW_CONSUMER_CLOSED_CONNECTIONS = registry.register(Counter(
+    "ws_slow_consumer_closed_total", "WebSocket sessions closed because replies piled up unsent."))
+TURNS = registry.register(Counter(
+    "chat_turns_total", "Chat turns handled; rate() gives turns per second."))
+STAGE_LATENCY = registry.register(Histogram(
+    "stage_latency_seconds", "Latency of traced stages (get_intent, tool_call, db_write, ...).", ("stage",)))
+STAGE_ERRORS = registry.register(Counter(
+    "stage_errors_total", "Traced stages that raised, by stage and exception type.", ("stage", "error")))
+LLM_CALLS = registry.register(Counter(
+    "llm_calls_total", "Chat completion calls by model and stage.", ("model", "stage")))
+LLM_TOKENS = registry.register(Counter(
+    "llm_tokens_total", "Tokens reported by the provider by model, stage and kind (prompt/completion/cached).",
+    ("model", "stage", "kind")))
+LLM_LATENCY = registry.register(Histogram(
+    "llm_call_latency_seconds", "Chat completion latency by model and stage.", ("model", "stage")))
+MODEL_DECISIONS = registry.register(Counter(
+    "model_decisions_total", "Model picked for an LLM call, by stage, model and reason (default, intent, escalation cause).",
+    ("stage", "model", "reason")))
+TOOL_ARGS = registry.register(Counter(
+    "tool_args_total", "Tool-call arguments parsed, by tool and outcome (ok/repaired/failed).", ("tool", "outcome")))
+TOOL_ARG_REPAIRS = registry.register(Counter(
+    "tool_arg_repairs_total", "Local repairs applied to tool-call arguments, by tool and kind.", ("tool", "repair")))
+LLM_BREAKER_OPEN = registry.register(Gauge(
+    "llm_breaker_open", "1 while the LLM circuit breaker is open or probing, 0 when closed."))
+LLM_BREAKER_TRANSITIONS = registry.register(Counter(
+    "llm_breaker_transitions_total", "Circuit breaker state changes, by breaker and new state.", ("breaker", "to")))
+DEGRADED_TURNS = registry.register(Counter(
+    "degraded_turns_total", "Turns answered by the local pipeline because the LLM was unavailable, by intent.",
+    ("intent",)))
+WS_PROTOCOLS = registry.register(Counter(
+    "ws_protocol_connections_total", "WebSocket sessions by negotiated frame protocol (text = plain-text fallback).",
+    ("protocol",)))
+WS_FRAME_ERRORS = registry.register(Counter(
+    "ws_frame_errors_total", "Client frames that didn't decode, by protocol.", ("protocol",)))
+DUPLICATE_MESSAGES = registry.register(Counter(
+    "chat_duplicate_messages_total", "Resent client messages, by outcome (replayed/in_flight/resumed).", ("outcome",)))
+HANDOFF_QUEUE_DEPTH = registry.register(Gauge(
+    "handoff_queue_depth", "Escalated sessions waiting for a support agent."))
+HANDOFF_OLDEST_WAIT = registry.register(Gauge(
+    "handoff_oldest_wait_seconds", "How long the longest-waiting escalated session has been in line."))
+HANDOFF_AGENTS = registry.register(Gauge(
+    "handoff_agents_connected", "Support agents connected to /ws/agent."))
+HANDOFF_WAIT = registry.register(Histogram(
+    "handoff_wait_seconds", "Time from escalation until an agent took the session.", buckets=HANDOFF_WAIT_BUCKETS))
+HANDOFF_EVENTS = registry.register(Counter(
+    "handoff_events_total", "Handoff lifecycle, by event (queued/assigned/released/requeued/abandoned).", ("event",)))
+TURNS_COALESCED = registry.register(Counter(
+    "chat_turns_coalesced_total", "Turns built from a burst of several user messages."))
+TURNS_CANCELLED = registry.register(Counter(
+    "chat_turns_cancelled_total", "In-flight turns cancelled because a newer message superseded them."))
+KNOWLEDGE_CACHE_HITS = registry.register(Counter(
+    "knowledge_cache_hits_total", "knowledge_search lookups served from the in-memory index."))
+KNOWLEDGE_CACHE_MISSES = registry.register(Counter(
+    "knowledge_cache_misses_total", "knowledge_search lookups that had to (re)build the index."))
+KNOWLEDGE_CACHE_HIT_RATIO = registry.register(Gauge(
+    "knowledge_cache_hit_ratio", "Share of knowledge_search lookups served from cache.",
+    callback=lambda: _ratio(KNOWLEDGE_CACHE_HITS.value(), KNOWLEDGE_CACHE_MISSES.value())))
+KNOWLEDGE_BUDGET_EXCEEDED = registry.register(Counter(
+    "knowledge_budget_exceeded_total", "Hybrid searches that skipped a stage to stay within the latency budget.",
+    ("stage",)))
+KNOWLEDGE_VECTOR_BUILD_FAILURES = registry.register(Counter(
+    "knowledge_vector_index_build_failures_total", "Hybrid vector index builds that raised (retried on the next search)."))
+KNOWLEDGE_INDEX_CHUNKS = registry.register(Gauge(
+    "knowledge_index_chunks", "Chunks in the most recently built knowledge index."))
+KNOWLEDGE_INDEX_BUILD_SECONDS = registry.register(Gauge(
+    "knowledge_index_build_seconds", "How long the most recent knowledge index build took."))
+EVENT_LOOP_LAG = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the loop-lag sampler woke up (DIAGNOSTICS_ENABLED=1).", buckets=LAG_BUCKETS))
+SLOW_CALLBACKS = registry.register(Counter(
+    "event_loop_slow_callbacks_total", "Times the event loop was blocked past SLOW_CALLBACK_MS (stack is logged)."))
+STARTUP_SECONDS = registry.register(Gauge(
+    "startup_seconds", "Time spent warming up each resource when this worker started.", ("stage",)))
+DB_WRITE_QUEUE_DEPTH = registry.register(Gauge(
+    "db_write_queue_depth", "Chat writes waiting to be flushed to the database."))
+DB_WRITE_ERRORS = registry.register(Counter(
+    "db_write_errors_total", "Chat writes that failed."))
+ROLLUP_ROWS = registry.register(Counter(
+    "rollup_rows_total", "Source rows folded into the analytics rollups, by source table.", ("source",)))
+ROLLUP_LAG_ROWS = registry.register(Gauge(
+    "rollup_lag_rows", "Source rows not yet folded into the analytics rollups, by source table.", ("source",)))
+ORDER_LOOKUPS = registry.register(Counter(
+    "order_lookups_total", "get_order lookups by where the answer came from (cache/backend/coalesced/error/invalid).",
+    ("source",)))
+TEMPLATED_RESPONSES = registry.register(Counter(
+    "templated_responses_total", "Replies rendered from a response template instead of an LLM call.",
+    ("intent", "outcome")))
+BATCH_CONVERSATIONS = registry.register(Counter(
+    "batch_conversations_total", "Conversations run through the batch API, by status (ok/failed/invalid).",
+    ("status",)))
+
+
+def _ratio(hits: float, misses: float) -> float:
+    total = hits + misses
+    return hits / total if total else 0.0
+
+
+def record_llm_call(model: str, stage: str, response: Any) -> None:
+    LLM_CALLS.inc(model=model, stage=stage)
+
+    # usage is missing on fakes and some providers
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, model=model, stage=stage, kind="prompt")
+    LLM_TOKENS.inc(getattr(usage, "completion_tokens", 0) or 0, model=model, stage=stage, kind="completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+    LLM_TOKENS.inc(cached or 0, model=model, stage=stage, kind="cached")
+
+
+def _observe_span(span: Span) -> None:
+    STAGE_LATENCY.observe(span.duration_s, stage=span.name)
+    if span.name == "llm_call":
+        LLM_LATENCY.observe(span.duration_s, model=span.attributes.get("model", ""), stage=span.attributes.get("stage", ""))
+    if span.error:
+        STAGE_ERRORS.inc(stage=span.name, error=span.error)
+        if span.name == "db_write":
+            DB_WRITE_ERRORS.inc()
+
+
+if os.getenv("METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off"):
+    tracer.add_listener(_observe_span)
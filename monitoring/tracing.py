@@ -0,0 +1,317 @@
+# lightweight per-turn tracing -- spans are timed with perf_counter, kept in small in-memory
+# reservoirs for p50/p95/p99 per stage, and optionally exported as OTLP/JSON lines to a file
+
+import contextvars
+import functools
+import inspect
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# span name -> chat_events.event_type, anything else is stored as a generic "span" event
+EVENT_TYPES = {
+    "get_intent": "intent_detected",
+    "tool_call": "tool_called",
+}
+
+# spans the analytics rollups (db/rollups.py) and loadtest.replay are built from -- handed to an active
+# collect() block also when tracing is off, so chat_events always gets its turn summary
+SUMMARY_SPANS = frozenset({"get_intent", "tool_call", "turn"})
+
+SERVICE_NAME = "customer-support-bot"
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_unix_ns: int
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_s: float = 0.0
+    error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    @property
+    def event_type(self) -> str:
+        return EVENT_TYPES.get(self.name, "span")
+
+    # payload stored in chat_events.payload_json
+    def to_event(self) -> Dict[str, Any]:
+        payload = {"span": self.name, "duration_ms": round(self.duration_s * 1000, 3), **self.attributes}
+        if self.error:
+            payload["error"] = self.error
+        return payload
+
+    # one span in OpenTelemetry's OTLP/JSON shape
+    def to_otlp(self) -> Dict[str, Any]:
+        otlp = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self.start_unix_ns + int(self.duration_s * 1e9)),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            otlp["parentSpanId"] = self.parent_id
+        return otlp
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# returned when tracing is off so `with tracer.span(...) as span: span.set(...)` still works
+class _NoopSpan:
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+# returned when tracing is off but listeners (the metrics histograms) still want stage timings, or a
+# summary span is being collected: a perf_counter pair and the fields listeners and chat_events read,
+# no ids or wall clock
+class _TimedSpan:
+    __slots__ = ("name", "attributes", "duration_s", "error", "_listeners", "_collected", "_start")
+
+    def __init__(self, name: str, attributes: Dict[str, Any], listeners: List[Callable[[Any], None]],
+                 collected: Optional[List[Any]] = None):
+        self.name = name
+        self.attributes = attributes
+        self.duration_s = 0.0
+        self.error: Optional[str] = None
+        self._listeners = listeners
+        self._collected = collected
+
+    event_type = Span.event_type
+    to_event = Span.to_event
+
+    def set(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def __enter__(self) -> "_TimedSpan":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration_s = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        for listener in self._listeners:
+            listener(self)
+        if self._collected is not None:
+            self._collected.append(self)
+        return False
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+_collector: contextvars.ContextVar[Optional[List[Span]]] = contextvars.ContextVar("span_collector", default=None)
+
+
+def percentile(values: List[float], q: float) -> float:
+    # nearest-rank percentile, q in [0, 100]
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def summarize(durations: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    # stage -> count/p50/p95/p99 in milliseconds
+    summary = {}
+    for stage, values in sorted(durations.items()):
+        ms = [v * 1000 for v in values]
+        summary[stage] = {
+            "count": len(ms),
+            "p50": round(percentile(ms, 50), 3),
+            "p95": round(percentile(ms, 95), 3),
+            "p99": round(percentile(ms, 99), 3),
+        }
+    return summary
+
+
+class Tracer:
+    def __init__(self, enabled: Optional[bool] = None, export_path: Optional[str] = None,
+                 max_samples: int = 2048, flush_every: int = 256):
+        self.enabled = _env_flag("TRACING_ENABLED") if enabled is None else enabled
+        self.export_path = export_path or os.getenv("TRACE_EXPORT_PATH")
+        self.flush_every = flush_every
+        self._samples: Dict[str, deque] = defaultdict(lambda: deque(maxlen=max_samples))
+        self._pending_export: List[Span] = []
+        # callbacks run for every finished span (metrics hook in here), also when tracing itself is off --
+        # then they get a _TimedSpan with just the name, attributes, duration and error
+        self._listeners: List[Callable[[Span], None]] = []
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or bool(self._listeners)
+
+    def add_listener(self, listener: Callable[[Span], None]) -> None:
+        self._listeners.append(listener)
+
+    def span(self, name: str, **attributes: Any):
+        if self.enabled:
+            return self._span(name, attributes)
+        collected = _collector.get() if name in SUMMARY_SPANS else None
+        if self._listeners or collected is not None:
+            return _TimedSpan(name, attributes, self._listeners, collected)
+        return _NOOP_SPAN
+
+    @contextmanager
+    def _span(self, name: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else uuid.uuid4().hex,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start_unix_ns=time.time_ns(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.duration_s = time.perf_counter() - start
+            _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        for listener in self._listeners:
+            listener(span)
+
+        if not self.enabled:
+            return
+
+        self._samples[span.name].append(span.duration_s)
+
+        collected = _collector.get()
+        if collected is not None:
+            collected.append(span)
+
+        if self.export_path:
+            self._pending_export.append(span)
+            if len(self._pending_export) >= self.flush_every:
+                self.flush()
+
+    # gathers every span finished inside the block, used by the server to write chat_events per turn.
+    # with tracing off only SUMMARY_SPANS are gathered
+    @contextmanager
+    def collect(self) -> Iterator[List[Span]]:
+        spans: List[Span] = []
+        token = _collector.set(spans)
+        try:
+            yield spans
+        finally:
+            _collector.reset(token)
+
+    def stage_percentiles(self) -> Dict[str, Dict[str, float]]:
+        return summarize({name: list(samples) for name, samples in self._samples.items()})
+
+    def reset(self) -> None:
+        self._samples.clear()
+        self._pending_export.clear()
+
+    # appends one OTLP ExportTraceServiceRequest per line, same layout as the collector's file exporter
+    def flush(self) -> None:
+        if not self.export_path or not self._pending_export:
+            return
+        spans, self._pending_export = self._pending_export, []
+        request = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": __name__},
+                    "spans": [s.to_otlp() for s in spans],
+                }],
+            }]
+        }
+        directory = os.path.dirname(self.export_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.export_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(request) + "\n")
+
+
+tracer = Tracer()
+
+
+# decorator form of tracer.span for sync and async functions
+def traced(name: Optional[str] = None):
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def summarize_export(path: str) -> Dict[str, Dict[str, float]]:
+    durations: Dict[str, List[float]] = defaultdict(list)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            for resource in json.loads(line).get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for s in scope.get("spans", []):
+                        elapsed_ns = int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])
+                        durations[s["name"]].append(elapsed_ns / 1e9)
+    return summarize(durations)
+
+
+# python -m monitoring.tracing traces.jsonl  -> p50/p95/p99 per stage from an exported file
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python -m monitoring.tracing <trace_export.jsonl>")
+        sys.exit(1)
+
+    print(f"{'stage':<20}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}")
+    for stage, row in summarize_export(sys.argv[1]).items():
+        print(f"{stage:<20}{row['count']:>8}{row['p50']:>12}{row['p95']:>12}{row['p99']:>12}")
@@ -1,17 +1,162 @@
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi import Depends, FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 
 from models.chat_manager import ChatManager
+from models.batch_runner import DEFAULT_CONCURRENCY, MAX_CONCURRENCY, parse_conversation, parse_jsonl, run_batch_with_summary
 from models.chat_state import ChatState
+from models.connection_manager import BoundedSender, ConnectionLimiter, IdleTimeoutError, SlowConsumerError
+from models.chat_frames import FrameError, Framing, Payload, negotiate
+from models.handoff import DEFAULT_TIER, HANDOFF_ABANDON_S, HANDOFF_ENABLED, HandoffDesk, HandoffError
+from models.input_pipeline import InputPipeline
+from models.intent import Intent
+from models.message_dedupe import NEW, REPLIED, SEEN, MessageDedupe
+from monitoring import diagnostics, metrics
+from monitoring.tracing import Span, tracer
 
 
 from starlette.websockets import WebSocketDisconnect
 
+import asyncio
+import hmac
+import json
+import logging
+import time
+from dataclasses import asdict
+from typing import List, Optional, Set
+
+import llm_router
+
 # for database persistence
+import os
 import uuid
-from db.chat_db import SqliteChatRepo
+from contextlib import asynccontextmanager, suppress
+from db.chat_db import ChatMessageRow, SqliteChatRepo
+from db.rollups import SqliteRollups
+from db.session_store import create_session_store
+from db.writer import ChatWriter
+from models.knowledge_search import SEARCH_MODE, load_chunks
+
+logger = logging.getLogger(__name__)
+
+# build what the first turn would otherwise build before the worker takes traffic -- everything is
+# still created lazily on first use, so WARMUP=0 (or a TestClient without a with-block) works too
+WARMUP = os.getenv("WARMUP", "1").strip().lower() not in ("0", "false", "no", "off")
+# also open a connection to the LLM API, which sends one models.list request per worker
+WARMUP_LLM_CONNECT = os.getenv("WARMUP_LLM_CONNECT", "0").strip().lower() not in ("0", "false", "no", "off")
+KNOWLEDGE_FOLDER = "knowledge"
+# processes for the warm-up index build; rebuilds during searches are always serial (models/index_builder.py)
+KNOWLEDGE_BUILD_WORKERS = int(os.getenv("KNOWLEDGE_BUILD_WORKERS", "1"))
+# how often each worker folds new rows into the analytics rollups, 0 turns it off (then run
+# `python -m db.rollups` from cron instead); a tick does at most ROLLUP_MAX_CHUNKS chunks per table
+ROLLUP_INTERVAL_S = float(os.getenv("ROLLUP_INTERVAL_S", "30"))
+ROLLUP_MAX_CHUNKS = int(os.getenv("ROLLUP_MAX_CHUNKS", "10"))
+# support-staff surfaces (/ws/agent, /v1/messages/search) need "Authorization: Bearer $AGENT_TOKEN" -- a
+# header, so it stays out of access logs. with no token configured they refuse everyone, unless
+# AGENT_ENDPOINT_OPEN=1 opens them for local development
+AGENT_TOKEN = os.getenv("AGENT_TOKEN", "")
+AGENT_ENDPOINT_OPEN = os.getenv("AGENT_ENDPOINT_OPEN", "0").strip().lower() not in ("0", "false", "no", "off")
+
+
+def agent_authorized(headers) -> bool:
+    if not AGENT_TOKEN:
+        return AGENT_ENDPOINT_OPEN
+    scheme, _, token = headers.get("authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), AGENT_TOKEN.encode())
+
+
+# escalations are only queued when an agent could take them -- with HANDOFF_ENABLED but no credential the
+# queue would fill up with customers nobody can ever answer, so the bot keeps the conversation instead
+def handoff_available() -> bool:
+    return HANDOFF_ENABLED and (bool(AGENT_TOKEN) or AGENT_ENDPOINT_OPEN)
+
+
+QUEUED_NOTICE = "You're in line for a support agent -- they'll see your messages as soon as they join."
+
+
+# the HTTP side of the agent credential, as a route dependency
+def require_agent(request: Request) -> None:
+    if not agent_authorized(request.headers):
+        raise HTTPException(status_code=401, detail="agent credential required",
+                            headers={"WWW-Authenticate": "Bearer"})
+
+
+def warm_knowledge() -> None:
+    chunks = load_chunks(KNOWLEDGE_FOLDER, workers=KNOWLEDGE_BUILD_WORKERS)
+    if SEARCH_MODE == "hybrid":
+        from models.hybrid_search import vector_index
+        vector_index(KNOWLEDGE_FOLDER, chunks, wait=True)
+
+
+def warm_db() -> None:
+    db.ping()
+    db.start()
+
+
+async def warm_llm() -> None:
+    await asyncio.to_thread(llm_router.get_client)
+    if WARMUP_LLM_CONNECT:
+        await llm_router.connect_client()
+
+
+async def warm_up() -> None:
+    async def timed(stage: str, step) -> None:
+        start = time.perf_counter()
+        try:
+            await step
+        except Exception:
+            # a cold resource is slower, not broken -- the first request builds it again
+            logger.warning("warm-up of %s failed", stage, exc_info=True)
+        metrics.STARTUP_SECONDS.set(time.perf_counter() - start, stage=stage)
+
+    # the index build and the sqlite calls run on threads, the LLM client connects on the loop
+    await asyncio.gather(
+        timed("knowledge", asyncio.to_thread(warm_knowledge)),
+        timed("db", asyncio.to_thread(warm_db)),
+        timed("llm", warm_llm()),
+    )
+
+
+# keeps the analytics rollups (db/rollups.py) current; safe on every worker, each chunk is folded once
+async def refresh_rollups() -> None:
+    while True:
+        try:
+            await asyncio.to_thread(rollups.refresh, max_chunks=ROLLUP_MAX_CHUNKS)
+        except Exception:
+            logger.warning("rollup refresh failed", exc_info=True)
+        await asyncio.sleep(ROLLUP_INTERVAL_S)
+
+
+# drops queued customers who left, also while no agent is taking sessions
+async def sweep_handoff() -> None:
+    while True:
+        await asyncio.sleep(max(1.0, HANDOFF_ABANDON_S / 4))
+        handoff.sweep()
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARMUP:
+        await warm_up()
+    refresher = asyncio.create_task(refresh_rollups()) if ROLLUP_INTERVAL_S > 0 else None
+    if HANDOFF_ENABLED and not handoff_available():
+        logger.warning("HANDOFF_ENABLED but no AGENT_TOKEN set: escalations stay with the bot")
+    sweeper = asyncio.create_task(sweep_handoff()) if handoff_available() else None
+    if diagnostics.DIAGNOSTICS_ENABLED:
+        diagnostics.loop_monitor.start()
+    yield
+    for task in (refresher, sweeper):
+        if task is not None:
+            # let it unwind before the writer closes under it
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    diagnostics.loop_monitor.stop()
+    # commit whatever is still queued before the worker exits
+    db.close()
+    await llm_router.order_service.close()
+    await llm_router.close_client()
+
+app = FastAPI(lifespan=lifespan)
 
 
 html = """
@@ -52,34 +197,480 @@ html = """
 async def get():
     return HTMLResponse(html)
 
-# set up storage once
-db = SqliteChatRepo()
+# p50/p95/p99 per stage for spans recorded by this worker (empty unless TRACING_ENABLED=1)
+@app.get("/traces/stages")
+async def trace_stages():
+    return tracer.stage_percentiles()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+# on-demand captures as folded stacks, e.g. `curl '.../debug/profile?seconds=10' > out.folded` then
+# flamegraph.pl out.folded > out.svg. only with DIAGNOSTICS_ENABLED=1 -- keep /debug off the public ingress
+async def _capture(capture, seconds: float, *args) -> PlainTextResponse:
+    if not diagnostics.DIAGNOSTICS_ENABLED:
+        raise HTTPException(status_code=404, detail="diagnostics are disabled")
+    if not 0 < seconds <= diagnostics.MAX_CAPTURE_S:
+        raise HTTPException(status_code=400, detail=f"seconds must be in (0, {diagnostics.MAX_CAPTURE_S:g}]")
+    try:
+        return PlainTextResponse(await asyncio.to_thread(capture, seconds, *args))
+    except diagnostics.CaptureBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+# where every thread spent the window, sampled every interval_ms
+@app.get("/debug/profile")
+async def debug_profile(seconds: float = 5.0, interval_ms: float = 5.0):
+    return await _capture(diagnostics.sample_profile, seconds, max(interval_ms, 1.0) / 1000)
+
+# bytes allocated during the window and still held at the end, by allocating stack
+@app.get("/debug/allocations")
+async def debug_allocations(seconds: float = 5.0):
+    return await _capture(diagnostics.allocation_diff, seconds)
+
+# the HTTP batch endpoint's cap, below the runner's own -- it spends provider tokens for whoever holds
+# the agent credential, next to live chat traffic on the same worker
+BATCH_MAX_CONCURRENCY = min(int(os.getenv("BATCH_MAX_CONCURRENCY", "32")), MAX_CONCURRENCY)
+
+
+# a whole number of conversations in flight, at least 1 and capped at BATCH_MAX_CONCURRENCY
+def batch_concurrency(value) -> int:
+    try:
+        if isinstance(value, (bool, float)):
+            raise ValueError(value)
+        concurrency = int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="concurrency must be a whole number") from None
+    if concurrency < 1:
+        raise HTTPException(status_code=400, detail="concurrency must be at least 1")
+    return min(concurrency, BATCH_MAX_CONCURRENCY)
+
+
+# bulk/offline processing for support staff (agent credential) -- body is either {"conversations": [...]} or one conversation per line
+# (application/x-ndjson). results stream back as NDJSON in completion order, then a summary line
+@app.post("/v1/chat/batch", dependencies=[Depends(require_agent)])
+async def chat_batch(request: Request, concurrency: int = DEFAULT_CONCURRENCY):
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        conversations = parse_jsonl(body.decode("utf-8").splitlines())
+    else:
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="body must be JSON or NDJSON")
+        if not isinstance(payload, dict) or not isinstance(payload.get("conversations"), list):
+            raise HTTPException(status_code=400, detail='expected {"conversations": [...]}')
+        concurrency = payload.get("concurrency", concurrency)
+        conversations = (parse_conversation(c, i) for i, c in enumerate(payload["conversations"]))
+
+    concurrency = batch_concurrency(concurrency)
+
+    async def lines():
+        async for item in run_batch_with_summary(conversations, concurrency):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# full-text search over stored messages for support agents (SqliteChatRepo.search_messages), e.g.
+# /v1/messages/search?q="cracked screen"&since=2026-03-01 -- next_offset is null on the last page.
+# only sees messages the writer has committed. every customer's conversations, so agents only
+@app.get("/v1/messages/search", dependencies=[Depends(require_agent)])
+async def search_messages(q: str, since: Optional[str] = None, role: Optional[str] = None,
+                          limit: int = 20, offset: int = 0):
+    try:
+        page = await asyncio.to_thread(db.search_messages, q, since, limit, offset, role)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"query": q, "results": [asdict(hit) for hit in page.hits], "next_offset": page.next_offset}
+
+# dashboard aggregates from the rollup tables, e.g. /v1/analytics?since=2026-03-01&granularity=day --
+# intents per bucket, tool-call counts, slot-fill rate and average turns per session
+@app.get("/v1/analytics")
+async def analytics(since: Optional[str] = None, until: Optional[str] = None, granularity: str = "hour"):
+    try:
+        return await asyncio.to_thread(rollups.dashboard, since, until, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# one rolled-up metric as a time series, e.g. /v1/analytics/series?metric=tool_call&dimension=get_order
+@app.get("/v1/analytics/series")
+async def analytics_series(metric: str, since: Optional[str] = None, until: Optional[str] = None,
+                           granularity: str = "hour", dimension: Optional[str] = None):
+    try:
+        points = await asyncio.to_thread(rollups.series, metric, since, until, granularity, dimension)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"metric": metric, "granularity": granularity, "points": [asdict(p) for p in points]}
+
+# set up storage once -- writes go through a single background writer per worker
+db = ChatWriter(SqliteChatRepo())
+
+# analytics rollups over the same database, refreshed in the background (refresh_rollups)
+rollups = SqliteRollups()
+
+# client message ids already handled, so resent messages replay their stored reply (models/message_dedupe.py)
+dedupe = MessageDedupe(lambda session_id, message_id: db.get_client_message(session_id, message_id))
+
+# escalated sessions waiting for, or talking to, a support agent on /ws/agent (models/handoff.py)
+handoff = HandoffDesk()
+metrics.HANDOFF_QUEUE_DEPTH.set_callback(lambda: len(handoff.queue))
+metrics.HANDOFF_OLDEST_WAIT.set_callback(lambda: handoff.queue.oldest_wait())
+metrics.HANDOFF_AGENTS.set_callback(lambda: handoff.agents)
+
+# messages per history frame streamed to an agent that takes a session
+HANDOFF_HISTORY_PAGE = int(os.getenv("HANDOFF_HISTORY_PAGE", "50"))
+
+# SESSION_STORE=sqlite shares ChatState between workers so a session can reconnect to any of them
+sessions = create_session_store()
+
+# admission control -- past MAX_CONNECTIONS, up to MAX_WAITING sessions queue for a slot, the rest are refused
+limiter = ConnectionLimiter(
+    max_active=int(os.getenv("MAX_CONNECTIONS", "1000")),
+    max_waiting=int(os.getenv("MAX_WAITING", "0")),
+)
+metrics.WAITING_CONNECTIONS.set_callback(lambda: limiter.waiting)
+
+# sessions with no user message for this long are closed; dead peers are caught earlier by
+# uvicorn's protocol-level ping/pong (--ws-ping-interval / --ws-ping-timeout)
+IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "300"))
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE", "16"))
+SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
 
 @app.websocket("/ws")
 async def websocket_endpoint(socket: WebSocket):
-    await socket.accept()
+    admitted = limiter.try_acquire()
+    position = None if admitted else limiter.next_position()
+    if not admitted and position is None:
+        # refused before accept, the client sees a failed handshake right away
+        metrics.REJECTED_CONNECTIONS.inc()
+        await socket.close(code=1013, reason="server busy, try again later")
+        return
 
-    session_id = str(uuid.uuid4())
-    db.create_session(session_id)
-    db.add_event(session_id, "session_started", {"source": "websocket"})
+    try:
+        # resume an existing session (another worker may have served it before) or start a new one
+        session_id = socket.query_params.get("session_id") or socket.cookies.get("session_id")
+        state = await sessions.aload(session_id) if session_id else None
 
-    # first create a chat state on per connection basis
-    state = ChatState()
+        if state is None:
+            session_id = str(uuid.uuid4())
+            db.create_session(session_id)
+            db.add_event(session_id, "session_started", {"source": "websocket", "worker": os.getpid()})
 
-    state.user_data["session_id"] = session_id
+            # first create a chat state on per connection basis
+            state = ChatState()
+            state.user_data["session_id"] = session_id
+            await sessions.asave(session_id, state)
+            dedupe.open_session(session_id)
+        else:
+            db.add_event(session_id, "session_resumed", {"source": "websocket", "worker": os.getpid()})
 
-    try:
+        # handoff priority; the ingress sets this for signed-in customers and strips it from everyone else
+        tier = socket.headers.get("x-customer-tier")
+        if tier:
+            state.user_data["customer_tier"] = tier.strip().lower()
+
+        # framed protocol if the client offered one we speak, plain text otherwise (models/chat_frames.py)
+        framing = Framing(negotiate(socket.scope.get("subprotocols") or []))
+        metrics.WS_PROTOCOLS.inc(protocol=framing.protocol or "text")
+
+        # the cookie keeps the session (and sticky routing at the proxy) across reconnects
+        await socket.accept(subprotocol=framing.protocol,
+                            headers=[(b"set-cookie", f"session_id={session_id}; Path=/; SameSite=Lax".encode())])
+        hello = framing.hello(session_id)
+        if hello is not None:
+            await send_frame(socket, hello)
+
+        if not admitted:
+            await send_frame(socket, framing.notice(f"All agents are busy -- you're number {position} in line."))
+            try:
+                await asyncio.wait_for(limiter.wait_for_slot(), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                await socket.close(code=1013, reason="server busy, try again later")
+                return
+            admitted = True
+
+        await serve_session(socket, session_id, state, framing)
+    finally:
+        if admitted:
+            limiter.release()
+
+
+async def send_frame(socket: WebSocket, payload: Payload) -> None:
+    if isinstance(payload, bytes):
+        await socket.send_bytes(payload)
+    else:
+        await socket.send_text(payload)
+
+
+# the next text or binary frame, whichever the protocol uses
+async def receive_frame(socket: WebSocket) -> Payload:
+    message = await socket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    text = message.get("text")
+    return text if text is not None else message.get("bytes") or b""
+
+
+async def serve_session(socket: WebSocket, session_id: str, state: ChatState, framing: Optional[Framing] = None) -> None:
+    framing = framing or Framing()
+    # messages that arrive within this window are answered as one turn
+    debounce = float(os.getenv("INPUT_DEBOUNCE_MS", "150")) / 1000
+    outbox = BoundedSender(lambda payload: send_frame(socket, payload), max_pending=SEND_QUEUE_SIZE, send_timeout=SEND_TIMEOUT)
+
+    # spans of the last completed turn -- respond runs in the pipeline's own task, so they're handed
+    # over to deliver here instead of through the collector context
+    turn_spans: List[Span] = []
+    # client message ids submitted on this connection and not answered yet
+    in_flight: Set[str] = set()
+
+    async def respond(text: str) -> str:
+        typing = framing.typing(True)
+        if typing is not None:
+            outbox.send_nowait(typing)
+        # a newer message can cancel this turn at any await, so undo its state changes if that happens
+        snapshot = state.to_dict()
+        intent = state.current_intent
+        try:
+            reply = await get_response(text, state)
+        except asyncio.CancelledError:
+            state.restore(snapshot)
+            raise
+        if state.current_intent == Intent.ESCALATE_TO_HUMAN and handoff_available() and not handoff.active(session_id):
+            # queued by what the customer needed help with before asking for a person
+            ticket = handoff.escalate(session_id, (intent or Intent.ESCALATE_TO_HUMAN).value,
+                                      state.user_data.get("customer_tier", DEFAULT_TIER))
+            db.add_event(session_id, "handoff_queued", {"intent": ticket.intent, "tier": ticket.tier})
+        return reply
+
+    async def deliver(text: str, response: str) -> None:
+        # every span finished during the turn is stored as a chat_events row (with tracing off, just the
+        # turn, get_intent and tool_call summaries the analytics rollups need)
+        with tracer.collect() as spans:
+            ids = pipeline.message_ids
+            with tracer.span("db_write", table="chat_messages"):
+                db.add_message(session_id, "assistant", response, reply_to=ids or None)
+            dedupe.replied(session_id, ids, response)
+            in_flight.difference_update(ids)
+
+            outbox.send_nowait(framing.reply(response, ids))
+
+        await sessions.asave(session_id, state)
+        metrics.TURNS.inc()
+        spans[:0] = turn_spans
+        turn_spans.clear()
+        db.add_events(session_id, [(s.event_type, s.to_event()) for s in spans])
+
+    def coalesced(count: int) -> None:
+        metrics.TURNS_COALESCED.inc()
+        db.add_event(session_id, "turn_coalesced", {"messages": count})
+
+    def cancelled(text: str) -> None:
+        metrics.TURNS_CANCELLED.inc()
+        db.add_event(session_id, "turn_cancelled", {"chars": len(text)})
+
+    # the agent's side of a handoff reaches this customer through the same outbox
+    def agent_reply(text: str) -> None:
+        outbox.send_nowait(framing.reply(text, []))
+
+    handoff.attach_customer(session_id, agent_reply, lambda text: outbox.send_nowait(framing.notice(text)))
+
+    pipeline = InputPipeline(traced_turn(respond, session_id, turn_spans, state), deliver, debounce=debounce,
+                             on_coalesced=coalesced, on_cancelled=cancelled)
+
+    # everything done with a frame once it has arrived -- the wait for it is the user typing, not server time
+    async def handle_frame(data: Payload) -> None:
+        try:
+            frame = framing.decode(data)
+        except FrameError as e:
+            metrics.WS_FRAME_ERRORS.inc(protocol=framing.protocol)
+            outbox.send_nowait(framing.error("bad_frame", str(e)))
+            return
+        if frame.type == "ping":
+            outbox.send_nowait(framing.pong())
+            return
+        if frame.type != "message":
+            return
+
+        message_id = frame.message_id
+        status = NEW
+        if message_id:
+            # a resend (reconnect, flaky network): answer it without running the turn again
+            if message_id in in_flight:
+                metrics.DUPLICATE_MESSAGES.inc(outcome="in_flight")
+                return
+            status, reply = await dedupe.check(session_id, message_id)
+            if status == REPLIED:
+                metrics.DUPLICATE_MESSAGES.inc(outcome="replayed")
+                outbox.send_nowait(framing.reply(reply, [message_id], replay=True))
+                return
+            if status == SEEN:
+                # stored before, but the connection went away before the reply
+                metrics.DUPLICATE_MESSAGES.inc(outcome="resumed")
+            in_flight.add(message_id)
+
+        # every message is stored as sent, even if it ends up merged into a bigger turn
+        if status == NEW:
+            with tracer.span("db_write", table="chat_messages"):
+                db.add_message(session_id, "user", frame.text, client_message_id=message_id)
+            if message_id:
+                dedupe.seen(session_id, message_id)
+
+        if handoff.active(session_id):
+            # a person has (or is about to take) this conversation -- no turn, no LLM call
+            in_flight.discard(message_id)
+            if status == NEW and not handoff.from_customer(session_id, frame.text) and handoff.waiting(session_id):
+                # nobody has it yet -- don't leave the customer talking into silence
+                outbox.send_nowait(framing.notice(QUEUED_NOTICE))
+            return
+
+        await pipeline.submit(frame.text, message_id)
+
+    async def receive() -> None:
         while True:
-            data = await socket.receive_text()
-            db.add_message(session_id, "user", data)
+            try:
+                data = await asyncio.wait_for(receive_frame(socket), IDLE_TIMEOUT)
+            except asyncio.TimeoutError:
+                if handoff.active(session_id):
+                    # waiting quietly for an agent isn't idling
+                    continue
+                raise IdleTimeoutError() from None
+            with tracer.span("ws_receive"):
+                await handle_frame(data)
+
+    metrics.ACTIVE_CONNECTIONS.inc()
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(pipeline.run()), asyncio.create_task(outbox.run())]
+    reason = "disconnect"
+    try:
+        # the receiver ends on disconnect or idle timeout, the worker if a turn raised, the sender on a slow client
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
+    except WebSocketDisconnect:
+        pass
+    except IdleTimeoutError:
+        reason = "idle_timeout"
+        metrics.IDLE_CLOSED_CONNECTIONS.inc()
+        await socket.close(code=1001, reason="idle timeout")
+    except SlowConsumerError as e:
+        reason = "slow_consumer"
+        metrics.SLOW_CONSUMER_CLOSED_CONNECTIONS.inc()
+        await socket.close(code=1008, reason=str(e)[:120])
+    finally:
+        # cancelled tasks unwind on their own, nothing below waits for them
+        for task in tasks:
+            task.cancel()
+        handoff.detach_customer(session_id, agent_reply)
+        db.add_event(session_id, "session_closed", {"reason": reason})
+        tracer.flush()
+        metrics.ACTIVE_CONNECTIONS.dec()
+
+
+# what an agent sees when they take a session, including what the writer hasn't committed yet
+def session_history(session_id: str) -> List[ChatMessageRow]:
+    db.flush()
+    return db.get_messages(session_id)
 
-            response = await get_response(data, state)
-            db.add_message(session_id, "assistant", response)
 
-            await socket.send_text(response)
+# support agents: take the next escalated session, talk to the customer, hand the session back.
+# JSON text frames -- {"type": "take"}, {"type": "message", "session_id", "text"},
+# {"type": "release", "session_id"}, {"type": "queue"}; see README "Human handoff"
+@app.websocket("/ws/agent")
+async def agent_endpoint(socket: WebSocket):
+    if not agent_authorized(socket.headers):
+        await socket.close(code=1008, reason="agent credential required")
+        return
+    agent_id = socket.query_params.get("agent_id") or f"agent-{uuid.uuid4().hex[:8]}"
+    if handoff.has_agent(agent_id):
+        await socket.close(code=1008, reason="agent already connected")
+        return
+
+    await socket.accept()
+    # history pages wait for room (outbox.send), everything else is queued like chat replies
+    outbox = BoundedSender(socket.send_text, max_pending=SEND_QUEUE_SIZE, send_timeout=SEND_TIMEOUT)
+
+    def send(frame: dict) -> None:
+        outbox.send_nowait(json.dumps(frame))
+
+    handoff.connect_agent(agent_id, send)
+    send({"type": "hello", "agent_id": agent_id})
+    send(handoff.stats())
+
+    async def take() -> None:
+        ticket = handoff.take(agent_id)
+        if ticket is None:
+            send(handoff.stats())
+            return
+        assigned = ticket.to_frame(handoff.queue.clock())
+        db.add_event(ticket.session_id, "handoff_assigned", {"agent_id": agent_id, "waited_s": assigned["waited_s"]})
+        send({"type": "assigned", **assigned})
+
+        rows = await asyncio.to_thread(session_history, ticket.session_id)
+        for start in range(0, max(len(rows), 1), HANDOFF_HISTORY_PAGE):
+            page = rows[start:start + HANDOFF_HISTORY_PAGE]
+            await outbox.send(json.dumps({
+                "type": "history", "session_id": ticket.session_id,
+                "messages": [{"role": r.role, "content": r.content, "created_at": r.created_at} for r in page],
+                "done": start + HANDOFF_HISTORY_PAGE >= len(rows),
+            }))
+
+    async def receive() -> None:
+        while True:
+            try:
+                frame = json.loads(await socket.receive_text())
+                kind = frame.get("type") if isinstance(frame, dict) else None
+                session_id = str(frame.get("session_id") or "") if kind else ""
+                if kind == "take":
+                    await take()
+                elif kind == "message" and isinstance(frame.get("text"), str):
+                    delivered = handoff.to_customer(agent_id, session_id, frame["text"])
+                    db.add_message(session_id, "agent", frame["text"])
+                    send({"type": "sent", "session_id": session_id, "delivered": delivered})
+                elif kind == "release":
+                    handoff.release(agent_id, session_id)
+                    db.add_event(session_id, "handoff_released", {"agent_id": agent_id})
+                    send({"type": "released", "session_id": session_id})
+                elif kind == "queue":
+                    send(handoff.stats())
+                else:
+                    send({"type": "error", "code": "bad_frame", "detail": "unknown or incomplete frame"})
+            except ValueError:
+                send({"type": "error", "code": "bad_frame", "detail": "frames are JSON objects"})
+            except HandoffError as e:
+                send({"type": "error", "code": "not_assigned", "detail": str(e)})
+
+    tasks = [asyncio.create_task(receive()), asyncio.create_task(outbox.run())]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            task.result()
     except WebSocketDisconnect:
-        db.add_event(session_id, "session_closed", {})
         pass
+    except SlowConsumerError as e:
+        await socket.close(code=1008, reason=str(e)[:120])
+    finally:
+        for task in tasks:
+            task.cancel()
+        # whatever the agent still held goes back in line at its old place
+        for session_id in handoff.disconnect_agent(agent_id):
+            db.add_event(session_id, "handoff_requeued", {"agent_id": agent_id})
+
+
+def traced_turn(respond, session_id: str, sink: List[Span], state: Optional[ChatState] = None):
+    async def turn(text: str) -> str:
+        with tracer.collect() as spans:
+            with tracer.span("turn", session_id=session_id) as span:
+                pending = state.pending_data if state else None
+                reply = await respond(text)
+                # slot-fill rate for the analytics rollups: a slot asked for, and a slot answered
+                # without being asked for again
+                if state and state.pending_data:
+                    span.set("slot_requested", state.pending_data)
+                if pending and (not state or state.pending_data != pending):
+                    span.set("slot_filled", pending)
+        # only reached when the turn wasn't cancelled
+        sink[:] = spans
+        return reply
+    return turn
 
 # should be asyncronous as eventually reponse will be attained from llm call -- time intensive
 async def get_response(message: str, state: ChatState) -> str:
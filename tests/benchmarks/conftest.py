@@ -0,0 +1,69 @@
+# micro-benchmarks for the hot paths, skipped in the normal test run
+#
+#   pytest tests/benchmarks --benchmark-only --benchmark-autosave
+#   pytest tests/benchmarks --benchmark-only --benchmark-compare --benchmark-compare-fail=mean:15%
+
+import os
+import random
+
+import pytest
+
+try:
+    import pytest_benchmark  # noqa: F401
+except ImportError:
+    collect_ignore_glob = ["bench_*.py", "test_*.py"]
+
+# the OpenAI client needs a key once it is built; no request is ever sent from the benchmarks
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+WORDS = (
+    "order return refund warranty shipping blender coffee maker toaster repair policy days "
+    "receipt carrier tracking support hours contact replacement defective packaging label "
+    "customer product motor blade jar filter heating element cord plug manual model serial"
+).split()
+
+SECTIONS_PER_FILE = 100
+
+
+def synthetic_section(rng: random.Random, words: int = 80) -> str:
+    sentences = []
+    for _ in range(words // 10):
+        sentences.append(" ".join(rng.choice(WORDS) for _ in range(10)).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def synthetic_markdown(rng: random.Random, title: str, sections: int) -> str:
+    parts = [f"# {title}", ""]
+    for i in range(sections):
+        parts += [f"## {rng.choice(WORDS).title()} {i}", synthetic_section(rng), ""]
+    return "\n".join(parts)
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("benchmark_only", default=False):
+        return
+    skip = pytest.mark.skip(reason="benchmarks only run with --benchmark-only")
+    for item in items:
+        if "benchmarks" in item.nodeid.split("/"):
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def corpus(tmp_path_factory):
+    # size (number of ## chunks) -> folder of synthetic markdown files, built once per session
+    built = {}
+
+    def build(size: int) -> str:
+        if size not in built:
+            rng = random.Random(size)
+            folder = tmp_path_factory.mktemp(f"corpus_{size}")
+            remaining, n = size, 0
+            while remaining > 0:
+                sections = min(SECTIONS_PER_FILE, remaining)
+                (folder / f"doc_{n}.md").write_text(synthetic_markdown(rng, f"Doc {n}", sections), encoding="utf-8")
+                remaining -= sections
+                n += 1
+            built[size] = str(folder)
+        return built[size]
+
+    return build
@@ -0,0 +1,85 @@
+import itertools
+
+import pytest
+
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+
+
+@pytest.fixture
+def repo(tmp_path):
+    db_path = str(tmp_path / "bench.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    return repo
+
+
+def test_bench_create_session(benchmark, repo):
+    ids = (f"s-{i}" for i in itertools.count())
+    benchmark(lambda: repo.create_session(next(ids)))
+
+
+def test_bench_add_message(benchmark, repo):
+    benchmark(repo.add_message, "s1", "user", "where is my order 124?")
+
+
+def test_bench_add_event(benchmark, repo):
+    benchmark(repo.add_event, "s1", "intent_detected", {"intent": "get_order_information", "duration_ms": 412.0})
+
+
+def test_bench_add_events(benchmark, repo):
+    events = [("span", {"span": f"stage_{i}", "duration_ms": float(i)}) for i in range(10)]
+    benchmark(repo.add_events, "s1", events)
+
+
+def test_bench_get_messages(benchmark, repo):
+    for i in range(100):
+        repo.add_message("s1", "user" if i % 2 == 0 else "assistant", f"message {i}")
+    msgs = benchmark(repo.get_messages, "s1")
+    assert len(msgs) == 100
+
+
+def test_bench_get_events(benchmark, repo):
+    repo.add_events("s1", [("span", {"span": "turn", "duration_ms": 1.0})] * 100)
+    events = benchmark(repo.get_events, "s1")
+    assert len(events) == 100
+
+
+def test_bench_search_messages(benchmark, repo):
+    words = ["order", "refund", "blender", "screen", "cracked", "shipping", "late", "jar", "warranty", "box"]
+    repo.write_batch([
+        ("add_message", ("s1", "user", " ".join(words[(i * k) % len(words)] for k in range(1, 9))))
+        for i in range(5000)
+    ])
+    page = benchmark(repo.search_messages, "cracked screen", limit=20)
+    assert len(page.hits) == 20
+
+
+def test_bench_rollup_refresh(benchmark, repo):
+    from db.rollups import SqliteRollups
+
+    rollups = SqliteRollups(repo.db_path)
+    rollups.refresh()
+    turn = [("intent_detected", {"intent": "greeting", "duration_ms": 40.0}), ("span", {"span": "turn", "duration_ms": 90.0})]
+
+    def refresh():
+        repo.add_events("s1", turn * 50)
+        return rollups.refresh()
+
+    assert benchmark(refresh) == 100
+
+
+def test_bench_rollup_dashboard(benchmark, repo):
+    from db.rollups import SqliteRollups
+
+    rollups = SqliteRollups(repo.db_path)
+    # a month of hourly buckets
+    repo.write_batch([
+        ("add_events", ("s1", [("intent_detected", {"intent": intent, "duration_ms": 40.0})],
+                        f"2026-03-{day:02d}T{hour:02d}:00:00+00:00"))
+        for day in range(1, 31) for hour in range(24) for intent in ("greeting", "refund_order")
+    ])
+    rollups.refresh()
+    dashboard = benchmark(rollups.dashboard, "2026-03-01", "2026-04-01")
+    assert len(dashboard["intents"]) == 30 * 24
@@ -0,0 +1,28 @@
+import itertools
+import random
+
+import pytest
+
+from models.handoff import HandoffQueue
+
+
+@pytest.fixture(params=[100, 10_000])
+def queue(request):
+    rng = random.Random(3)
+    queue = HandoffQueue(intent_credit={"refund_order": 120}, tier_credit={"vip": 600})
+    for i in range(request.param):
+        queue.push(f"s{i}", rng.choice(["unknown", "refund_order"]), rng.choice(["standard", "vip"]))
+    return queue
+
+
+# one escalation plus one take at a steady queue depth
+def test_bench_handoff_push_pop(benchmark, queue):
+    ids = (f"new-{i}" for i in itertools.count())
+    depth = len(queue)
+
+    def push_pop():
+        queue.push(next(ids), "refund_order", "vip")
+        queue.remove(queue.pop("agent").session_id)
+
+    benchmark(push_pop)
+    assert len(queue) == depth
@@ -0,0 +1,64 @@
+import os
+import random
+
+import pytest
+
+from models.index_builder import build_index
+from models.knowledge_search import best_passage, chunk_file, knowledge_search, load_chunks, score_query, tokenize
+
+from conftest import synthetic_markdown
+
+QUERY = "How long is the warranty on a defective blender motor?"
+CORPUS_SIZES = [10, 1_000, 100_000]
+
+
+def test_bench_tokenize(benchmark):
+    benchmark(tokenize, QUERY)
+
+
+def test_bench_chunk_file(benchmark):
+    content = synthetic_markdown(random.Random(1), "Manual", 100)
+    chunks = benchmark(chunk_file, "manual.md", content)
+    # sections longer than the chunk size are split, so at least one chunk per section
+    assert len({c.section for c in chunks}) == 100
+
+
+def test_bench_score_query(benchmark):
+    chunk = chunk_file("manual.md", synthetic_markdown(random.Random(2), "Manual", 1))[0]
+    terms = tokenize(QUERY)
+    benchmark(score_query, terms, chunk)
+
+
+def test_bench_best_passage(benchmark):
+    section = " ".join(synthetic_markdown(random.Random(3), "Manual", 1).split("\n")[3] for _ in range(4))
+    chunk = chunk_file("manual.md", "## Long\n" + section)[0]
+    benchmark(best_passage, chunk, tokenize(QUERY), 300)
+
+
+@pytest.mark.parametrize("size", CORPUS_SIZES)
+def test_bench_knowledge_search(benchmark, corpus, size):
+    folder = corpus(size)
+    assert len({(c.filename, c.section) for c in load_chunks(folder)}) == size  # warm the index so only the query path is measured
+
+    rounds = 3 if size >= 100_000 else 20
+    res = benchmark.pedantic(knowledge_search, args=(QUERY, 3, folder), rounds=rounds, iterations=1)
+    assert res["matches"]
+
+
+@pytest.mark.parametrize("workers", [1, os.cpu_count() or 1], ids=["serial", "all_cores"])
+def test_bench_index_build(benchmark, corpus, workers):
+    folder = corpus(10_000)
+    chunks, report = benchmark.pedantic(build_index, args=(folder,), kwargs={"workers": workers}, rounds=3, iterations=1)
+    assert report.files and len(chunks) >= 10_000
+
+
+@pytest.mark.parametrize("size", CORPUS_SIZES)
+def test_bench_knowledge_search_hybrid(benchmark, corpus, size):
+    from models.hybrid_search import vector_index
+
+    folder = corpus(size)
+    vector_index(folder, load_chunks(folder), wait=True)
+
+    rounds = 3 if size >= 100_000 else 20
+    res = benchmark.pedantic(knowledge_search, args=(QUERY, 3, folder), kwargs={"mode": "hybrid"}, rounds=rounds, iterations=1)
+    assert res["matches"]
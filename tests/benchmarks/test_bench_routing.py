@@ -0,0 +1,50 @@
+import json
+
+from llm_router import GENERATE_ARGS, build_route_state_summary, parse_route_args
+from models.chat_state import ChatState
+from models.intent import Intent
+from models.intent_classifier import IntentClassifier
+
+ROUTE_ARGS = json.dumps({
+    "intent": Intent.GET_ORDER_INFORMATION.value,
+    "confidence": 0.92,
+    "next_action": "call_tool",
+    "slot_to_request": None,
+    "tool_name": "get_order",
+    "tool_args": {"order_id": "124"},
+})
+
+
+def test_bench_intent_classifier(benchmark):
+    result = benchmark(IntentClassifier.classify, "Hey, can I get a human to look at my refund?")
+    assert result == Intent.REFUND_ORDER
+
+
+def test_bench_build_route_state_summary(benchmark):
+    state = ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id",
+                      user_data={"session_id": "s1", "order_id": "124"})
+    benchmark(build_route_state_summary, state)
+
+
+def test_bench_parse_route_args(benchmark):
+    result = benchmark(parse_route_args, ROUTE_ARGS)
+    assert result.tool_args == {"order_id": "124"}
+
+
+def test_bench_parse_route_args_with_repairs(benchmark):
+    arguments = '```json\n{"intent": "Get Order Information", "confidence": "0.92", "next_action": "CALL_TOOL"}\n``` done'
+    result = benchmark(parse_route_args, arguments)
+    assert result.intent == Intent.GET_ORDER_INFORMATION
+
+
+# the validator generate_result runs on every tool call: decode plus the schema checks
+def test_bench_parse_generate_tool_args(benchmark):
+    args, repairs = benchmark(GENERATE_ARGS["knowledge_search"].parse, '{"query": "return policy", "top_k": 3}')
+    assert args["top_k"] == 3 and not repairs
+
+
+# the repairs that spare a second LLM call: fenced JSON, an out-of-range top_k sent as a string, an unknown field
+def test_bench_parse_generate_tool_args_with_repairs(benchmark):
+    arguments = '```json\n{"query": "return policy", "top_k": "50", "extra": true}\n```'
+    args, repairs = benchmark(GENERATE_ARGS["knowledge_search"].parse, arguments)
+    assert args["query"] == "return policy" and repairs
@@ -0,0 +1,11 @@
+import pytest
+
+from loadtest.startup import STAGES, measure
+
+
+# each round is a fresh interpreter: import server, run the lifespan, answer one websocket message
+@pytest.mark.parametrize("warmup", [True, False], ids=["warmup", "lazy"])
+def test_bench_cold_start(benchmark, warmup):
+    timings = benchmark.pedantic(measure, args=(warmup,), rounds=5, iterations=1)
+    benchmark.extra_info.update({stage: round(timings[stage] * 1000, 1) for stage in STAGES})
+    assert timings["first_response"] > 0
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+import llm_router
+import server
+from models import batch_runner
+from models.circuit_breaker import CircuitBreaker
+from models.batch_runner import parse_jsonl, run_batch, run_batch_with_summary
+from models.intent import Intent
+
+
+def _fake_handler(in_flight, peak):
+    async def handle(message, state):
+        in_flight.append(message)
+        peak[0] = max(peak[0], len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(message)
+        if message == "boom":
+            raise RuntimeError("llm down")
+        state.current_intent = Intent.GREETING
+        return f"echo {message}"
+    return handle
+
+
+def test_parse_jsonl_accepts_shapes_and_flags_bad_lines():
+    convs = list(parse_jsonl([
+        '{"id": "a", "messages": ["hi", "124"]}',
+        '{"text": "hello"}',
+        '["one", "two"]',
+        "",
+        "not json",
+        '{"id": "b", "messages": [1]}',
+    ]))
+    assert [c.id for c in convs] == ["a", "1", "2", "3", "b"]
+    assert convs[0].messages == ["hi", "124"]
+    assert convs[1].messages == ["hello"]
+    assert convs[2].messages == ["one", "two"]
+    assert convs[3].error.startswith("invalid json")
+    assert convs[4].error
+
+
+@pytest.mark.asyncio
+async def test_run_batch_bounds_concurrency_and_isolates_failures(monkeypatch):
+    in_flight, peak = [], [0]
+    monkeypatch.setattr(batch_runner.ChatManager, "handle_client_input", _fake_handler(in_flight, peak))
+
+    lines = [json.dumps({"id": str(i), "messages": [f"m{i}"]}) for i in range(20)]
+    lines.append(json.dumps({"id": "bad", "messages": ["boom"]}))
+    results = [r async for r in run_batch(parse_jsonl(lines), concurrency=4)]
+
+    assert len(results) == 21
+    assert peak[0] <= 4
+    by_id = {r["id"]: r for r in results}
+    assert by_id["3"]["turns"] == [{"user": "m3", "assistant": "echo m3", "intent": "greeting", "pending_data": None}]
+    assert "RuntimeError" in by_id["bad"]["error"]
+
+
+@pytest.mark.asyncio
+async def test_summary_is_last(monkeypatch):
+    monkeypatch.setattr(batch_runner.ChatManager, "handle_client_input", _fake_handler([], [0]))
+    items = [r async for r in run_batch_with_summary(parse_jsonl(['["hi"]', "nope"]), concurrency=2)]
+    assert items[-1]["type"] == "summary"
+    assert items[-1]["conversations"] == 2
+    assert items[-1]["failed"] == 1
+
+
+@pytest.fixture
+def agent_client(monkeypatch):
+    monkeypatch.setattr(server, "AGENT_TOKEN", "secret")
+    client = TestClient(server.app)
+    client.headers["authorization"] = "Bearer secret"
+    return client
+
+
+def test_batch_endpoint_needs_the_agent_credential(monkeypatch):
+    monkeypatch.setattr(batch_runner.ChatManager, "handle_client_input", _fake_handler([], [0]))
+    monkeypatch.setattr(server, "AGENT_TOKEN", "secret")
+    client = TestClient(server.app)
+    body = {"conversations": [["hi"]]}
+    assert client.post("/v1/chat/batch", json=body).status_code == 401
+    assert client.post("/v1/chat/batch", json=body, headers={"authorization": "Bearer nope"}).status_code == 401
+    monkeypatch.setattr(server, "AGENT_TOKEN", "")
+    assert client.post("/v1/chat/batch", json=body, headers={"authorization": "Bearer "}).status_code == 401
+
+
+def test_batch_endpoint_streams_ndjson(monkeypatch, agent_client):
+    monkeypatch.setattr(batch_runner.ChatManager, "handle_client_input", _fake_handler([], [0]))
+    client = agent_client
+
+    res = client.post("/v1/chat/batch", json={"conversations": [{"id": "x", "messages": ["hi"]}, ["yo"]]})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    items = [json.loads(line) for line in res.text.splitlines()]
+    assert {i["id"] for i in items[:-1]} == {"x", "1"}
+    assert items[-1]["conversations"] == 2
+
+    res = client.post("/v1/chat/batch?concurrency=2", content='{"id": "n", "text": "hey"}\n',
+                      headers={"content-type": "application/x-ndjson"})
+    assert json.loads(res.text.splitlines()[0])["turns"][0]["assistant"] == "echo hey"
+
+    assert client.post("/v1/chat/batch", json={"nope": 1}).status_code == 400
+
+
+def test_batch_endpoint_rejects_bad_concurrency(monkeypatch, agent_client):
+    monkeypatch.setattr(batch_runner.ChatManager, "handle_client_input", _fake_handler([], [0]))
+    client = agent_client
+    conversations = [{"id": "x", "messages": ["hi"]}]
+
+    for concurrency in ("lots", None, 2.5, True, 0, -3, [4]):
+        res = client.post("/v1/chat/batch", json={"concurrency": concurrency, "conversations": conversations})
+        assert res.status_code == 400, concurrency
+    assert client.post("/v1/chat/batch?concurrency=0", content='{"id": "n", "text": "hey"}\n',
+                       headers={"content-type": "application/x-ndjson"}).status_code == 400
+
+    # past the cap is clamped, not refused
+    seen = []
+    monkeypatch.setattr(server, "run_batch_with_summary", lambda convs, concurrency: seen.append(concurrency) or _empty())
+    res = client.post("/v1/chat/batch", json={"concurrency": "100000", "conversations": conversations})
+    assert res.status_code == 200 and seen == [server.BATCH_MAX_CONCURRENCY]
+    assert server.BATCH_MAX_CONCURRENCY < batch_runner.MAX_CONCURRENCY
+
+
+@pytest.mark.asyncio
+async def test_batch_failures_open_the_batch_breaker_not_the_live_one(monkeypatch):
+    import httpx
+    import openai
+
+    class Completions:
+        async def create(self, **kwargs):
+            raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+    client = type("client", (), {})()
+    client.chat = type("chat", (), {"completions": Completions()})()
+    monkeypatch.setattr(llm_router, "client", client)
+    monkeypatch.setattr(llm_router, "llm_breaker", CircuitBreaker(min_calls=2, error_rate=0.5, open_s=60))
+    monkeypatch.setattr(llm_router, "batch_breaker", CircuitBreaker(min_calls=2, error_rate=0.5, open_s=60, name="batch"))
+
+    # degraded replies, but only the batch breaker saw the failures
+    results = [r async for r in run_batch(parse_jsonl(['["hello", "hi there"]'] * 3), concurrency=3)]
+    assert all("error" not in r for r in results)
+    assert not llm_router.batch_breaker.is_closed
+    assert llm_router.llm_breaker.is_closed
+    assert llm_router.batch_calls.get() is False
+
+
+async def _empty():
+    return
+    yield
@@ -1,3 +1,5 @@
+import pytest
+
 from db.init_db import init_db
 from db.chat_db import SqliteChatRepo
 
@@ -18,4 +20,169 @@ def test_sqlite_repo_writes_and_reads(tmp_path):
     assert msgs[0].content == "hello"
     assert msgs[1].content == "hi"
 
-    
\ No newline at end of file
+    
+
+def test_sqlite_repo_add_events_batches_rows(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    repo.add_events("s1", [
+        ("intent_detected", {"span": "get_intent", "intent": "greeting", "duration_ms": 12.5}),
+        ("tool_called", {"span": "tool_call", "tool": "get_order", "duration_ms": 0.2}),
+    ])
+
+    events = repo.get_events("s1")
+    assert [e.event_type for e in events] == ["intent_detected", "tool_called"]
+    assert repo.get_events("s1", "tool_called")[0].payload["tool"] == "get_order"
+
+
+def test_chat_writer_batches_queued_writes(tmp_path):
+    from db.writer import ChatWriter
+
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+
+    writer = ChatWriter(SqliteChatRepo(db_path))
+    writer.create_session("s1")
+    for i in range(50):
+        writer.add_message("s1", "user", f"m{i}")
+    writer.add_events("s1", [("tool_called", {"tool": "get_order"})])
+    writer.flush()
+
+    assert len(writer.get_messages("s1")) == 50
+    assert writer.get_events("s1")[0].payload == {"tool": "get_order"}
+    writer.close()
+
+
+def test_chat_writer_isolates_failing_write(tmp_path):
+    from db.writer import ChatWriter
+    from monitoring.metrics import DB_WRITE_ERRORS
+
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    errors = DB_WRITE_ERRORS.value()
+
+    writer = ChatWriter(SqliteChatRepo(db_path))
+    writer.create_session("s1")
+    writer.add_message("s1", "user", None)  # violates NOT NULL
+    writer.add_message("s1", "user", "kept")
+    writer.close()
+
+    assert [m.content for m in SqliteChatRepo(db_path).get_messages("s1")] == ["kept"]
+    assert DB_WRITE_ERRORS.value() - errors == 1
+
+
+def test_search_messages_ranks_snippets_and_paginates(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    repo.create_session("s2")
+    repo.add_message("s1", "user", "my phone arrived with a cracked screen", "2026-03-01T10:00:00")
+    repo.add_message("s1", "assistant", "sorry about the screen, let's get it replaced", "2026-03-01T10:00:01")
+    repo.add_message("s2", "user", "cracked screen again, the screen cracks every time", "2026-03-08T09:00:00")
+    repo.add_message("s2", "user", "where is my order 124", "2026-03-08T09:01:00")
+
+    page = repo.search_messages("cracks screen")   # stemmed, matches cracked/cracks
+    assert [h.session_id for h in page.hits] == ["s2", "s1"]
+    assert "[cracked] [screen]" in page.hits[1].snippet
+    assert page.next_offset is None
+
+    assert [h.role for h in repo.search_messages("screen", role="assistant").hits] == ["assistant"]
+    assert [h.session_id for h in repo.search_messages("screen", since="2026-03-05").hits] == ["s2"]
+    assert repo.search_messages("screen", since="2027-01-01").hits == []
+
+    first = repo.search_messages("screen", limit=2)
+    second = repo.search_messages("screen", limit=2, offset=first.next_offset)
+    assert first.next_offset == 2 and second.next_offset is None
+    assert len({h.message_id for h in first.hits + second.hits}) == 3
+
+
+def test_search_query_is_never_an_fts_syntax_error(tmp_path):
+    from db.chat_db import fts_query
+
+    assert fts_query('refund AND "cracked  screen" NEAR( warr*') == '"refund" "AND" "cracked screen" "NEAR" "warr"*'
+
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    repo.add_message("s1", "user", "what does the warranty cover?")
+    assert len(repo.search_messages('warr* -"(').hits) == 1
+    with pytest.raises(ValueError):
+        repo.search_messages('"" ?!')
+
+
+def test_search_index_follows_updates_and_deletes(tmp_path):
+    import sqlite3
+
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    repo.add_message("s1", "user", "the lid is broken")
+
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE chat_messages SET content='the jar is broken'")
+    conn.commit()
+    assert repo.search_messages("lid").hits == []
+    assert len(repo.search_messages("jar").hits) == 1
+
+    conn.execute("DELETE FROM chat_messages")
+    conn.commit()
+    conn.close()
+    assert repo.search_messages("jar").hits == []
+
+
+def test_init_db_indexes_messages_stored_before_the_search_index(tmp_path):
+    import sqlite3
+
+    db_path = str(tmp_path / "old.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE chat_sessions (id TEXT PRIMARY KEY, created_at TEXT NOT NULL);
+        CREATE TABLE chat_messages (id TEXT PRIMARY KEY, session_id TEXT NOT NULL, role TEXT NOT NULL,
+                                    content TEXT NOT NULL, created_at TEXT NOT NULL);
+        INSERT INTO chat_sessions VALUES ('s1', '2026-01-01');
+        INSERT INTO chat_messages VALUES ('m1', 's1', 'user', 'my toaster is smoking', '2026-01-01');
+    """)
+    conn.close()
+
+    init_db(db_path)
+    assert [h.message_id for h in SqliteChatRepo(db_path).search_messages("toaster").hits] == ["m1"]
+
+
+def test_search_endpoint(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+    from db.writer import ChatWriter
+
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    writer = ChatWriter(SqliteChatRepo(db_path))
+    monkeypatch.setattr(server, "db", writer)
+    writer.create_session("s1")
+    writer.add_message("s1", "user", "the blender jar leaks")
+    writer.flush()
+
+    client = TestClient(server.app)
+    # agents only, and closed while no AGENT_TOKEN is configured
+    monkeypatch.setattr(server, "AGENT_TOKEN", "")
+    assert client.get("/v1/messages/search", params={"q": "jar"}).status_code == 401
+    monkeypatch.setattr(server, "AGENT_TOKEN", "secret")
+    assert client.get("/v1/messages/search", params={"q": "jar"}).status_code == 401
+    assert client.get("/v1/messages/search", params={"q": "jar"},
+                      headers={"authorization": "Bearer wrong"}).status_code == 401
+
+    client.headers["authorization"] = "Bearer secret"
+    res = client.get("/v1/messages/search", params={"q": "leaking jar", "limit": 5})
+    assert res.status_code == 200
+    body = res.json()
+    assert body["results"][0]["session_id"] == "s1"
+    assert "[jar]" in body["results"][0]["snippet"]
+    assert body["next_offset"] is None
+
+    assert client.get("/v1/messages/search", params={"q": "!!"}).status_code == 400
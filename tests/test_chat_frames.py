@@ -0,0 +1,147 @@
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.session_store import InMemorySessionStore
+from db.writer import ChatWriter
+from models.chat_frames import JSON_PROTOCOL, MSGPACK_PROTOCOL, FrameError, Framing, negotiate
+from models.message_dedupe import MessageDedupe
+
+
+def test_negotiate_picks_the_first_supported_offer():
+    assert negotiate(["chat.v2.cbor", MSGPACK_PROTOCOL, JSON_PROTOCOL]) == MSGPACK_PROTOCOL
+    assert negotiate([JSON_PROTOCOL, MSGPACK_PROTOCOL]) == JSON_PROTOCOL
+    assert negotiate(["graphql-ws"]) is None
+    assert negotiate([]) is None
+
+
+def test_versioned_framing_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    framing = Framing(MSGPACK_PROTOCOL)
+    frame = framing.decode(msgpack.packb({"v": 1, "type": "message", "id": "c-1", "text": "hi"}))
+    assert (frame.type, frame.text, frame.message_id) == ("message", "hi", "c-1")
+    assert msgpack.unpackb(framing.reply("hello", ["c-1"])) == {
+        "v": 1, "type": "reply", "reply_to": ["c-1"], "text": "hello", "replay": False,
+    }
+    assert framing.decode(msgpack.packb({"v": 1, "type": "ping"})).type == "ping"
+
+    for bad in (b"\xc1", msgpack.packb([1, 2]), msgpack.packb({"v": 2, "type": "message", "text": "hi"}),
+                msgpack.packb({"v": 1, "type": "shout"}), msgpack.packb({"v": 1, "type": "message"}), "text frame"):
+        with pytest.raises(FrameError):
+            framing.decode(bad)
+
+    assert json.loads(Framing(JSON_PROTOCOL).notice("wait"))["type"] == "notice"
+
+
+def test_plain_text_fallback():
+    framing = Framing()
+    assert framing.hello("s1") is None and framing.typing(True) is None
+    assert framing.decode("where is my order?").text == "where is my order?"
+    assert framing.reply("ok", []) == "ok"
+    # JSON message frames still switch the fallback to JSON replies
+    framing.decode('{"type": "message", "id": "c-1", "text": "hi"}')
+    assert json.loads(framing.reply("ok", ["c-1"]))["reply_to"] == ["c-1"]
+
+
+@pytest.fixture
+def chat_server(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+
+    async def fake_handle_client_input(text, state):
+        return f"answer to {text}"
+
+    monkeypatch.setattr(server.ChatManager, "handle_client_input", fake_handle_client_input)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+    monkeypatch.setattr(server, "sessions", InMemorySessionStore())
+    monkeypatch.setattr(server, "dedupe", MessageDedupe(lambda s, m: None))
+    monkeypatch.setenv("INPUT_DEBOUNCE_MS", "0")
+
+
+def test_msgpack_session(chat_server):
+    msgpack = pytest.importorskip("msgpack")
+    with TestClient(server.app).websocket_connect("/ws", subprotocols=[MSGPACK_PROTOCOL, JSON_PROTOCOL]) as ws:
+        assert ws.accepted_subprotocol == MSGPACK_PROTOCOL
+        hello = msgpack.unpackb(ws.receive_bytes())
+        assert hello["type"] == "hello" and hello["protocol"] == MSGPACK_PROTOCOL and hello["session_id"]
+
+        ws.send_bytes(msgpack.packb({"v": 1, "type": "ping"}))
+        assert msgpack.unpackb(ws.receive_bytes())["type"] == "pong"
+
+        ws.send_bytes(msgpack.packb({"v": 1, "type": "message", "id": "c-1", "text": "hi"}))
+        assert msgpack.unpackb(ws.receive_bytes()) == {"v": 1, "type": "typing", "active": True}
+        reply = msgpack.unpackb(ws.receive_bytes())
+        assert (reply["type"], reply["text"], reply["reply_to"]) == ("reply", "answer to hi", ["c-1"])
+
+        # a bad frame gets an error frame, the session carries on
+        ws.send_bytes(b"\xc1")
+        assert msgpack.unpackb(ws.receive_bytes())["type"] == "error"
+
+
+def test_json_session(chat_server):
+    with TestClient(server.app).websocket_connect("/ws", subprotocols=[JSON_PROTOCOL]) as ws:
+        assert ws.accepted_subprotocol == JSON_PROTOCOL
+        assert json.loads(ws.receive_text())["type"] == "hello"
+        ws.send_text(json.dumps({"v": 1, "type": "message", "id": "c-1", "text": "hi"}))
+        assert json.loads(ws.receive_text())["type"] == "typing"
+        assert json.loads(ws.receive_text())["text"] == "answer to hi"
+
+
+def test_ws_receive_span_skips_the_wait_for_the_frame(chat_server, monkeypatch):
+    from monitoring.tracing import tracer
+    monkeypatch.setattr(tracer, "enabled", True)
+    tracer.reset()
+    with TestClient(server.app).websocket_connect("/ws", subprotocols=[JSON_PROTOCOL]) as ws:
+        ws.receive_text()
+        # the user thinking before they type
+        time.sleep(0.3)
+        ws.send_text(json.dumps({"v": 1, "type": "ping"}))
+        assert json.loads(ws.receive_text())["type"] == "pong"
+
+    stage = tracer.stage_percentiles()["ws_receive"]
+    tracer.reset()
+    assert stage["count"] == 1 and stage["p99"] < 200
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_uvicorn_negotiates_permessage_deflate(chat_server):
+    uvicorn = pytest.importorskip("uvicorn")
+    websockets_client = pytest.importorskip("websockets.asyncio.client")
+
+    port = _free_port()
+    config = uvicorn.Config(server.app, port=port, log_level="warning", lifespan="off", ws="websockets-sansio")
+    live = uvicorn.Server(config)
+    thread = threading.Thread(target=live.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not live.started and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        async def talk():
+            async with websockets_client.connect(f"ws://127.0.0.1:{port}/ws", subprotocols=[JSON_PROTOCOL],
+                                                 compression="deflate") as ws:
+                extensions = ws.response.headers.get("Sec-WebSocket-Extensions", "")
+                hello = json.loads(await ws.recv())
+                return ws.subprotocol, extensions, hello
+
+        protocol, extensions, hello = asyncio.run(talk())
+        assert protocol == JSON_PROTOCOL
+        assert "permessage-deflate" in extensions
+        assert hello["type"] == "hello"
+    finally:
+        live.should_exit = True
+        thread.join(timeout=10)
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from models.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+async def ok(delay=0.0):
+    await asyncio.sleep(delay)
+    return "ok"
+
+
+async def boom():
+    raise RuntimeError("provider error")
+
+
+@pytest.mark.asyncio
+async def test_opens_on_error_rate_and_then_fails_fast():
+    breaker = CircuitBreaker(window=4, min_calls=4, error_rate=0.5, open_s=60)
+    for func in (ok, boom, ok, boom):
+        try:
+            await breaker.call(func)
+        except RuntimeError:
+            pass
+    assert breaker.state == OPEN
+
+    called = []
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(lambda: called.append(1) or ok())
+    assert called == []
+
+
+@pytest.mark.asyncio
+async def test_opens_on_latency_slo_breaches():
+    breaker = CircuitBreaker(slow_call_s=0.01, window=3, min_calls=3, slow_rate=0.6)
+    await breaker.call(lambda: ok(0.02))
+    await breaker.call(ok)
+    assert breaker.state == CLOSED
+    await breaker.call(lambda: ok(0.02))
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_timeout_bounds_the_call_and_counts_as_failure():
+    breaker = CircuitBreaker(call_timeout=0.01, min_calls=1, error_rate=1.0)
+    with pytest.raises(asyncio.TimeoutError):
+        await breaker.call(lambda: ok(1))
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_one_probe_through():
+    breaker = CircuitBreaker(min_calls=1, error_rate=1.0, open_s=0.01)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    await asyncio.sleep(0.02)
+
+    probe = asyncio.create_task(breaker.call(lambda: ok(0.02)))
+    await asyncio.sleep(0)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok)
+
+    assert await probe == "ok"
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_failed_probe_reopens():
+    breaker = CircuitBreaker(min_calls=1, error_rate=1.0, open_s=0.01)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    await asyncio.sleep(0.02)
+
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(ok)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_calls_are_not_counted():
+    breaker = CircuitBreaker(min_calls=1, error_rate=1.0)
+    task = asyncio.create_task(breaker.call(lambda: ok(1)))
+    await asyncio.sleep(0.01)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_calls_from_before_the_breaker_opened_dont_decide_the_probe():
+    breaker = CircuitBreaker(min_calls=1, error_rate=1.0, open_s=0.01)
+    release_stale = asyncio.Event()
+    fail_probe = asyncio.Event()
+
+    async def stale():
+        await release_stale.wait()
+        return "late"
+
+    async def wait_then_boom(event):
+        await event.wait()
+        raise RuntimeError("provider error")
+
+    # admitted while closed, still running when the breaker opens
+    late_success = asyncio.create_task(breaker.call(stale))
+    late_failure = asyncio.create_task(breaker.call(lambda: wait_then_boom(release_stale)))
+    await asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    assert breaker.state == OPEN
+    opened_at = breaker._opened_at
+
+    await asyncio.sleep(0.02)
+    probe = asyncio.create_task(breaker.call(lambda: wait_then_boom(fail_probe)))
+    await asyncio.sleep(0)
+    assert breaker.state == HALF_OPEN
+
+    # the stale calls finish first: neither closes nor re-opens the breaker
+    release_stale.set()
+    assert await late_success == "late"
+    with pytest.raises(RuntimeError):
+        await late_failure
+    assert breaker.state == HALF_OPEN and breaker._opened_at == opened_at
+
+    # the probe decides
+    fail_probe.set()
+    with pytest.raises(RuntimeError):
+        await probe
+    assert breaker.state == OPEN
+
+
+@pytest.mark.asyncio
+async def test_late_failures_dont_extend_the_open_window():
+    breaker = CircuitBreaker(min_calls=1, error_rate=1.0, open_s=60)
+    release = asyncio.Event()
+
+    async def wait_then_boom():
+        await release.wait()
+        raise RuntimeError("provider error")
+
+    late = asyncio.create_task(breaker.call(wait_then_boom))
+    await asyncio.sleep(0)
+    with pytest.raises(RuntimeError):
+        await breaker.call(boom)
+    opened_at = breaker._opened_at
+
+    release.set()
+    with pytest.raises(RuntimeError):
+        await late
+    assert breaker.state == OPEN and breaker._opened_at == opened_at
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.writer import ChatWriter
+from models.connection_manager import BoundedSender, ConnectionLimiter, SlowConsumerError
+
+
+@pytest.mark.asyncio
+async def test_limiter_hands_slots_to_waiters_in_order():
+    limiter = ConnectionLimiter(max_active=1, max_waiting=2)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.next_position() == 1
+
+    first = asyncio.create_task(limiter.wait_for_slot())
+    await asyncio.sleep(0)
+    second = asyncio.create_task(limiter.wait_for_slot())
+    await asyncio.sleep(0)
+    assert limiter.waiting == 2
+    assert limiter.next_position() is None
+
+    limiter.release()
+    await first
+    assert not second.done()
+    assert limiter.active == 1
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+    assert limiter.waiting == 0
+
+    limiter.release()
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_bounded_sender_rejects_when_buffer_full():
+    sent = []
+
+    async def send(text):
+        sent.append(text)
+
+    outbox = BoundedSender(send, max_pending=2)
+    outbox.send_nowait("a")
+    outbox.send_nowait("b")
+    with pytest.raises(SlowConsumerError):
+        outbox.send_nowait("c")
+
+    runner = asyncio.create_task(outbox.run())
+    await asyncio.sleep(0.01)
+    runner.cancel()
+    assert sent == ["a", "b"]
+
+
+@pytest.mark.asyncio
+async def test_bounded_sender_times_out_stalled_send():
+    async def stalled(text):
+        await asyncio.sleep(10)
+
+    outbox = BoundedSender(stalled, send_timeout=0.01)
+    outbox.send_nowait("hello")
+    with pytest.raises(SlowConsumerError):
+        await outbox.run()
+
+
+def test_server_refuses_handshake_when_full(monkeypatch):
+    monkeypatch.setattr(server, "limiter", ConnectionLimiter(max_active=0, max_waiting=0))
+
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with TestClient(server.app).websocket_connect("/ws"):
+            pass
+    assert exc.value.code == 1013
+
+
+def test_server_closes_idle_session(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+    monkeypatch.setattr(server, "IDLE_TIMEOUT", 0.05)
+
+    with TestClient(server.app).websocket_connect("/ws") as ws:
+        message = ws.receive()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1001
+
+    server.db.flush()
+    session_id = dict(ws.extra_headers)[b"set-cookie"].decode().split(";")[0].split("=", 1)[1]
+    closed = SqliteChatRepo(db_path).get_events(session_id, "session_closed")
+    assert closed[0].payload == {"reason": "idle_timeout"}
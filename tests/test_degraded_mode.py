@@ -0,0 +1,125 @@
+import httpx
+import openai
+import pytest
+
+import llm_router
+from models.chat_manager import ChatManager
+from models.chat_state import ChatState
+from models.circuit_breaker import CircuitBreaker
+from models.degraded_mode import ASK_ORDER_ID, CANNED, degraded_reply
+from models.intent import Intent
+from models.intent_classifier import IntentClassifier
+from monitoring.metrics import DEGRADED_TURNS
+
+
+class FailingCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        raise openai.APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+class FailingClient:
+    def __init__(self):
+        self.chat = type("chat", (), {})()
+        self.chat.completions = FailingCompletions()
+
+
+def test_classifier_matches_whole_words():
+    assert IntentClassifier.classify("what is this warranty about") == Intent.UNKNOWN
+    assert IntentClassifier.classify("hi there") == Intent.GREETING
+    assert IntentClassifier.classify("where is my order 124") == Intent.GET_ORDER_INFORMATION
+    assert IntentClassifier.classify("can I talk to an agent") == Intent.ESCALATE_TO_HUMAN
+
+
+@pytest.mark.asyncio
+async def test_order_lookup_asks_for_id_then_answers():
+    state = ChatState()
+
+    assert await degraded_reply("what's the status of my order?", state) == ASK_ORDER_ID
+    assert state.pending_data == "order_id"
+
+    reply = await degraded_reply("124", state)
+    assert reply.startswith("Order 124 is shipped")
+    assert state.pending_data is None
+
+
+@pytest.mark.asyncio
+async def test_slot_is_filled_from_the_first_coalesced_message():
+    state = ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id")
+
+    reply = await degraded_reply("124\nand when will it arrive?", state)
+    assert state.user_data["order_id"] == "124"
+    assert reply.startswith("Order 124 is shipped")
+
+
+@pytest.mark.asyncio
+async def test_refund_with_found_order_hands_off():
+    reply = await degraded_reply("I want a refund for order 555", ChatState())
+    assert "processing" in reply and "support agent will follow up" in reply
+
+
+@pytest.mark.asyncio
+async def test_unknown_questions_get_top_knowledge_snippet_or_canned_text():
+    before = DEGRADED_TURNS.value(intent="unknown")
+    reply = await degraded_reply("how long is the warranty", ChatState())
+    assert "warranty" in reply.lower()
+    assert DEGRADED_TURNS.value(intent="unknown") == before + 1
+
+    assert await degraded_reply("get me a human", ChatState()) == CANNED[Intent.ESCALATE_TO_HUMAN]
+
+
+@pytest.mark.asyncio
+async def test_chat_manager_falls_back_and_rolls_back_state(monkeypatch):
+    monkeypatch.setattr(llm_router, "client", FailingClient())
+    monkeypatch.setattr(llm_router, "llm_breaker", CircuitBreaker(min_calls=100))
+    state = ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id")
+
+    reply = await ChatManager.handle_client_input("124", state)
+
+    assert reply.startswith("Order 124 is shipped")
+    assert state.user_data["order_id"] == "124"
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_the_provider(monkeypatch):
+    client = FailingClient()
+    monkeypatch.setattr(llm_router, "client", client)
+    monkeypatch.setattr(llm_router, "llm_breaker", CircuitBreaker(min_calls=2, error_rate=0.5, open_s=60))
+
+    for _ in range(5):
+        assert await ChatManager.handle_client_input("hello", ChatState()) == CANNED[Intent.GREETING]
+    # two failures opened the breaker, the other turns never reached the client
+    assert client.chat.completions.calls == 2
+
+
+class BadRequestCompletions:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def create(self, **kwargs):
+        self.calls += 1
+        raise self.error
+
+
+@pytest.mark.asyncio
+async def test_bad_requests_and_bugs_are_not_provider_failures(monkeypatch):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    bad_request = openai.BadRequestError("invalid 'tools'", response=httpx.Response(400, request=request), body=None)
+    monkeypatch.setattr(llm_router, "llm_breaker", CircuitBreaker(min_calls=2, error_rate=0.5, open_s=60,
+                                                                  is_failure=llm_router.provider_failure))
+
+    for error in (bad_request, TypeError("unexpected keyword argument 'tool'")):
+        client = FailingClient()
+        client.chat.completions = BadRequestCompletions(error)
+        monkeypatch.setattr(llm_router, "client", client)
+        for _ in range(3):
+            with pytest.raises(type(error)):
+                await ChatManager.handle_client_input("hello", ChatState())
+        assert client.chat.completions.calls == 3
+
+    # nothing was counted, the breaker is still closed
+    assert llm_router.llm_breaker.is_closed
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from monitoring import diagnostics, metrics
+from monitoring.diagnostics import CaptureBusyError, LoopMonitor, allocation_diff, sample_profile
+
+_retained = []
+
+
+async def blocking_handler() -> None:
+    # a sync call on the loop, like a sqlite insert or a large json.dumps
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_logs_the_blocking_coroutine(caplog):
+    slow_before = metrics.SLOW_CALLBACKS.value()
+    lag_before = metrics.EVENT_LOOP_LAG.count()
+    monitor = LoopMonitor(interval=0.02, threshold=0.05)
+
+    with caplog.at_level(logging.WARNING, logger="monitoring.diagnostics"):
+        monitor.start()
+        await asyncio.sleep(0.05)
+        await blocking_handler()
+        await asyncio.sleep(0.05)
+        monitor.stop()
+
+    assert metrics.SLOW_CALLBACKS.value() == slow_before + 1
+    assert metrics.EVENT_LOOP_LAG.count() > lag_before
+    assert "event loop blocked" in caplog.text
+    assert "in test_watchdog_logs_the_blocking_coroutine" in caplog.text
+    assert "blocking_handler" in caplog.text
+
+
+def busy_spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sample_profile_returns_folded_stacks():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_spin, args=(stop,), name="spinner")
+    worker.start()
+    try:
+        folded = sample_profile(0.2, interval=0.002)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = folded.splitlines()
+    spinner = [line for line in lines if line.startswith("spinner;")]
+    assert spinner and any("busy_spin (test_diagnostics.py:" in line for line in spinner)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0 and ";" in stack
+
+
+def test_allocation_diff_attributes_new_memory():
+    def allocate() -> None:
+        time.sleep(0.05)
+        _retained.append([bytearray(1024) for _ in range(200)])
+
+    worker = threading.Thread(target=allocate)
+    worker.start()
+    try:
+        folded = allocation_diff(0.3)
+    finally:
+        worker.join()
+        _retained.clear()
+
+    ours = [line for line in folded.splitlines() if "test_diagnostics.py" in line]
+    assert ours
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in ours) >= 200 * 1024
+
+
+def test_one_capture_at_a_time():
+    with diagnostics._capture_lock:
+        with pytest.raises(CaptureBusyError):
+            sample_profile(0.01)
+
+
+def test_debug_endpoints(monkeypatch):
+    client = TestClient(server.app)
+    assert client.get("/debug/profile", params={"seconds": 0.05}).status_code == 404
+
+    monkeypatch.setattr(diagnostics, "DIAGNOSTICS_ENABLED", True)
+    res = client.get("/debug/profile", params={"seconds": 0.05})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert client.get("/debug/allocations", params={"seconds": 0.05}).status_code == 200
+    assert client.get("/debug/profile", params={"seconds": 60}).status_code == 400
@@ -13,4 +13,13 @@ async def test_get_response_strips_and_delegates(monkeypatch):
 
     state = ChatState()
     out = await server.get_response("  hello  ", state)
-    assert out == "OK"
\ No newline at end of file
+    assert out == "OK"
+
+def test_metrics_endpoint_exposes_prometheus_text():
+    from fastapi.testclient import TestClient
+
+    res = TestClient(server.app).get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    assert "# TYPE ws_active_connections gauge" in res.text
+    assert "# TYPE stage_latency_seconds histogram" in res.text
@@ -0,0 +1,283 @@
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.session_store import InMemorySessionStore
+from db.writer import ChatWriter
+from models.handoff import HandoffDesk, HandoffError, HandoffQueue, parse_credits
+from models.intent import Intent
+from models.message_dedupe import MessageDedupe
+from monitoring import metrics
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_queue(clock):
+    return HandoffQueue(intent_credit={"refund_order": 120}, tier_credit={"vip": 600}, clock=clock)
+
+
+def test_parse_credits():
+    assert parse_credits("vip=600, gold=300,bad,=5") == {"vip": 600.0, "gold": 300.0}
+
+
+def test_priority_by_wait_intent_and_tier():
+    clock = FakeClock()
+    queue = make_queue(clock)
+    queue.push("standard", "unknown")
+    clock.now += 100
+    queue.push("refund", "refund_order")          # 120s credit beats 100s of waiting
+    queue.push("vip", "unknown", tier="VIP")      # 600s credit
+    clock.now += 50
+    queue.push("late", "unknown")
+    assert [queue.pop("a").session_id for _ in range(4)] == ["vip", "refund", "standard", "late"]
+    assert queue.pop("a") is None
+
+    # waiting long enough beats any credit
+    queue = make_queue(clock)
+    queue.push("patient", "unknown")
+    clock.now += 601
+    queue.push("vip", "unknown", tier="vip")
+    assert queue.pop("a").session_id == "patient"
+
+
+def test_queue_handles_thousands_of_sessions_in_order():
+    clock = FakeClock()
+    queue = make_queue(clock)
+    rng = random.Random(7)
+    for i in range(5000):
+        clock.now += rng.random()
+        queue.push(f"s{i}", rng.choice(["unknown", "refund_order"]), rng.choice(["standard", "vip"]))
+    # customers who leave the line for good (released straight from waiting, e.g. an admin action)
+    for i in range(0, 5000, 3):
+        queue.remove(f"s{i}")
+    assert len(queue) == 5000 - 1667
+    assert len(queue._heap) <= 2 * len(queue) + 64
+
+    keys = []
+    while (ticket := queue.pop("a")) is not None:
+        keys.append(ticket.key)
+    assert len(keys) == 5000 - 1667 and keys == sorted(keys)
+
+
+def test_desk_requeues_skips_abandoned_and_checks_ownership():
+    clock = FakeClock()
+    desk = HandoffDesk(make_queue(clock), abandon_after=60)
+    notices = []
+    desk.attach_customer("s1", lambda text: None, notices.append)
+    desk.escalate("s1", "unknown")
+    desk.escalate("s2", "unknown")
+    desk.connect_agent("ann", lambda frame: None)
+
+    assert desk.take("ann").session_id == "s1"
+    assert notices[-1].startswith("A support agent")
+    with pytest.raises(HandoffError):
+        desk.to_customer("bob", "s1", "hi")
+
+    # ann drops: s1 goes back ahead of s2
+    assert desk.disconnect_agent("ann") == ["s1"]
+    assert len(desk.queue) == 2
+    desk.connect_agent("bob", lambda frame: None)
+    assert desk.take("bob").session_id == "s1"
+
+    # s2's customer left long ago
+    desk.detach_customer("s2", lambda text: None)
+    desk.queue.get("s2").detached_at = clock.now
+    clock.now += 61
+    abandoned = metrics.HANDOFF_EVENTS.value(event="abandoned")
+    assert desk.take("bob") is None
+    assert metrics.HANDOFF_EVENTS.value(event="abandoned") == abandoned + 1
+
+    desk.release("bob", "s1")
+    assert not desk.active("s1") and not desk.active("s2")
+
+
+def test_sweep_drops_abandoned_tickets_without_an_agent():
+    clock = FakeClock()
+    desk = HandoffDesk(make_queue(clock), abandon_after=60)
+    for session_id in ("gone", "back", "here"):
+        desk.attach_customer(session_id, lambda text: None, lambda text: None)
+        desk.escalate(session_id, "unknown")
+    replies = {}
+    for session_id in ("gone", "back"):
+        replies[session_id] = lambda text: None
+        desk.attach_customer(session_id, replies[session_id], lambda text: None)
+        desk.detach_customer(session_id, replies[session_id])
+    desk.attach_customer("back", lambda text: None, lambda text: None)
+
+    clock.now += 30
+    assert desk.sweep() == 0
+    clock.now += 31
+    abandoned = metrics.HANDOFF_EVENTS.value(event="abandoned")
+    # escalating someone else sweeps too, no agent needed
+    desk.escalate("new", "unknown")
+    assert not desk.active("gone") and desk.active("back") and desk.active("here")
+    assert metrics.HANDOFF_EVENTS.value(event="abandoned") == abandoned + 1
+    assert not desk._detached
+
+
+@pytest.fixture
+def handoff_server(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    calls = []
+
+    async def fake_handle_client_input(text, state):
+        calls.append(text)
+        if "human" in text:
+            state.current_intent = Intent.ESCALATE_TO_HUMAN
+            return "Connecting you to a person."
+        state.current_intent = Intent.REFUND_ORDER
+        return f"answer to {text}"
+
+    monkeypatch.setattr(server.ChatManager, "handle_client_input", fake_handle_client_input)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+    monkeypatch.setattr(server, "sessions", InMemorySessionStore())
+    monkeypatch.setattr(server, "dedupe", MessageDedupe(lambda s, m: None))
+    monkeypatch.setattr(server, "handoff", HandoffDesk())
+    monkeypatch.setattr(server, "HANDOFF_ENABLED", True)
+    monkeypatch.setattr(server, "WARMUP", False)
+    monkeypatch.setattr(server, "ROLLUP_INTERVAL_S", 0)
+    monkeypatch.setattr(server, "AGENT_TOKEN", "secret")
+    monkeypatch.setenv("INPUT_DEBOUNCE_MS", "0")
+    return calls, db_path
+
+
+AGENT_AUTH = {"authorization": "Bearer secret"}
+
+
+def _customer_frame(ws, kind):
+    while True:
+        frame = json.loads(ws.receive_text())
+        if frame["type"] == kind:
+            return frame
+
+
+def test_agent_takes_escalated_session(handoff_server):
+    calls, db_path = handoff_server
+    # one portal for both sockets, so they share an event loop like on a real worker
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/ws", subprotocols=["chat.v1.json"],
+                                      headers={"x-customer-tier": "vip"}) as customer:
+            session_id = _customer_frame(customer, "hello")["session_id"]
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-1", "text": "my refund is late"}))
+            _customer_frame(customer, "reply")
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-2", "text": "get me a human"}))
+            assert _customer_frame(customer, "reply")["text"] == "Connecting you to a person."
+            assert server.handoff.active(session_id)
+            assert metrics.HANDOFF_QUEUE_DEPTH.value() == 1
+
+            with client.websocket_connect("/ws/agent?agent_id=ann", headers=AGENT_AUTH) as agent:
+                assert json.loads(agent.receive_text()) == {"type": "hello", "agent_id": "ann"}
+                assert json.loads(agent.receive_text())["depth"] == 1
+
+                agent.send_text(json.dumps({"type": "take"}))
+                assigned = json.loads(agent.receive_text())
+                assert assigned["type"] == "assigned" and assigned["session_id"] == session_id
+                assert (assigned["intent"], assigned["tier"]) == ("refund_order", "vip")
+                history = json.loads(agent.receive_text())
+                assert history["done"] is True
+                assert [m["content"] for m in history["messages"]] == [
+                    "my refund is late", "answer to my refund is late", "get me a human", "Connecting you to a person.",
+                ]
+                assert _customer_frame(customer, "notice")["text"].startswith("A support agent")
+
+                # the customer now talks to the agent, not the bot
+                customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-3", "text": "hello?"}))
+                assert json.loads(agent.receive_text()) == {
+                    "type": "customer_message", "session_id": session_id, "text": "hello?",
+                }
+                agent.send_text(json.dumps({"type": "message", "session_id": session_id, "text": "Hi, I'm Ann."}))
+                assert json.loads(agent.receive_text())["delivered"] is True
+                assert _customer_frame(customer, "reply")["text"] == "Hi, I'm Ann."
+
+                agent.send_text(json.dumps({"type": "message", "session_id": "someone-else", "text": "hi"}))
+                assert json.loads(agent.receive_text())["code"] == "not_assigned"
+
+                agent.send_text(json.dumps({"type": "release", "session_id": session_id}))
+                assert json.loads(agent.receive_text())["type"] == "released"
+                _customer_frame(customer, "notice")
+
+            # back with the bot
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-4", "text": "thanks"}))
+            assert _customer_frame(customer, "reply")["text"] == "answer to thanks"
+
+    server.db.flush()
+    assert calls == ["my refund is late", "get me a human", "thanks"]
+    rows = SqliteChatRepo(db_path).get_messages(session_id)
+    assert ("agent", "Hi, I'm Ann.") in [(r.role, r.content) for r in rows]
+    assert metrics.HANDOFF_QUEUE_DEPTH.value() == 0
+
+
+def test_agent_disconnect_requeues_sessions(handoff_server):
+    server.handoff.escalate("s1", "unknown")
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/ws/agent?agent_id=ann", headers=AGENT_AUTH) as agent:
+            agent.receive_text(), agent.receive_text()
+            agent.send_text(json.dumps({"type": "take"}))
+            assert json.loads(agent.receive_text())["session_id"] == "s1"
+            assert len(server.handoff.queue) == 0
+        assert len(server.handoff.queue) == 1 and server.handoff.agents == 0
+
+
+def test_waiting_customer_gets_a_queued_notice(handoff_server):
+    calls, _ = handoff_server
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/ws", subprotocols=["chat.v1.json"]) as customer:
+            _customer_frame(customer, "hello")
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-1", "text": "get me a human"}))
+            _customer_frame(customer, "reply")
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-2", "text": "hello? anyone?"}))
+            assert _customer_frame(customer, "notice")["text"] == server.QUEUED_NOTICE
+    assert calls == ["get me a human"]
+
+
+def test_no_agent_credential_keeps_escalations_with_the_bot(handoff_server, monkeypatch):
+    calls, _ = handoff_server
+    monkeypatch.setattr(server, "AGENT_TOKEN", "")
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/ws", subprotocols=["chat.v1.json"]) as customer:
+            session_id = _customer_frame(customer, "hello")["session_id"]
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-1", "text": "get me a human"}))
+            _customer_frame(customer, "reply")
+            assert not server.handoff.active(session_id) and len(server.handoff.queue) == 0
+            customer.send_text(json.dumps({"v": 1, "type": "message", "id": "c-2", "text": "still there?"}))
+            assert _customer_frame(customer, "reply")["text"] == "answer to still there?"
+    assert calls == ["get me a human", "still there?"]
+
+
+def _refused(client, headers=None) -> bool:
+    try:
+        with client.websocket_connect("/ws/agent?agent_id=bob", headers=dict(headers or {})) as agent:
+            agent.receive_text()
+    except WebSocketDisconnect as e:
+        return e.code == 1008
+    return False
+
+
+def test_agent_endpoint_fails_closed(handoff_server, monkeypatch):
+    client = TestClient(server.app)
+    assert _refused(client)
+    assert _refused(client, {"authorization": "Bearer wrong"})
+    # the query string is not a credential
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect("/ws/agent?agent_id=bob&token=secret") as agent:
+            agent.receive_text()
+
+    # no token configured: refused unless the dev flag opens it
+    monkeypatch.setattr(server, "AGENT_TOKEN", "")
+    assert _refused(client, AGENT_AUTH)
+    monkeypatch.setattr(server, "AGENT_ENDPOINT_OPEN", True)
+    with client.websocket_connect("/ws/agent?agent_id=bob") as agent:
+        assert json.loads(agent.receive_text())["type"] == "hello"
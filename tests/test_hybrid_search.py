@@ -0,0 +1,101 @@
+import pytest
+
+from models import hybrid_search as hs
+from models.hybrid_search import VectorIndex, hybrid_search, lexical_search, rrf, stem, stems, vector_index
+from models.knowledge_search import chunk_file, knowledge_search, load_chunks, tokenize
+from monitoring.metrics import KNOWLEDGE_BUDGET_EXCEEDED, KNOWLEDGE_VECTOR_BUILD_FAILURES
+
+DOCS = """
+## Refund Method
+Refunds are issued to the original payment method within 5 business days.
+
+## Blender Model X-200
+The X-200 ships with a 1200 watt motor and a 64 oz jar.
+
+## Blender Model X-300
+The X-300 ships with a 1500 watt motor, a tamper and a 72 oz jar.
+
+## Support Hours
+Our support team answers chats Monday to Friday, 8am to 6pm.
+"""
+
+
+@pytest.fixture
+def chunks():
+    return chunk_file("products.md", DOCS)
+
+
+def test_stem_folds_inflections_and_synonyms():
+    assert stem("refunds") == stem("refunded") == "refund"
+    assert stems("money back") == ["refund", "back"]
+    assert stem("delivered") == stem("shipping") == "ship"
+    assert stem("open") == "hour"
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = rrf([[1, 2, 3], [3, 1, 4]])
+    assert [i for i, _ in fused] == [1, 3, 2, 4]
+
+
+def test_vector_search_finds_rephrasing_lexical_misses(chunks):
+    query = "can I get my money refunded"
+    assert lexical_search(tokenize(query), chunks, 5) == []
+
+    ranked = VectorIndex(chunks).search(query, 5)
+    assert chunks[ranked[0]].section == "Refund Method"
+
+
+def test_exact_model_number_wins_after_fusion_and_rerank(chunks):
+    vector_index("products", chunks, wait=True)
+    query = "how big is the jar on the x-300"
+    top = hybrid_search(query, tokenize(query), chunks, 2, "products", budget_ms=1000)
+    assert top[0].section == "Blender Model X-300"
+
+
+def test_exhausted_budget_falls_back_to_lexical(chunks):
+    before = KNOWLEDGE_BUDGET_EXCEEDED.value(stage="vector")
+    query = "motor watt"
+    top = hybrid_search(query, tokenize(query), chunks, 3, "products", budget_ms=0)
+
+    assert [c.section for c in top] == [chunks[i].section for i in lexical_search(tokenize(query), chunks, 3)]
+    assert KNOWLEDGE_BUDGET_EXCEEDED.value(stage="vector") == before + 1
+
+
+def test_lexical_results_while_vector_index_builds(chunks, monkeypatch):
+    monkeypatch.setattr(hs, "_build", lambda folder, chunks: None)
+    monkeypatch.setattr(hs, "_vector_indexes", {})
+    monkeypatch.setattr(hs, "_building", {})
+    query = "motor watt"
+
+    top = hybrid_search(query, tokenize(query), chunks, 3, "cold", budget_ms=1000)
+    assert top and all("motor" in c.content for c in top)
+
+
+def test_failed_vector_build_is_counted_and_retried(chunks, monkeypatch):
+    monkeypatch.setattr(hs, "_vector_indexes", {})
+    monkeypatch.setattr(hs, "_building", {})
+    monkeypatch.setattr(hs, "VectorIndex", lambda chunks: 1 / 0)
+    before = KNOWLEDGE_VECTOR_BUILD_FAILURES.value()
+
+    with pytest.raises(ZeroDivisionError):
+        vector_index("broken", chunks, wait=True)
+    assert vector_index("broken", chunks) is None
+    thread = hs._building.get("broken")
+    if thread is not None:
+        thread.join()
+    assert KNOWLEDGE_VECTOR_BUILD_FAILURES.value() == before + 2
+    assert "broken" not in hs._building
+
+    # the next search starts over and gets an index
+    monkeypatch.setattr(hs, "VectorIndex", VectorIndex)
+    assert vector_index("broken", chunks, wait=True).chunks is chunks
+
+
+def test_knowledge_search_hybrid_mode(tmp_path):
+    (tmp_path / "products.md").write_text(DOCS, encoding="utf-8")
+    folder = str(tmp_path)
+    vector_index(folder, load_chunks(folder), wait=True)
+
+    assert knowledge_search("money back please", folder=folder)["matches"] == []
+    res = knowledge_search("money back please", folder=folder, mode="hybrid")
+    assert res["matches"][0]["section"] == "Refund Method"
@@ -0,0 +1,38 @@
+from models import index_builder
+from models.index_builder import MIN_FILES_FOR_POOL, build_index
+from models.knowledge_search import ChunkerConfig, load_chunks
+
+
+def _write_corpus(folder, files):
+    folder.mkdir()
+    for i in range(files):
+        body = " ".join(f"Article {i} sentence {j} about warranty claims." for j in range(30))
+        (folder / f"a{i:03}.md").write_text(f"# Article {i}\n\n## Part A\n{body}\n\n## Part B\nShort.\n", encoding="utf-8")
+    (folder / "skip.txt").write_text("not markdown", encoding="utf-8")
+
+
+def test_pool_build_matches_single_process_build(tmp_path):
+    folder = tmp_path / "kb"
+    _write_corpus(folder, MIN_FILES_FOR_POOL + 6)
+    config = ChunkerConfig(max_chars=300, overlap=50)
+
+    serial, serial_report = build_index(str(folder), config, workers=1)
+    pooled, pooled_report = build_index(str(folder), config, workers=2)
+
+    assert [(c.filename, c.section, c.content) for c in pooled] == [(c.filename, c.section, c.content) for c in serial]
+    assert pooled[0].offsets == serial[0].offsets
+    assert pooled_report.files == serial_report.files == MIN_FILES_FOR_POOL + 6
+    assert pooled_report.chunks == len(pooled) > pooled_report.files
+    assert pooled_report.bytes > 0
+    assert "files/s" in pooled_report.format()
+
+
+def test_search_path_rebuilds_without_a_pool(tmp_path, monkeypatch):
+    folder = tmp_path / "kb"
+    _write_corpus(folder, MIN_FILES_FOR_POOL + 6)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError("started a process pool")
+
+    monkeypatch.setattr(index_builder, "ProcessPoolExecutor", no_pool)
+    assert len(load_chunks(str(folder), ChunkerConfig(max_chars=300, overlap=50))) > MIN_FILES_FOR_POOL
@@ -0,0 +1,99 @@
+import asyncio
+import pytest
+
+from models.chat_state import ChatState
+from models.input_pipeline import InputPipeline
+from models.intent import Intent
+
+
+async def _run_until(pipeline, delivered, count):
+    worker = asyncio.create_task(pipeline.run())
+    try:
+        while len(delivered) < count:
+            await asyncio.sleep(0.01)
+    finally:
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_burst_within_debounce_window_becomes_one_turn():
+    seen, delivered, coalesced = [], [], []
+
+    async def respond(text):
+        seen.append(text)
+        return f"reply to {text!r}"
+
+    async def deliver(text, reply):
+        delivered.append(reply)
+
+    pipeline = InputPipeline(respond, deliver, debounce=0.05, on_coalesced=coalesced.append)
+    for msg in ("hi", "where is my order", "it's 124"):
+        await pipeline.submit(msg)
+
+    await _run_until(pipeline, delivered, 1)
+    assert seen == ["hi\nwhere is my order\nit's 124"]
+    assert coalesced == [3]
+
+
+@pytest.mark.asyncio
+async def test_newer_message_cancels_in_flight_turn_and_carries_text():
+    started = asyncio.Event()
+    seen, delivered, cancelled = [], [], []
+
+    async def respond(text):
+        seen.append(text)
+        if len(seen) == 1:
+            started.set()
+            await asyncio.sleep(10)  # slow LLM call, gets superseded
+        return "done"
+
+    async def deliver(text, reply):
+        delivered.append(text)
+
+    pipeline = InputPipeline(respond, deliver, debounce=0, on_cancelled=cancelled.append)
+    worker = asyncio.create_task(pipeline.run())
+    await pipeline.submit("where is my order")
+    await started.wait()
+    await pipeline.submit("124")
+
+    while not delivered:
+        await asyncio.sleep(0.01)
+    worker.cancel()
+    await asyncio.gather(worker, return_exceptions=True)
+
+    assert cancelled == ["where is my order"]
+    assert seen == ["where is my order", "where is my order\n124"]
+    assert delivered == ["where is my order\n124"]
+
+
+@pytest.mark.asyncio
+async def test_messages_sent_while_delivering_start_a_new_turn():
+    seen, delivered = [], []
+
+    async def respond(text):
+        seen.append(text)
+        return text
+
+    async def deliver(text, reply):
+        if not delivered:
+            await pipeline.submit("second")
+        delivered.append(text)
+
+    pipeline = InputPipeline(respond, deliver, debounce=0)
+    await pipeline.submit("first")
+    await _run_until(pipeline, delivered, 2)
+    assert delivered == ["first", "second"]
+
+
+def test_chat_state_restore_rolls_back_in_place():
+    state = ChatState(user_data={"session_id": "s1"})
+    snapshot = state.to_dict()
+    state.current_intent = Intent.REFUND_ORDER
+    state.pending_data = "order_id"
+    state.user_data["order_id"] = "124"
+
+    state.restore(snapshot)
+    assert state.current_intent is None
+    assert state.pending_data is None
+    assert state.user_data == {"session_id": "s1"}
@@ -136,4 +136,96 @@ def test_knowledge_search_returns_empty_matches_when_no_hits(tmp_path):
     (folder / "a.md").write_text("# A\n\n## S\nhello world", encoding="utf-8")
 
     res = knowledge_search("nonexistentterm", folder=str(folder))
-    assert res["matches"] == []
\ No newline at end of file
+    assert res["matches"] == []
+
+def test_knowledge_search_reuses_index_until_folder_changes(tmp_path):
+    from monitoring.metrics import KNOWLEDGE_CACHE_HITS, KNOWLEDGE_CACHE_MISSES
+
+    folder = tmp_path / "knowledge"
+    folder.mkdir()
+    (folder / "a.md").write_text("# A\n\n## S\nhello world", encoding="utf-8")
+
+    hits, misses = KNOWLEDGE_CACHE_HITS.value(), KNOWLEDGE_CACHE_MISSES.value()
+    knowledge_search("hello", folder=str(folder))
+    knowledge_search("hello", folder=str(folder))
+    assert KNOWLEDGE_CACHE_MISSES.value() - misses == 1
+    assert KNOWLEDGE_CACHE_HITS.value() - hits == 1
+
+    (folder / "b.md").write_text("# B\n\n## S\ngoodbye world", encoding="utf-8")
+    res = knowledge_search("goodbye", folder=str(folder))
+    assert res["matches"][0]["source"] == "b.md"
+    assert KNOWLEDGE_CACHE_MISSES.value() - misses == 2
+
+
+def test_split_section_bounds_size_overlaps_and_keeps_sentences_whole():
+    from models.knowledge_search import ChunkerConfig, split_section
+
+    text = " ".join(f"Sentence {i} is here." for i in range(40))
+    parts = split_section(text, ChunkerConfig(max_chars=120, overlap=40))
+
+    assert len(parts) > 1
+    assert all(len(p) <= 120 for p in parts)
+    assert all(p.startswith("Sentence") and p.endswith(".") for p in parts)
+    # each chunk opens with trailing sentences of the previous one
+    for prev, nxt in zip(parts, parts[1:]):
+        assert nxt.split(". ")[0] + "." in prev
+    assert "Sentence 39 is here." in parts[-1]
+
+
+def test_split_section_prefers_paragraph_breaks():
+    from models.knowledge_search import ChunkerConfig, split_section
+
+    first = " ".join(["Alpha words here."] * 6)
+    second = " ".join(["Beta words here."] * 5)
+    parts = split_section(first + "\n\n" + second, ChunkerConfig(max_chars=150, overlap=0))
+    assert parts[0] == first
+    assert parts[1].startswith("Beta")
+
+
+def test_chunk_file_splits_large_sections(tmp_path):
+    from models.knowledge_search import ChunkerConfig
+
+    body = "\n\n".join(f"Paragraph {i} about warranty coverage and repairs." for i in range(30))
+    chunks = chunk_file("w.md", "# W\n\n## Big\n" + body, ChunkerConfig(max_chars=200, overlap=0))
+    assert len(chunks) > 1
+    assert all(c.section == "Big" and len(c.content) <= 200 for c in chunks)
+
+
+def test_knowledge_search_returns_best_passage_of_long_chunk():
+    from models.knowledge_search import best_passage
+
+    filler = " ".join(["Nothing relevant in this sentence."] * 40)
+    chunk = Chunk(filename="a.md", title="A", section="S",
+                  content=filler + " Refunds are issued within five days. " + filler)
+    passage = best_passage(chunk, ["refunds"], 200)
+
+    assert "Refunds are issued within five days." in passage
+    assert passage.startswith("...") and passage.endswith("...")
+    assert len(passage) <= 203
+
+
+def test_concurrent_searches_rebuild_a_changed_folder_once(tmp_path, monkeypatch):
+    import threading
+    import time
+
+    from models import index_builder
+
+    folder = tmp_path / "knowledge"
+    folder.mkdir()
+    (folder / "a.md").write_text("# A\n\n## S\nhello world", encoding="utf-8")
+    builds = []
+    real_build = index_builder.build_index
+
+    def slow_build(*args, **kwargs):
+        builds.append(1)
+        time.sleep(0.05)
+        return real_build(*args, **kwargs)
+
+    monkeypatch.setattr(index_builder, "build_index", slow_build)
+    threads = [threading.Thread(target=knowledge_search, args=("hello",), kwargs={"folder": str(folder)})
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(builds) == 1
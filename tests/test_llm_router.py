@@ -1,8 +1,12 @@
 import json
+import threading
+
 import pytest
 
 import llm_router
 from models.intent import Intent
+from models.model_policy import ModelPolicy
+from monitoring.metrics import MODEL_DECISIONS, TOOL_ARGS
 
 
 # -------------------------
@@ -67,8 +71,10 @@ class DummyState:
 
 @pytest.mark.asyncio
 async def test_get_intent_returns_unknown_when_no_tool_calls(monkeypatch):
+    # neither the routing model nor the escalation model answers with a route call
     fake_client = FakeClient([
-        FakeResponse(FakeMessage(content="hi", tool_calls=[]))
+        FakeResponse(FakeMessage(content="hi", tool_calls=[])),
+        FakeResponse(FakeMessage(content="hi", tool_calls=[])),
     ])
     monkeypatch.setattr(llm_router, "client", fake_client)
 
@@ -78,6 +84,7 @@ async def test_get_intent_returns_unknown_when_no_tool_calls(monkeypatch):
     assert result.intent == Intent.UNKNOWN
     assert result.confidence == 0.0
     assert result.next_action == "respond"
+    assert len(fake_client.chat.completions.calls) == 2
 
 
 @pytest.mark.asyncio
@@ -108,10 +115,128 @@ async def test_get_intent_parses_tool_call_into_route_result(monkeypatch):
     assert result.slot_to_request is None
 
 
+def route_response(intent: Intent, confidence: float, arguments: str = None):
+    call = FakeToolCall(tool_id="call_1", name="route", args={
+        "intent": intent.value, "confidence": confidence, "next_action": "respond",
+        "slot_to_request": None, "tool_name": None, "tool_args": None,
+    })
+    if arguments is not None:
+        call.function.arguments = arguments
+    return FakeResponse(FakeMessage(content=None, tool_calls=[call]))
+
+
+@pytest.mark.asyncio
+async def test_get_intent_uses_small_model_when_confident(monkeypatch):
+    fake_client = FakeClient([route_response(Intent.GREETING, 0.9)])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    monkeypatch.setattr(llm_router, "model_policy", ModelPolicy(route="small", route_escalation="large"))
+
+    result = await llm_router.get_intent("hello", DummyState())
+
+    assert result.intent == Intent.GREETING
+    assert [c["model"] for c in fake_client.chat.completions.calls] == ["small"]
+
+
+@pytest.mark.asyncio
+async def test_get_intent_escalates_low_confidence_to_stronger_model(monkeypatch):
+    fake_client = FakeClient([
+        route_response(Intent.UNKNOWN, 0.3),
+        route_response(Intent.REFUND_ORDER, 0.95),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    monkeypatch.setattr(llm_router, "model_policy", ModelPolicy(route="small", route_escalation="large", min_confidence=0.6))
+    before = MODEL_DECISIONS.value(stage="route", model="large", reason="low_confidence")
+
+    result = await llm_router.get_intent("i want my money back for the thing", DummyState())
+
+    assert result.intent == Intent.REFUND_ORDER
+    assert [c["model"] for c in fake_client.chat.completions.calls] == ["small", "large"]
+    # both calls see the same prompt
+    assert fake_client.chat.completions.calls[0]["messages"] == fake_client.chat.completions.calls[1]["messages"]
+    assert MODEL_DECISIONS.value(stage="route", model="large", reason="low_confidence") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_get_intent_escalates_unparseable_route_and_falls_back_to_unknown(monkeypatch, caplog):
+    monkeypatch.setattr(llm_router, "model_policy", ModelPolicy(route="small", route_escalation="large"))
+
+    fake_client = FakeClient([
+        route_response(Intent.GREETING, 0.9, arguments='{"intent": "greeting"'),
+        route_response(Intent.GREETING, 0.9),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    assert (await llm_router.get_intent("hello", DummyState())).intent == Intent.GREETING
+
+    fake_client = FakeClient([
+        route_response(Intent.GREETING, 0.9, arguments='{"intent": "not_an_intent"}'),
+        route_response(Intent.GREETING, 0.9, arguments="nope"),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    failed = TOOL_ARGS.value(tool="route", outcome="failed")
+    result = await llm_router.get_intent("hello", DummyState())
+    assert (result.intent, result.next_action) == (Intent.UNKNOWN, "respond")
+    assert TOOL_ARGS.value(tool="route", outcome="failed") == failed + 2
+    assert "couldn't be repaired" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_garbage_route_args_from_both_models_still_get_a_reply(monkeypatch):
+    from models.chat_manager import ChatManager
+    from models.chat_state import ChatState
+
+    monkeypatch.setattr(llm_router, "model_policy", ModelPolicy(route="small", route_escalation="large"))
+    fake_client = FakeClient([
+        route_response(Intent.GREETING, 0.9, arguments="}}garbage{{"),
+        route_response(Intent.GREETING, 0.9, arguments='{"intent": 42, "confidence": "very"}'),
+        FakeResponse(FakeMessage(content="Sorry, could you rephrase that?")),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+
+    state = ChatState()
+    assert await ChatManager.handle_client_input("hello", state) == "Sorry, could you rephrase that?"
+    assert state.current_intent == Intent.UNKNOWN
+
+
+@pytest.mark.asyncio
+async def test_get_intent_repairs_malformed_route_without_another_call(monkeypatch):
+    arguments = '{"intent": "Refund Order", "confidence": 0.9, "next_action": "respond"} trailing note'
+    fake_client = FakeClient([route_response(Intent.GREETING, 0.9, arguments=arguments)])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+
+    result = await llm_router.get_intent("refund please", DummyState())
+
+    assert result.intent == Intent.REFUND_ORDER
+    assert result.slot_to_request is None
+    assert len(fake_client.chat.completions.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_get_intent_keeps_small_model_answer_without_escalation_model(monkeypatch):
+    fake_client = FakeClient([route_response(Intent.KNOWLEDGE_QA, 0.2)])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    monkeypatch.setattr(llm_router, "model_policy", ModelPolicy(route="small", route_escalation=None))
+
+    result = await llm_router.get_intent("hours?", DummyState())
+
+    assert result.intent == Intent.KNOWLEDGE_QA
+    assert len(fake_client.chat.completions.calls) == 1
+
+
 # -------------------------
 # Tests for generate_result
 # -------------------------
 
+@pytest.mark.asyncio
+async def test_generate_result_picks_model_by_intent(monkeypatch):
+    policy = ModelPolicy(generate="default-model", generate_by_intent={Intent.KNOWLEDGE_QA: "big-model"})
+    monkeypatch.setattr(llm_router, "model_policy", policy)
+
+    for intent, model in ((Intent.KNOWLEDGE_QA, "big-model"), (Intent.GREETING, "default-model")):
+        fake_client = FakeClient([FakeResponse(FakeMessage(content="ok", tool_calls=[]))])
+        monkeypatch.setattr(llm_router, "client", fake_client)
+        await llm_router.generate_result("hi", DummyState(current_intent=intent))
+        assert fake_client.chat.completions.calls[0]["model"] == model
+
 @pytest.mark.asyncio
 async def test_generate_result_returns_direct_response_when_no_tool_calls(monkeypatch):
     fake_client = FakeClient([
@@ -136,6 +261,8 @@ async def test_generate_result_calls_get_order_and_uses_second_model_call(monkey
         FakeResponse(FakeMessage(content="Your order 124 is Shipped.", tool_calls=[])),
     ])
     monkeypatch.setattr(llm_router, "client", fake_client)
+    # templated replies off, the model writes the answer
+    monkeypatch.setenv("TEMPLATE_INTENTS", "")
 
     # Make get_order deterministic (it already is), but we can assert it was used by checking tool output in messages
     state = DummyState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data=None, user_data={"order_id": "124"})
@@ -155,7 +282,10 @@ async def test_generate_result_calls_get_order_and_uses_second_model_call(monkey
 @pytest.mark.asyncio
 async def test_generate_result_calls_knowledge_search(monkeypatch):
     # Patch knowledge_search so we don't rely on filesystem
+    threads = []
+
     def fake_ks(query: str, top_k: int = 3, folder: str = "knowledge"):
+        threads.append(threading.get_ident())
         return {"query": query, "top_k": top_k, "matches": [{"source": "x.md", "content": "Return within 30 days."}]}
 
     monkeypatch.setattr(llm_router, "knowledge_search", fake_ks)
@@ -171,6 +301,8 @@ async def test_generate_result_calls_knowledge_search(monkeypatch):
     res = await llm_router.generate_result("What's your return policy?", state)
 
     assert "30 days" in res.response_text
+    # searched on a worker thread, not the event loop's
+    assert threads and threads[0] != threading.get_ident()
 
     # Verify the tool output made it into the second call messages
     second_msgs = fake_client.chat.completions.calls[1]["messages"]
@@ -198,4 +330,162 @@ async def test_generate_result_unknown_tool_name(monkeypatch):
     msgs = fake_client.chat.completions.calls[1]["messages"]
     tool_msg = next(m for m in msgs if m["role"] == "tool")
     err = json.loads(tool_msg["content"])
-    assert "Unknown Tool" in err["error"]
\ No newline at end of file
+    assert "Unknown Tool" in err["error"]
+
+@pytest.mark.asyncio
+async def test_generate_result_with_prefetched_order_skips_tool_decision_call(monkeypatch):
+    fake_client = FakeClient([
+        FakeResponse(FakeMessage(content="Your order 124 is Shipped.", tool_calls=[])),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    # templated replies off, the model writes the answer
+    monkeypatch.setenv("TEMPLATE_INTENTS", "")
+
+    async def lookup():
+        return {"status": "Shipped"}
+
+    state = DummyState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data=None, user_data={"order_id": "124"})
+    res = await llm_router.generate_result("124", state, prefetched=lookup())
+
+    assert res.response_text == "Your order 124 is Shipped."
+    assert len(fake_client.chat.completions.calls) == 1
+    msgs = fake_client.chat.completions.calls[0]["messages"]
+    call = msgs[-2]["tool_calls"][0]
+    assert call["function"]["name"] == "get_order"
+    assert json.loads(call["function"]["arguments"]) == {"order_id": "124"}
+    assert msgs[-1] == {"role": "tool", "tool_call_id": call["id"], "content": json.dumps({"status": "Shipped"})}
+
+
+@pytest.mark.asyncio
+async def test_order_slot_fill_looks_the_order_up_every_turn(monkeypatch):
+    from models.chat_manager import ChatManager
+    from models.chat_state import ChatState
+
+    lookups = []
+
+    async def fake_get_order(order_id):
+        lookups.append(order_id)
+        return {"status": "Processing"} if len(lookups) == 1 else {"status": "Shipped"}
+
+    fake_client = FakeClient([
+        FakeResponse(FakeMessage(content="It's processing.")),
+        FakeResponse(FakeMessage(content="It shipped.")),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    # templated replies off, the model writes the answer
+    monkeypatch.setenv("TEMPLATE_INTENTS", "")
+    monkeypatch.setattr(llm_router, "get_order", fake_get_order)
+
+    state = ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id")
+    assert await ChatManager.handle_client_input("124", state) == "It's processing."
+
+    # nothing is kept on the session -- a follow-up sees the order as it is now (OrderService owns the caching)
+    state.pending_data = "order_id"
+    assert await ChatManager.handle_client_input("124", state) == "It shipped."
+    assert lookups == ["124", "124"]
+    assert "Shipped" in fake_client.chat.completions.calls[1]["messages"][-1]["content"]
+    assert len(fake_client.chat.completions.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_coalesced_slot_answer_fills_the_slot_from_the_first_message(monkeypatch):
+    from models.chat_manager import ChatManager
+    from models.chat_state import ChatState
+
+    lookups = []
+
+    async def fake_get_order(order_id):
+        lookups.append(order_id)
+        return {"status": "Shipped"}
+
+    fake_client = FakeClient([FakeResponse(FakeMessage(content="It shipped yesterday."))])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+    monkeypatch.setenv("TEMPLATE_INTENTS", "")
+    monkeypatch.setattr(llm_router, "get_order", fake_get_order)
+
+    state = ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id")
+    # two messages within the debounce window, as the input pipeline joins them
+    assert await ChatManager.handle_client_input("124\nwhen will it arrive?", state) == "It shipped yesterday."
+    assert state.user_data["order_id"] == "124"
+    assert lookups == ["124"]
+    # the model still sees the follow-up question
+    assert "when will it arrive?" in json.dumps(fake_client.chat.completions.calls[0]["messages"])
+
+
+@pytest.mark.asyncio
+async def test_order_id_in_message_is_looked_up_during_the_route_call(monkeypatch):
+    import asyncio
+
+    from models import chat_manager
+    from models.chat_manager import ChatManager
+    from models.chat_state import ChatState
+
+    events = []
+
+    async def fake_get_order(order_id):
+        events.append(f"lookup {order_id}")
+        return {"status": "Shipped"}
+
+    async def fake_get_intent(message, state):
+        await asyncio.sleep(0.01)
+        events.append("routed")
+        return llm_router.RouteResult(intent=Intent.GET_ORDER_INFORMATION, confidence=0.9, tool_name="get_order",
+                                      tool_args={"order_id": "124"}, next_action="respond")
+
+    monkeypatch.setattr(llm_router, "get_order", fake_get_order)
+    monkeypatch.setattr(chat_manager, "get_intent", fake_get_intent)
+    monkeypatch.setenv("TEMPLATE_INTENTS", "get_order_information")
+
+    reply = await ChatManager.handle_client_input("where is order 124?", ChatState())
+    assert "124" in reply
+    # one lookup, started before routing finished and reused by generation
+    assert events == ["lookup 124", "routed"]
+
+
+@pytest.mark.asyncio
+async def test_order_lookup_is_answered_from_template_without_second_call(monkeypatch):
+    tool_call = FakeToolCall("call_1", "get_order", {"order_id": "124"})
+    fake_client = FakeClient([FakeResponse(FakeMessage(content=None, tool_calls=[tool_call]))])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+
+    state = DummyState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data=None, user_data={"order_id": "124"})
+    res = await llm_router.generate_result("Where is my order?", state)
+
+    assert res.response_text == "Order 124 is shipped, expected 2026-02-25 via UPS (tracking 1Z...)."
+    assert len(fake_client.chat.completions.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_refund_with_found_order_still_uses_model(monkeypatch):
+    fake_client = FakeClient([FakeResponse(FakeMessage(content="What's the reason for the return?"))])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+
+    async def lookup():
+        return {"status": "Shipped"}
+
+    state = DummyState(current_intent=Intent.REFUND_ORDER, pending_data=None, user_data={"order_id": "124"})
+    res = await llm_router.generate_result("124", state, prefetched=lookup())
+    assert res.response_text == "What's the reason for the return?"
+
+    async def missing():
+        return {"error": "not found"}
+
+    res = await llm_router.generate_result("999", DummyState(Intent.REFUND_ORDER, None, {"order_id": "999"}), prefetched=missing())
+    assert res.response_text.startswith("I couldn't find an order with ID 999")
+    assert len(fake_client.chat.completions.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_generate_result_reports_invalid_tool_args_to_the_model(monkeypatch):
+    bad_call = FakeToolCall(tool_id="call_1", name="get_order", args={"order": "124"})
+    fake_client = FakeClient([
+        FakeResponse(FakeMessage(content=None, tool_calls=[bad_call])),
+        FakeResponse(FakeMessage(content="Which order do you mean?", tool_calls=[])),
+    ])
+    monkeypatch.setattr(llm_router, "client", fake_client)
+
+    res = await llm_router.generate_result("where is it", DummyState(current_intent=Intent.GET_ORDER_INFORMATION))
+
+    assert res.response_text == "Which order do you mean?"
+    tool_msg = fake_client.chat.completions.calls[1]["messages"][-1]
+    assert json.loads(tool_msg["content"])["error"].startswith("Invalid arguments")
@@ -0,0 +1,117 @@
+import json
+import os
+import random
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from loadtest.fake_llm import FakeLLMConfig, LatencyModel, create_app
+from loadtest.run import LoadReport, bucket_quantile, child_pids, metrics_url_for, parse_histogram, server_rss
+from loadtest.scenarios import SCENARIOS, pick_scripts
+from llm_router import ROUTER_TOOL, GENERATE_TOOL
+
+
+def _post(client, messages, tools=None, stream=False):
+    body = {"model": "gpt-4.1-mini", "messages": messages, "stream": stream}
+    if tools:
+        body["tools"] = tools
+    return client.post("/v1/chat/completions", json=body)
+
+
+def test_fake_llm_routes_order_question_to_slot_request():
+    client = TestClient(create_app())
+    res = _post(client, [
+        {"role": "system", "content": "router"},
+        {"role": "system", "content": "STATE: order_id=None, pending_data=None, current_intent=None"},
+        {"role": "user", "content": "where is my order?"},
+    ], tools=ROUTER_TOOL).json()
+
+    call = res["choices"][0]["message"]["tool_calls"][0]
+    args = json.loads(call["function"]["arguments"])
+    assert call["function"]["name"] == "route"
+    assert args["intent"] == "get_order_information"
+    assert args["next_action"] == "ask_for_slot"
+    assert res["usage"]["prompt_tokens"] > 0
+
+
+def test_fake_llm_calls_get_order_then_answers_from_tool_output():
+    client = TestClient(create_app())
+    state = {"role": "system", "content": "STATE: current_intent=get_order_information, order_id=124, pending_data=None"}
+    first = _post(client, [state, {"role": "user", "content": "124"}], tools=GENERATE_TOOL).json()
+    call = first["choices"][0]["message"]["tool_calls"][0]
+    assert call["function"]["name"] == "get_order"
+
+    second = _post(client, [
+        state,
+        {"role": "user", "content": "124"},
+        {"role": "tool", "tool_call_id": call["id"], "content": json.dumps({"status": "Shipped", "eta": "2026-02-25"})},
+    ]).json()
+    assert "Shipped" in second["choices"][0]["message"]["content"]
+
+
+def test_fake_llm_injects_errors_and_streams():
+    failing = TestClient(create_app(FakeLLMConfig(error_rate=1.0, error_status=429)))
+    assert _post(failing, [{"role": "user", "content": "hi"}]).status_code == 429
+
+    client = TestClient(create_app())
+    res = _post(client, [{"role": "user", "content": "hi"}], stream=True)
+    events = [line for line in res.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "data: [DONE]"
+    assert json.loads(events[0][6:])["object"] == "chat.completion.chunk"
+
+
+def test_latency_model_is_deterministic_per_seed():
+    model = LatencyModel.parse("lognormal:100,0.5")
+    a = [model.sample(random.Random(7)) for _ in range(3)]
+    b = [model.sample(random.Random(7)) for _ in range(3)]
+    assert a == b
+    assert LatencyModel.parse("fixed:50").sample(random.Random()) == 0.05
+
+
+def test_pick_scripts_mix_is_seeded():
+    assert pick_scripts("mix", 20, seed=3) == pick_scripts("mix", 20, seed=3)
+    assert pick_scripts("greeting", 2) == [SCENARIOS["greeting"]] * 2
+
+
+def test_load_report_format():
+    report = LoadReport(sessions=2, failed=1, turns=4, elapsed_s=2.0,
+                        latencies=[0.1, 0.2, 0.3, 0.4], loop_lag=[0.001], errors=["TimeoutError"])
+    text = report.format()
+    assert "2.0 turns/s" in text
+    assert "TimeoutError x1" in text
+
+
+def test_load_report_lists_server_lag_and_rss_per_worker():
+    report = LoadReport(sessions=1, failed=0, turns=1, elapsed_s=1.0, latencies=[0.1], loop_lag=[],
+                        errors=[], server_rss_mb={10: 100.0, 11: 50.5}, server_lag_p99=0.025, server_lag_mean=0.002)
+    text = report.format()
+    assert "server lag      p99<=25.0ms mean=2.0ms" in text
+    assert "150.5 MB (10=100.0 11=50.5)" in text
+
+
+def test_server_lag_is_read_from_the_metrics_histogram():
+    from monitoring.metrics import Histogram
+
+    lag = Histogram("event_loop_lag_seconds", "lag", buckets=(0.001, 0.01, 0.1))
+    for value in [0.0005] * 98 + [0.05, 0.05]:
+        lag.observe(value)
+    buckets, total, count = parse_histogram("\n".join(lag.render()), "event_loop_lag_seconds")
+    assert count == 100 and abs(total - 0.149) < 1e-9
+    assert bucket_quantile(buckets, count, 0.5) == 0.001
+    assert bucket_quantile(buckets, count, 0.99) == 0.1
+    assert parse_histogram("other_metric 1", "event_loop_lag_seconds") is None
+    assert metrics_url_for("ws://127.0.0.1:8800/ws") == "http://127.0.0.1:8800/metrics"
+
+
+def test_server_rss_covers_child_processes():
+    if not os.path.isdir("/proc/self"):
+        pytest.skip("needs /proc")
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        assert child.pid in child_pids(os.getpid())
+        assert child.pid in server_rss(os.getpid())
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.session_store import InMemorySessionStore
+from db.writer import ChatWriter
+from models.chat_frames import parse_client_frame, reply_frame
+from models.message_dedupe import NEW, REPLIED, SEEN, MessageDedupe
+from monitoring import metrics
+
+
+def _no_db(session_id, message_id):
+    raise AssertionError("looked up the DB")
+
+
+def test_parse_client_frame():
+    frame = parse_client_frame('{"type": "message", "id": "c-1", "text": "hi"}')
+    assert (frame.text, frame.message_id, frame.structured) == ("hi", "c-1", True)
+    assert parse_client_frame('{"type": "message", "id": 7, "text": "hi"}').message_id == "7"
+    assert parse_client_frame('{"type": "message", "id": [1], "text": "hi"}').message_id is None
+    # plain text, including text that only looks like JSON
+    for data in ("where is my order?", "{not json", '{"order": 124}'):
+        frame = parse_client_frame(data)
+        assert (frame.text, frame.message_id, frame.structured) == (data, None, False)
+    assert json.loads(reply_frame("ok", ["c-1"])) == {"type": "reply", "reply_to": ["c-1"], "text": "ok", "replay": False}
+
+
+@pytest.mark.asyncio
+async def test_new_session_window_answers_without_the_db():
+    dedupe = MessageDedupe(_no_db)
+    dedupe.open_session("s1")
+    assert await dedupe.check("s1", "a") == (NEW, None)
+    dedupe.seen("s1", "a")
+    assert await dedupe.check("s1", "a") == (SEEN, None)
+    dedupe.replied("s1", ["a"], "hello")
+    assert await dedupe.check("s1", "a") == (REPLIED, "hello")
+
+
+@pytest.mark.asyncio
+async def test_window_falls_back_to_the_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+    repo.create_session("s1")
+    repo.add_message("s1", "user", "where is my order?", client_message_id="a")
+    repo.add_message("s1", "user", "124", client_message_id="b")
+    repo.add_message("s1", "assistant", "it shipped", reply_to=["a", "b"])
+    repo.add_message("s1", "user", "thanks", client_message_id="c")
+
+    # another worker: resumed session, nothing in memory
+    dedupe = MessageDedupe(repo.get_client_message, window=2)
+    assert await dedupe.check("s1", "b") == (REPLIED, "it shipped")
+    assert await dedupe.check("s1", "c") == (SEEN, None)
+    assert await dedupe.check("s1", "new") == (NEW, None)
+
+    # evicting ids makes even a complete window go back to the DB
+    dedupe = MessageDedupe(repo.get_client_message, window=2)
+    dedupe.open_session("s1")
+    assert await dedupe.check("s1", "a") == (NEW, None)
+    for message_id in ("x", "y", "z"):
+        dedupe.seen("s1", message_id)
+    assert await dedupe.check("s1", "a") == (REPLIED, "it shipped")
+
+
+def test_resent_message_replays_reply_without_a_new_turn(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    calls = []
+
+    async def fake_handle_client_input(text, state):
+        calls.append(text)
+        return f"answer to {text}"
+
+    monkeypatch.setattr(server.ChatManager, "handle_client_input", fake_handle_client_input)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+    monkeypatch.setattr(server, "sessions", InMemorySessionStore())
+    monkeypatch.setattr(server, "dedupe", MessageDedupe(lambda s, m: server.db.get_client_message(s, m)))
+    replayed = metrics.DUPLICATE_MESSAGES.value(outcome="replayed")
+    message = json.dumps({"type": "message", "id": "c-1", "text": "where is my order?"})
+
+    with TestClient(server.app).websocket_connect("/ws") as ws:
+        ws.send_text(message)
+        assert json.loads(ws.receive_text()) == {
+            "type": "reply", "reply_to": ["c-1"], "text": "answer to where is my order?", "replay": False,
+        }
+        cookie = dict(ws.extra_headers)[b"set-cookie"].decode()
+    session_id = cookie.split(";")[0].split("=", 1)[1]
+    server.db.flush()
+
+    # reconnect on a worker with an empty window, resend the same message
+    monkeypatch.setattr(server, "dedupe", MessageDedupe(lambda s, m: server.db.get_client_message(s, m)))
+    with TestClient(server.app).websocket_connect(f"/ws?session_id={session_id}") as ws:
+        ws.send_text(message)
+        reply = json.loads(ws.receive_text())
+        assert reply["replay"] is True and reply["text"] == "answer to where is my order?"
+        ws.send_text("plain text still works")
+        assert ws.receive_text() == json.dumps({
+            "type": "reply", "reply_to": [], "text": "answer to plain text still works", "replay": False,
+        })
+
+    server.db.flush()
+    assert calls == ["where is my order?", "plain text still works"]
+    assert metrics.DUPLICATE_MESSAGES.value(outcome="replayed") == replayed + 1
+    contents = [m.content for m in SqliteChatRepo(db_path).get_messages(session_id)]
+    assert contents.count("where is my order?") == 1
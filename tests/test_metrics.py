@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+from monitoring.metrics import Counter, Gauge, Histogram, Registry, record_llm_call, LLM_CALLS, LLM_TOKENS, STAGE_LATENCY
+from monitoring.tracing import tracer
+
+
+def test_counter_renders_labels_in_exposition_format():
+    reg = Registry()
+    c = reg.register(Counter("llm_calls_total", "LLM calls.", ("model", "stage")))
+    c.inc(model="gpt-4.1-mini", stage="route")
+    c.inc(2, model="gpt-4.1-mini", stage="route")
+
+    text = reg.render()
+    assert "# TYPE llm_calls_total counter" in text
+    assert 'llm_calls_total{model="gpt-4.1-mini",stage="route"} 3' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    h = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    h.observe(0.05, stage="route")
+    h.observe(0.5, stage="route")
+    h.observe(5, stage="route")
+
+    lines = h.render()
+    assert 'latency_seconds_bucket{stage="route",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="route",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{stage="route",le="+Inf"} 3' in lines
+    assert 'latency_seconds_count{stage="route"} 3' in lines
+
+
+def test_gauge_inc_dec_and_callback():
+    g = Gauge("ws_active_connections", "Open sockets.")
+    g.inc()
+    g.inc()
+    g.dec()
+    assert g.value() == 1
+
+    ratio = Gauge("hit_ratio", "Ratio.", callback=lambda: 0.75)
+    assert ratio.render()[-1] == "hit_ratio 0.75"
+
+
+def test_record_llm_call_counts_tokens_by_kind():
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=100))
+    before = LLM_TOKENS.value(model="m-test", stage="route", kind="cached")
+
+    record_llm_call("m-test", "route", SimpleNamespace(usage=usage))
+    record_llm_call("m-test", "route", SimpleNamespace())  # fakes without usage
+
+    assert LLM_CALLS.value(model="m-test", stage="route") == 2
+    assert LLM_TOKENS.value(model="m-test", stage="route", kind="prompt") == 120
+    assert LLM_TOKENS.value(model="m-test", stage="route", kind="cached") - before == 100
+
+
+def test_spans_feed_stage_latency_histogram():
+    before = STAGE_LATENCY.count(stage="metrics_test_stage")
+    with tracer.span("metrics_test_stage"):
+        pass
+    assert STAGE_LATENCY.count(stage="metrics_test_stage") == before + 1
+
+
+def test_updates_from_many_threads_are_not_lost():
+    import threading
+
+    counter = Counter("threaded_total", "t", ("kind",))
+    gauge = Gauge("threaded_gauge", "t")
+    histogram = Histogram("threaded_seconds", "t", buckets=(0.1, 1.0))
+
+    def hammer():
+        for _ in range(20000):
+            counter.inc(kind="a")
+            gauge.inc()
+            histogram.observe(0.5)
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value(kind="a") == gauge.value() == histogram.count() == 80000
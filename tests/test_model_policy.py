@@ -0,0 +1,42 @@
+import pytest
+
+from models.intent import Intent
+from models.model_policy import ModelPolicy, parse_intent_models
+
+
+def test_from_env_reads_models_and_per_intent_overrides(monkeypatch):
+    monkeypatch.setenv("MODEL_ROUTE", "tiny")
+    monkeypatch.setenv("MODEL_ROUTE_ESCALATE", "")
+    monkeypatch.setenv("ROUTE_MIN_CONFIDENCE", "0.8")
+    monkeypatch.setenv("MODEL_GENERATE_BY_INTENT", "knowledge_qa=big, greeting = tiny")
+
+    policy = ModelPolicy.from_env()
+
+    assert policy.route == "tiny"
+    assert policy.route_escalation is None
+    assert policy.min_confidence == 0.8
+    assert policy.generation_model(Intent.KNOWLEDGE_QA) == "big"
+    assert policy.generation_model(Intent.GREETING) == "tiny"
+    assert policy.generation_model(Intent.REFUND_ORDER) == policy.generate
+    assert policy.generation_model(None) == policy.generate
+
+
+def test_defaults_route_small_and_escalate():
+    policy = ModelPolicy.from_env()
+    assert policy.route != policy.route_escalation
+    assert policy.generation_model(Intent.GOODBYE) == policy.route
+
+
+def test_escalation_reason():
+    policy = ModelPolicy(route="small", route_escalation="large", min_confidence=0.6)
+
+    assert policy.escalation_reason(0.9) is None
+    assert policy.escalation_reason(0.59) == "low_confidence"
+    assert policy.escalation_reason(None) == "no_route_call"
+    assert policy.escalation_reason(None, parse_failed=True) == "parse_error"
+    assert ModelPolicy(route="same", route_escalation="same").escalation_reason(0.1) is None
+
+
+def test_parse_intent_models_rejects_unknown_intents():
+    with pytest.raises(ValueError):
+        parse_intent_models("not_an_intent=big")
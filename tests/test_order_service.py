@@ -0,0 +1,137 @@
+import asyncio
+import httpx
+import pytest
+
+from db.init_db import init_db
+from models.order_service import (
+    HttpOrderBackend,
+    InMemoryOrderBackend,
+    OrderBackend,
+    OrderService,
+    SqliteOrderBackend,
+    create_order_service,
+)
+
+
+class SlowBackend(OrderBackend):
+    def __init__(self, delay=0.05, orders=None):
+        self.delay = delay
+        self.orders = orders if orders is not None else {"124": {"status": "Shipped"}}
+        self.calls = 0
+
+    async def fetch(self, order_id):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return self.orders.get(order_id)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_one_backend_call():
+    backend = SlowBackend()
+    service = OrderService(backend)
+
+    results = await asyncio.gather(*(service.get_order("124") for _ in range(20)))
+
+    assert backend.calls == 1
+    assert all(r == {"status": "Shipped"} for r in results)
+    # callers get their own copies
+    results[0]["status"] = "changed"
+    assert (await service.get_order("124"))["status"] == "Shipped"
+
+
+@pytest.mark.asyncio
+async def test_cache_expires_and_unknown_ids_use_negative_ttl():
+    backend = SlowBackend(delay=0)
+    service = OrderService(backend, ttl=0.05, negative_ttl=0.05)
+
+    assert await service.get_order("124") == {"status": "Shipped"}
+    assert await service.get_order("999") == {"error": "not found"}
+    await service.get_order("124")
+    await service.get_order("999")
+    assert backend.calls == 2
+
+    await asyncio.sleep(0.06)
+    await service.get_order("124")
+    assert backend.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_timeouts_are_reported_and_not_cached():
+    backend = SlowBackend(delay=1)
+    service = OrderService(backend, timeout=0.01)
+
+    assert await service.get_order("124") == {"error": "order service unavailable"}
+    backend.delay = 0
+    assert await service.get_order("124") == {"status": "Shipped"}
+    assert backend.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_lookup():
+    service = OrderService(SlowBackend())
+    first = asyncio.create_task(service.get_order("124"))
+    second = asyncio.create_task(service.get_order("124"))
+    await asyncio.sleep(0.01)
+    first.cancel()
+
+    assert await second == {"status": "Shipped"}
+
+
+@pytest.mark.asyncio
+async def test_sqlite_backend_reads_orders_table(tmp_path):
+    db_path = str(tmp_path / "orders.db")
+    init_db(db_path)
+    backend = SqliteOrderBackend(db_path)
+    backend.add("777", {"status": "Delivered", "eta": "2026-03-01", "carrier": "DHL", "tracking": None})
+
+    service = OrderService(backend)
+    assert (await service.get_order("777"))["carrier"] == "DHL"
+    assert await service.get_order("778") == {"error": "not found"}
+
+
+@pytest.mark.asyncio
+async def test_http_backend_maps_status_codes():
+    def handler(request):
+        if request.url.path == "/orders/124":
+            return httpx.Response(200, json={"status": "Shipped"})
+        if request.url.path == "/orders/500":
+            return httpx.Response(503)
+        return httpx.Response(404)
+
+    backend = HttpOrderBackend("http://orders.local/", transport=httpx.MockTransport(handler))
+    service = OrderService(backend)
+    try:
+        assert await service.get_order("124") == {"status": "Shipped"}
+        assert await service.get_order("9") == {"error": "not found"}
+        assert await service.get_order("500") == {"error": "order service unavailable"}
+    finally:
+        await service.close()
+
+
+@pytest.mark.asyncio
+async def test_malformed_order_ids_never_reach_the_backend_path():
+    paths = []
+
+    def handler(request):
+        paths.append(request.url.raw_path)
+        return httpx.Response(404)
+
+    service = OrderService(HttpOrderBackend("http://orders.local/api", transport=httpx.MockTransport(handler)))
+    try:
+        for order_id in ("../x", "1?a=b", "12#3", "../admin/delete", "a/b", "", "x" * 33):
+            assert await service.get_order(order_id) == {"error": "not found"}
+        assert paths == []
+        # quoted even when called directly
+        assert await service.backend.fetch("../x") is None
+        assert paths == [b"/api/orders/..%2Fx"]
+    finally:
+        await service.close()
+
+
+def test_create_order_service_picks_backend(monkeypatch):
+    assert isinstance(create_order_service().backend, InMemoryOrderBackend)
+    monkeypatch.setenv("ORDER_BACKEND", "sqlite")
+    assert isinstance(create_order_service().backend, SqliteOrderBackend)
+    monkeypatch.setenv("ORDER_BACKEND", "http")
+    with pytest.raises(ValueError):
+        create_order_service()
@@ -0,0 +1,106 @@
+import io
+import json
+import pytest
+
+import llm_router
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from loadtest.fake_llm import FakeAsyncClient
+from loadtest.replay import load_recorded, replay_sessions
+
+
+def _record_turn(repo, session_id, users, reply, intent=None, tools=(), ms=100.0):
+    for text in users:
+        repo.add_message(session_id, "user", text)
+    repo.add_message(session_id, "assistant", reply)
+    events = []
+    if intent:
+        events.append(("intent_detected", {"span": "get_intent", "intent": intent, "duration_ms": 5.0}))
+    events += [("tool_called", {"span": "tool_call", "tool": t, "ok": True}) for t in tools]
+    events.append(("span", {"span": "turn", "duration_ms": ms}))
+    events.append(("span", {"span": "db_write", "duration_ms": 0.1}))
+    repo.add_events(session_id, events)
+
+
+@pytest.fixture
+def repo(tmp_path):
+    db_path = str(tmp_path / "replay.db")
+    init_db(db_path)
+    repo = SqliteChatRepo(db_path)
+
+    repo.create_session("s1", "2026-01-01T00:00:00+00:00")
+    _record_turn(repo, "s1", ["hi"], "Hello!", intent="greeting")
+    _record_turn(repo, "s1", ["where is", "my order"], "Sure — what’s your order ID?", intent="get_order_information")
+    _record_turn(repo, "s1", ["124"], "Shipped.", tools=["get_order"])
+
+    # recorded intent the current router disagrees with
+    repo.create_session("s2", "2026-01-02T00:00:00+00:00")
+    _record_turn(repo, "s2", ["bye"], "Goodbye!", intent="greeting")
+    return repo
+
+
+def test_load_recorded_rebuilds_coalesced_turns_and_events(repo):
+    turns = load_recorded(repo, "s1")
+    assert [t.user for t in turns] == ["hi", "where is\nmy order", "124"]
+    assert [t.intent for t in turns] == ["greeting", "get_order_information", None]
+    assert turns[2].tools == ["get_order"]
+    assert turns[0].latency_ms == 100.0
+
+
+def test_iter_session_ids_streams_in_order(repo):
+    assert list(repo.iter_session_ids()) == ["s1", "s2"]
+    assert list(repo.iter_session_ids(since="2026-01-02")) == ["s2"]
+    assert list(repo.iter_session_ids(limit=1, batch_size=1)) == ["s1"]
+
+
+@pytest.mark.asyncio
+async def test_replay_compares_intents_tools_and_latency(repo, monkeypatch):
+    monkeypatch.setattr(llm_router, "client", FakeAsyncClient())
+    sink = io.StringIO()
+
+    report = await replay_sessions(repo, repo.iter_session_ids(), concurrency=2, sink=sink)
+
+    assert report.sessions == 2
+    assert report.turns == 4
+    assert report.errors == 0
+    assert (report.intents_matched, report.intents_compared) == (2, 3)
+    assert (report.tools_matched, report.tools_compared) == (4, 4)
+    assert report.examples[0]["session_id"] == "s2"
+    assert report.examples[0]["replayed"]["intent"] == "goodbye"
+    assert len(report.replayed_ms) == 4
+    assert report.regressions(min_intent_agreement=0.9)
+
+    lines = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert {line["session_id"] for line in lines} == {"s1", "s2"}
+
+
+@pytest.mark.asyncio
+async def test_sessions_recorded_by_server_replay_cleanly(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import server
+    from db.writer import ChatWriter
+    from monitoring.tracing import tracer
+
+    db_path = str(tmp_path / "recorded.db")
+    init_db(db_path)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+    monkeypatch.setattr(llm_router, "client", FakeAsyncClient())
+    monkeypatch.setattr(tracer, "enabled", True)
+    monkeypatch.setenv("INPUT_DEBOUNCE_MS", "0")
+
+    with TestClient(server.app).websocket_connect("/ws") as ws:
+        for text in ("hi", "where is my order?", "124"):
+            ws.send_text(text)
+            ws.receive_text()
+    server.db.flush()
+
+    repo = SqliteChatRepo(db_path)
+    session_id = next(repo.iter_session_ids())
+    turns = load_recorded(repo, session_id)
+    assert [t.intent for t in turns] == ["greeting", "get_order_information", None]
+    assert turns[2].tools == ["get_order"]
+    assert all(t.latency_ms is not None for t in turns)
+
+    report = await replay_sessions(repo, [session_id])
+    assert report.intent_agreement == 1.0
+    assert report.tool_agreement == 1.0
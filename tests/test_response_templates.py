@@ -0,0 +1,25 @@
+from models.intent import Intent
+from models.response_templates import order_outcome, render_order_reply
+
+
+def test_order_outcomes():
+    assert order_outcome({"status": "Shipped"}) == "found"
+    assert order_outcome({"error": "not found"}) == "not_found"
+    assert order_outcome({"error": "order service unavailable"}) == "unavailable"
+    assert order_outcome({}) == "unknown"
+
+
+def test_found_order_skips_missing_fields():
+    order = {"status": "Processing", "eta": "2026-02-28", "carrier": None, "tracking": None}
+    assert render_order_reply(Intent.GET_ORDER_INFORMATION, "555", order) == "Order 555 is processing, expected 2026-02-28."
+
+
+def test_templates_follow_per_intent_switch(monkeypatch):
+    missing = {"error": "not found"}
+    assert render_order_reply(Intent.REFUND_ORDER, "9", missing).startswith("I couldn't find")
+    assert render_order_reply(Intent.KNOWLEDGE_QA, "9", missing) is None
+    assert render_order_reply(None, "9", missing) is None
+
+    monkeypatch.setenv("TEMPLATE_INTENTS", "get_order_information")
+    assert render_order_reply(Intent.REFUND_ORDER, "9", missing) is None
+    assert render_order_reply(Intent.GET_ORDER_INFORMATION, "9", missing) is not None
@@ -0,0 +1,148 @@
+import pytest
+
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.rollups import SqliteRollups, hour_bucket
+from monitoring import metrics
+
+
+@pytest.fixture
+def repo(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    return SqliteChatRepo(db_path)
+
+
+def _turn(repo, session_id, at, intent, tool=None, ok=True, slot_requested=None, slot_filled=None):
+    turn = {"span": "turn", "duration_ms": 100.0}
+    if slot_requested:
+        turn["slot_requested"] = slot_requested
+    if slot_filled:
+        turn["slot_filled"] = slot_filled
+    events = [("intent_detected", {"span": "get_intent", "duration_ms": 40.0, "intent": intent}), ("span", turn)]
+    if tool:
+        events.append(("tool_called", {"span": "tool_call", "duration_ms": 20.0, "tool": tool, "ok": ok}))
+    repo.add_message(session_id, "user", "hi", created_at=at)
+    repo.add_message(session_id, "assistant", "hello", created_at=at)
+    repo.add_events(session_id, events, created_at=at)
+
+
+def test_hour_bucket():
+    assert hour_bucket("2026-03-01T14:05:09.123456+00:00") == "2026-03-01T14:00"
+
+
+def test_refresh_folds_new_rows_once_and_dashboard_reads_buckets(repo):
+    rollups = SqliteRollups(repo.db_path)
+    repo.create_session("s1", created_at="2026-03-01T09:00:00+00:00")
+    repo.create_session("s2", created_at="2026-03-01T10:30:00+00:00")
+    _turn(repo, "s1", "2026-03-01T09:10:00+00:00", "get_order_information", slot_requested="order_id")
+    _turn(repo, "s1", "2026-03-01T09:11:00+00:00", "get_order_information", tool="get_order", slot_filled="order_id")
+    _turn(repo, "s2", "2026-03-01T10:31:00+00:00", "refund_order", tool="get_order", ok=False, slot_requested="order_id")
+    _turn(repo, "s2", "2026-03-01T10:32:00+00:00", "greeting")
+
+    assert rollups.refresh(chunk_size=3) > 0
+    # nothing new past the high-water marks
+    assert rollups.refresh(chunk_size=3) == 0
+
+    dashboard = rollups.dashboard(since="2026-03-01", until="2026-03-02")
+    assert dashboard["intents"] == {
+        "2026-03-01T09:00": {"get_order_information": 2},
+        "2026-03-01T10:00": {"greeting": 1, "refund_order": 1},
+    }
+    assert dashboard["tool_calls"] == {"get_order": {"calls": 2, "errors": 1, "avg_ms": 20.0}}
+    assert dashboard["slot_fill_rate"] == 0.5
+    assert dashboard["avg_turns_per_session"] == 2.0
+
+    # rows written later are picked up incrementally
+    _turn(repo, "s2", "2026-03-01T10:40:00+00:00", "greeting")
+    assert rollups.refresh() == 4
+    by_day = rollups.series("intent", granularity="day", dimension="greeting")
+    assert [(p.bucket, p.count) for p in by_day] == [("2026-03-01", 2)]
+    assert metrics.ROLLUP_LAG_ROWS.value(source="chat_events") == 0
+
+
+def test_avg_turns_counts_the_turns_of_sessions_started_in_range(repo):
+    rollups = SqliteRollups(repo.db_path)
+    repo.create_session("s1", created_at="2026-03-01T23:50:00+00:00")
+    _turn(repo, "s1", "2026-03-01T23:55:00+00:00", "greeting")
+    _turn(repo, "s1", "2026-03-02T00:05:00+00:00", "greeting")
+    _turn(repo, "s1", "2026-03-02T00:06:00+00:00", "greeting")
+    repo.create_session("s2", created_at="2026-03-02T08:00:00+00:00")
+    _turn(repo, "s2", "2026-03-02T08:01:00+00:00", "greeting")
+    rollups.refresh()
+
+    # s1's turns after midnight still belong to s1, not to the day s2 started
+    assert rollups.dashboard(since="2026-03-01", until="2026-03-02")["avg_turns_per_session"] == 3.0
+    assert rollups.dashboard(since="2026-03-02", until="2026-03-03")["avg_turns_per_session"] == 1.0
+    assert rollups.dashboard(since="2026-03-03")["avg_turns_per_session"] is None
+
+
+def test_series_range_and_granularity(repo):
+    rollups = SqliteRollups(repo.db_path)
+    repo.create_session("s1")
+    for at in ("2026-03-01T09:00:00+00:00", "2026-03-01T23:59:00+00:00", "2026-03-02T00:01:00+00:00"):
+        _turn(repo, "s1", at, "greeting")
+    rollups.refresh()
+
+    hourly = rollups.series("turn", since="2026-03-01T10", until="2026-03-03")
+    assert [p.bucket for p in hourly] == ["2026-03-01T23:00", "2026-03-02T00:00"]
+    assert hourly[0].total == 100.0
+    with pytest.raises(ValueError):
+        rollups.series("turn", granularity="minute")
+
+
+def test_rebuild_matches_incremental(repo):
+    rollups = SqliteRollups(repo.db_path)
+    repo.create_session("s1", created_at="2026-03-01T09:00:00+00:00")
+    for minute in range(10):
+        _turn(repo, "s1", f"2026-03-01T09:{minute:02d}:00+00:00", "greeting", tool="get_order")
+        rollups.refresh(chunk_size=4)
+    incremental = rollups.dashboard()
+
+    assert rollups.rebuild(chunk_size=7) == 1 + 10 * 2 + 10 * 3
+    assert rollups.dashboard() == incremental
+
+
+@pytest.mark.parametrize("tracing", [True, False])
+def test_turn_span_records_slot_requests_and_fills(monkeypatch, tracing):
+    import asyncio
+
+    import server
+    from models.chat_state import ChatState
+    from monitoring.tracing import Tracer
+
+    monkeypatch.setattr(server, "tracer", Tracer(enabled=tracing))
+    state = ChatState()
+
+    async def respond(text: str) -> str:
+        state.pending_data = None if state.pending_data else "order_id"
+        return "ok"
+
+    spans = []
+    turn = server.traced_turn(respond, "s1", spans, state)
+    asyncio.run(turn("where is my order"))
+    assert spans[-1].attributes["slot_requested"] == "order_id"
+    asyncio.run(turn("124"))
+    assert spans[-1].attributes["slot_filled"] == "order_id"
+    assert "slot_requested" not in spans[-1].attributes
+
+
+def test_analytics_endpoints(repo, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import server
+
+    repo.create_session("s1", created_at="2026-03-01T09:00:00+00:00")
+    _turn(repo, "s1", "2026-03-01T09:10:00+00:00", "greeting")
+    rollups = SqliteRollups(repo.db_path)
+    rollups.refresh()
+    monkeypatch.setattr(server, "rollups", rollups)
+
+    client = TestClient(server.app)
+    body = client.get("/v1/analytics", params={"granularity": "day"}).json()
+    assert body["intents"] == {"2026-03-01": {"greeting": 1}}
+    assert body["avg_turns_per_session"] == 1.0
+
+    series = client.get("/v1/analytics/series", params={"metric": "messages", "dimension": "user"}).json()
+    assert series["points"] == [{"bucket": "2026-03-01T09:00", "dimension": "user", "count": 1, "total": 0.0}]
+    assert client.get("/v1/analytics", params={"granularity": "week"}).status_code == 400
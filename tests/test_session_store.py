@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.session_store import InMemorySessionStore, SqliteSessionStore
+from db.writer import ChatWriter
+from models.chat_state import ChatState
+from models.intent import Intent
+
+
+def test_chat_state_round_trips_through_dict():
+    state = ChatState(current_intent=Intent.REFUND_ORDER, pending_data="order_id", user_data={"session_id": "s1"})
+    restored = ChatState.from_dict(state.to_dict())
+    assert restored == state
+
+
+def test_in_memory_store_copies_state_and_evicts_oldest():
+    store = InMemorySessionStore(max_sessions=2)
+    state = ChatState()
+    store.save("a", state)
+    state.pending_data = "order_id"  # not saved yet
+    assert store.load("a").pending_data is None
+
+    store.save("b", ChatState())
+    store.load("a")  # touch a, so b is the oldest
+    store.save("c", ChatState())
+    assert store.load("b") is None
+    assert store.load("a") is not None
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+
+    worker_a, worker_b = SqliteSessionStore(db_path), SqliteSessionStore(db_path)
+    worker_a.save("s1", ChatState(current_intent=Intent.GET_ORDER_INFORMATION, pending_data="order_id"))
+    assert worker_b.load("s1").pending_data == "order_id"
+
+    worker_b.delete("s1")
+    assert worker_a.load("s1") is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_async_calls_run_off_the_loop(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    store = SqliteSessionStore(db_path)
+    threads = []
+    connect = store._conn
+
+    def tracking_conn():
+        threads.append(threading.get_ident())
+        return connect()
+
+    monkeypatch.setattr(store, "_conn", tracking_conn)
+    await store.asave("s1", ChatState(pending_data="order_id"))
+    assert (await store.aload("s1")).pending_data == "order_id"
+    assert threads and threading.get_ident() not in threads
+
+
+def test_session_survives_move_between_workers(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+
+    async def fake_handle_client_input(text, state):
+        if state.pending_data == "order_id":
+            state.user_data["order_id"] = text
+            state.pending_data = None
+            return f"looking up {text} for {state.current_intent}"
+        state.current_intent = Intent.GET_ORDER_INFORMATION
+        state.pending_data = "order_id"
+        return "what's your order ID?"
+
+    monkeypatch.setattr(server.ChatManager, "handle_client_input", fake_handle_client_input)
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(db_path)))
+
+    # worker A serves the first turn
+    monkeypatch.setattr(server, "sessions", SqliteSessionStore(db_path))
+    with TestClient(server.app).websocket_connect("/ws") as ws:
+        ws.send_text("where is my order?")
+        assert ws.receive_text() == "what's your order ID?"
+        cookie = dict(ws.extra_headers)[b"set-cookie"].decode()
+    session_id = cookie.split(";")[0].split("=", 1)[1]
+
+    # the reconnect lands on worker B, which has never seen the session
+    monkeypatch.setattr(server, "sessions", SqliteSessionStore(db_path))
+    with TestClient(server.app).websocket_connect(f"/ws?session_id={session_id}") as ws:
+        ws.send_text("124")
+        assert ws.receive_text() == "looking up 124 for get_order_information"
+
+    server.db.flush()
+    events = [e.event_type for e in SqliteChatRepo(db_path).get_events(session_id)]
+    assert events[0] == "session_started"
+    assert "session_resumed" in events
+    assert [m.content for m in SqliteChatRepo(db_path).get_messages(session_id)][-1] == "looking up 124 for get_order_information"
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+
+import llm_router
+import server
+from db.chat_db import SqliteChatRepo
+from db.init_db import init_db
+from db.writer import ChatWriter
+from models import knowledge_search
+from monitoring import metrics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_server_does_not_load_openai_or_httpx():
+    code = "import sys, server; print(sorted(m for m in ('openai', 'httpx') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True,
+                         env={**os.environ, "OPENAI_API_KEY": "test"})
+    assert out.stdout.strip() == "[]"
+
+
+def test_lifespan_warms_up_and_closes_resources(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "test.db")
+    init_db(db_path)
+    writer = ChatWriter(SqliteChatRepo(db_path))
+    monkeypatch.setattr(server, "db", writer)
+    monkeypatch.setattr(llm_router, "client", None)
+    monkeypatch.setattr(knowledge_search, "_index_cache", {})
+
+    with TestClient(server.app):
+        assert llm_router.client is not None
+        assert writer._thread is not None
+        assert any(folder == "knowledge" for folder, _ in knowledge_search._index_cache)
+        assert metrics.STARTUP_SECONDS.value(stage="knowledge") > 0
+
+    assert llm_router.client is None
+    assert writer._thread is None
+
+
+def test_rollup_refresher_is_awaited_before_the_writer_closes(tmp_path, monkeypatch):
+    events = []
+
+    async def refresh_rollups():
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            events.append("refresher stopped")
+
+    writer = ChatWriter(SqliteChatRepo(str(tmp_path / "test.db")))
+    close = writer.close
+    monkeypatch.setattr(writer, "close", lambda: (events.append("db closed"), close()))
+    monkeypatch.setattr(server, "db", writer)
+    monkeypatch.setattr(server, "WARMUP", False)
+    monkeypatch.setattr(server, "ROLLUP_INTERVAL_S", 30)
+    monkeypatch.setattr(server, "refresh_rollups", refresh_rollups)
+
+    with TestClient(server.app):
+        pass
+    assert events == ["refresher stopped", "db closed"]
+
+
+def test_failed_warm_up_step_does_not_stop_startup(tmp_path, monkeypatch, caplog):
+    # an empty file without the schema -- the first write would fail the same way
+    monkeypatch.setattr(server, "db", ChatWriter(SqliteChatRepo(str(tmp_path / "empty.db"))))
+    monkeypatch.setattr(llm_router, "client", None)
+
+    with caplog.at_level(logging.WARNING, logger="server"):
+        with TestClient(server.app) as client:
+            assert client.get("/metrics").status_code == 200
+    assert "warm-up of db failed" in caplog.text
+
+
+def test_warm_up_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(server, "WARMUP", False)
+    monkeypatch.setattr(llm_router, "client", None)
+    monkeypatch.setattr(llm_router, "get_client", lambda: (_ for _ in ()).throw(AssertionError("built")))
+
+    with TestClient(server.app):
+        pass
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from llm_router import GENERATE_ARGS, ROUTE_ARGS
+from models.tool_args import ToolArgsError
+from monitoring.metrics import TOOL_ARGS
+
+VALID_ROUTE = {
+    "intent": "get_order_information",
+    "confidence": 0.9,
+    "next_action": "call_tool",
+    "slot_to_request": None,
+    "tool_name": "get_order",
+    "tool_args": {"order_id": "124"},
+}
+
+
+def test_valid_arguments_pass_unchanged():
+    before = TOOL_ARGS.value(tool="route", outcome="ok")
+    args, repairs = ROUTE_ARGS.parse(json.dumps(VALID_ROUTE))
+    assert args == VALID_ROUTE
+    assert repairs == []
+    assert TOOL_ARGS.value(tool="route", outcome="ok") == before + 1
+
+
+def test_json_is_extracted_from_fences_and_trailing_text():
+    text = "```json\n" + json.dumps(VALID_ROUTE) + "\n```\nLet me know if you need anything else!"
+    args, repairs = ROUTE_ARGS.parse(text)
+    assert args == VALID_ROUTE
+    assert repairs == ["extracted_json"]
+
+
+def test_enum_casing_missing_nulls_and_unknown_fields_are_repaired():
+    before = TOOL_ARGS.value(tool="route", outcome="repaired")
+    args, repairs = ROUTE_ARGS.parse(json.dumps({
+        "intent": "Get Order Information", "confidence": "0.8", "next_action": "RESPOND", "reasoning": "...",
+    }))
+
+    assert args == {
+        "intent": "get_order_information", "confidence": 0.8, "next_action": "respond",
+        "slot_to_request": None, "tool_name": None, "tool_args": None,
+    }
+    assert set(repairs) == {"enum_case", "number_string", "dropped_unknown", "filled_null"}
+    assert TOOL_ARGS.value(tool="route", outcome="repaired") == before + 1
+
+
+def test_numbers_are_clamped_and_defaults_filled():
+    assert ROUTE_ARGS.parse(json.dumps({**VALID_ROUTE, "confidence": 1.4}))[0]["confidence"] == 1
+
+    args, _ = GENERATE_ARGS["knowledge_search"].parse('{"query": "returns"}')
+    assert args == {"query": "returns", "top_k": 3}
+    assert GENERATE_ARGS["knowledge_search"].parse('{"query": "returns", "top_k": 9.0}')[0]["top_k"] == 5
+
+
+@pytest.mark.parametrize("arguments", [
+    '{"confidence": 0.9, "next_action": "respond"}',  # required intent missing
+    json.dumps({**VALID_ROUTE, "intent": "cancel_subscription"}),
+    json.dumps({**VALID_ROUTE, "confidence": "very"}),
+    '["not", "an", "object"]',
+    "no json here",
+])
+def test_irreparable_arguments_raise_and_are_counted(arguments):
+    before = TOOL_ARGS.value(tool="route", outcome="failed")
+    with pytest.raises(ToolArgsError):
+        ROUTE_ARGS.parse(arguments)
+    assert TOOL_ARGS.value(tool="route", outcome="failed") == before + 1
@@ -0,0 +1,126 @@
+import json
+import pytest
+
+from monitoring.tracing import Span, Tracer, percentile, summarize_export
+
+
+def test_disabled_tracer_returns_noop_span():
+    t = Tracer(enabled=False)
+    with t.span("get_intent") as span:
+        span.set("intent", "greeting")
+
+    assert t.stage_percentiles() == {}
+
+
+def test_nested_spans_share_trace_and_link_parent():
+    t = Tracer(enabled=True)
+    with t.collect() as spans:
+        with t.span("turn"):
+            with t.span("get_intent") as inner:
+                inner.set("intent", "greeting")
+
+    inner, outer = spans
+    assert outer.name == "turn" and inner.name == "get_intent"
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert inner.event_type == "intent_detected"
+    assert inner.to_event()["intent"] == "greeting"
+
+
+def test_span_records_error_and_reraises():
+    t = Tracer(enabled=True)
+    with t.collect() as spans:
+        with pytest.raises(ValueError):
+            with t.span("tool_call", tool="get_order"):
+                raise ValueError("boom")
+
+    assert spans[0].error == "ValueError"
+    assert spans[0].to_event()["tool"] == "get_order"
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) == 0.0
+
+
+def test_stage_percentiles_grouped_by_name():
+    t = Tracer(enabled=True)
+    for _ in range(3):
+        with t.span("knowledge_search"):
+            pass
+    with t.span("ws_send"):
+        pass
+
+    stages = t.stage_percentiles()
+    assert stages["knowledge_search"]["count"] == 3
+    assert stages["ws_send"]["count"] == 1
+    assert set(stages["ws_send"]) == {"count", "p50", "p95", "p99"}
+
+
+def test_flush_writes_otlp_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    t = Tracer(enabled=True, export_path=str(path))
+    with t.span("turn"):
+        with t.span("get_intent", intent="greeting"):
+            pass
+    t.flush()
+
+    request = json.loads(path.read_text(encoding="utf-8").splitlines()[0])
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert [s["name"] for s in spans] == ["get_intent", "turn"]
+    assert spans[0]["parentSpanId"] == spans[1]["spanId"]
+    assert {"key": "intent", "value": {"stringValue": "greeting"}} in spans[0]["attributes"]
+
+    summary = summarize_export(str(path))
+    assert summary["turn"]["count"] == 1
+
+
+def test_listener_runs_even_when_tracing_disabled():
+    t = Tracer(enabled=False)
+    seen = []
+    t.add_listener(lambda span: seen.append(span.name))
+
+    with t.span("llm_call"):
+        pass
+
+    assert seen == ["llm_call"]
+    assert t.stage_percentiles() == {}
+
+
+def test_disabled_tracer_times_spans_for_listeners_without_building_them():
+    t = Tracer(enabled=False)
+    seen = []
+    t.add_listener(seen.append)
+
+    with t.span("tool_call", tool="get_order") as span:
+        span.set("hit", True)
+    with pytest.raises(ValueError):
+        with t.span("db_write"):
+            raise ValueError("locked")
+
+    assert not isinstance(seen[0], Span)
+    assert (seen[0].name, seen[0].attributes, seen[0].error) == ("tool_call", {"tool": "get_order", "hit": True}, None)
+    assert seen[0].duration_s >= 0
+    assert (seen[1].name, seen[1].error) == ("db_write", "ValueError")
+    with t.collect() as spans:
+        with t.span("db_write"):
+            pass
+    assert spans == [] and t.stage_percentiles() == {}
+
+
+def test_summary_spans_are_collected_with_tracing_off():
+    t = Tracer(enabled=False)
+    with t.collect() as spans:
+        with t.span("turn"):
+            with t.span("get_intent") as span:
+                span.set("intent", "greeting")
+            with t.span("knowledge_search"):
+                pass
+
+    assert [s.name for s in spans] == ["get_intent", "turn"]
+    assert spans[0].event_type == "intent_detected"
+    assert spans[0].to_event()["intent"] == "greeting"
+    assert t.stage_percentiles() == {}